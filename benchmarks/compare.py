@@ -0,0 +1,45 @@
+"""
+对比两次压测结果
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse
+import json
+
+
+def _change(old, new):
+    if not old:
+        return '   n/a'
+    return f'{(new - old) / old * 100:+6.1f}%'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次压测结果')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    print(f"{baseline['revision']} -> {candidate['revision']}")
+    print(f"{'scenario':<20}{'rps':>22}{'p50 ms':>22}{'p99 ms':>22}{'queries':>16}")
+    for name, new in candidate['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f'{name:<20} (new)')
+            continue
+        print(
+            f"{name:<20}"
+            f"{old['throughput_rps']:>8} {new['throughput_rps']:>6} {_change(old['throughput_rps'], new['throughput_rps'])}"
+            f"{old['latency_ms']['p50']:>8} {new['latency_ms']['p50']:>6} {_change(old['latency_ms']['p50'], new['latency_ms']['p50'])}"
+            f"{old['latency_ms']['p99']:>8} {new['latency_ms']['p99']:>6} {_change(old['latency_ms']['p99'], new['latency_ms']['p99'])}"
+            f"{old['queries_per_request']['mean']:>8} {new['queries_per_request']['mean']:>6}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+模拟执行节点
+
+实现执行节点的 HTTP 接口，任务只保存在内存中，可配置响应延迟和失败率，
+用于压测和本地调试：
+
+    python benchmarks/fake_node.py --port 5001 --latency-ms 20 --failure-rate 0.05
+
+默认在 /health 中声明压缩和批量下发能力，--legacy 时模拟不支持这些扩展的旧节点。
+"""
+
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+_TASK_ACTION_RE = re.compile(r'^/tasks/(\d+)/(start|stop|execute)$')
+_TASK_RE = re.compile(r'^/tasks/(\d+)$')
+
+
+class FakeNodeState:
+    def __init__(self, name='fake-node', latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0,
+                 legacy=False):
+        self.name = name
+        self.legacy = legacy
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.tasks = {}
+        self.running = set()
+        self.executions = 0
+        self.requests = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+
+
+class FakeNodeHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeNode/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self):
+        state = self.state
+        with state.lock:
+            state.requests += 1
+        latency = state.latency_ms + random.uniform(0, state.jitter_ms)
+        if latency:
+            time.sleep(latency / 1000)
+        return random.random() < state.failure_rate
+
+    def _send(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = self.rfile.read(length)
+        with self.state.lock:
+            self.state.bytes_received += length
+        encoding = self.headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'zstd':
+            body = zstandard.ZstdDecompressor().decompress(body)
+        return json.loads(body)
+
+    def _capabilities(self):
+        if self.state.legacy:
+            return None
+        encodings = ['gzip'] if zstandard is None else ['zstd', 'gzip']
+        return {'encodings': encodings, 'batch': True, 'max_batch': 100}
+
+    def do_GET(self):
+        failed = self._delay()
+        state = self.state
+        if self.path == '/health':
+            if failed:
+                return self._send(503, {'status': 'error'})
+            data = {
+                'status': 'active',
+                'name': state.name,
+                'tasks': len(state.tasks),
+                'running': len(state.running),
+            }
+            if self._capabilities():
+                data['capabilities'] = self._capabilities()
+            return self._send(200, data)
+        if self.path == '/tasks':
+            if failed:
+                return self._send(500, {'error': 'injected failure'})
+            with state.lock:
+                tasks = [dict(t, is_running=t['task_id'] in state.running)
+                         for t in state.tasks.values()]
+            return self._send(200, {'tasks': tasks})
+        self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.headers.get('Content-Encoding') and self.state.legacy:
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            return self._send(415, {'error': 'unsupported content encoding'})
+        payload = self._read_json()
+        if self._delay():
+            return self._send(500, {'error': 'injected failure'})
+        state = self.state
+        if self.path == '/tasks':
+            with state.lock:
+                state.tasks[int(payload['task_id'])] = payload
+            return self._send(200, {'status': 'success'})
+        if self.path == '/tasks/batch' and not state.legacy:
+            with state.lock:
+                for task in payload['tasks']:
+                    state.tasks[int(task['task_id'])] = task
+            return self._send(200, {'results': [
+                {'task_id': task['task_id'], 'ok': True, 'error': None} for task in payload['tasks']
+            ]})
+
+        match = _TASK_ACTION_RE.match(self.path)
+        if not match:
+            return self._send(404, {'error': 'not found'})
+        task_id, action = int(match.group(1)), match.group(2)
+        with state.lock:
+            if task_id not in state.tasks:
+                return self._send(404, {'error': 'task not found'})
+            if action == 'start':
+                state.running.add(task_id)
+            elif action == 'stop':
+                state.running.discard(task_id)
+            else:
+                state.executions += 1
+        self._send(200, {'status': 'success'})
+
+    def do_DELETE(self):
+        if self._delay():
+            return self._send(500, {'error': 'injected failure'})
+        match = _TASK_RE.match(self.path)
+        if not match:
+            return self._send(404, {'error': 'not found'})
+        state = self.state
+        with state.lock:
+            task = state.tasks.pop(int(match.group(1)), None)
+            state.running.discard(int(match.group(1)))
+        if task is None:
+            return self._send(404, {'error': 'task not found'})
+        self._send(200, {'status': 'success'})
+
+
+class FakeNode:
+    """在后台线程中运行的模拟节点，port=0 时自动分配端口"""
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        self.server = ThreadingHTTPServer((host, port), FakeNodeHandler)
+        self.server.daemon_threads = True
+        self.server.state = FakeNodeState(**options)
+        self.thread = None
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟执行节点')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--name', default='fake-node')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--legacy', action='store_true', help='不声明压缩和批量下发能力')
+    args = parser.parse_args()
+
+    node = FakeNode(args.host, args.port, name=args.name, latency_ms=args.latency_ms,
+                    jitter_ms=args.jitter_ms, failure_rate=args.failure_rate, legacy=args.legacy)
+    print(f'fake node {args.name} listening on {node.host}:{node.port}')
+    try:
+        node.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+后端接口压测
+
+在进程内通过 Django 测试客户端驱动 /api/* 接口，执行节点由 fake_node 模拟，
+统计每个场景的吞吐、p50/p95/p99 延迟和每个请求的 SQL 数，结果写入
+benchmarks/results/ 下的 JSON 文件，可用 compare.py 对比两次结果：
+
+    python -m benchmarks.run --tasks 2000 --jobs 20000 --requests 200
+    python -m benchmarks.run --db mysql --latency-ms 10 --failure-rate 0.02
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BENCH_DIR / 'results'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ecron 后端压测')
+    parser.add_argument('--db', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--nodes', type=int, default=4, help='模拟执行节点数量')
+    parser.add_argument('--tasks', type=int, default=1000, help='预置任务数量')
+    parser.add_argument('--jobs', type=int, default=10000, help='预置执行记录数量')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='模拟节点响应延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='模拟节点失败率')
+    parser.add_argument('--scenarios', default='', help='逗号分隔，只运行指定场景')
+    parser.add_argument('--output', help='结果文件路径，默认写入 benchmarks/results/')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def setup_django(args):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    os.environ['BENCH_DB'] = args.db
+    if args.db == 'sqlite':
+        db_dir = tempfile.mkdtemp(prefix='ecron-bench-')
+        os.environ['BENCH_SQLITE_PATH'] = os.path.join(db_dir, 'bench.sqlite3')
+    sys.path.insert(0, str(BENCH_DIR.parent))
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class Bench:
+    def __init__(self, args, fake_nodes):
+        from django.test import Client
+        self.args = args
+        self.client = Client()
+        self.fake_nodes = fake_nodes
+        self.node_ids = []
+        self.task_ids = []
+        self.results = {}
+
+    # ---- 数据准备 ----
+
+    def seed(self):
+        from django.utils import timezone
+        from tasks.models import Job, Node, Task
+
+        for i, fake in enumerate(self.fake_nodes):
+            response = self.client.post('/api/nodes/heartbeat/', {
+                'name': f'bench-node-{i}', 'host': fake.host, 'port': fake.port,
+            }, content_type='application/json')
+            self.node_ids.append(response.json()['id'])
+
+        nodes = list(Node.objects.filter(id__in=self.node_ids))
+        tasks = [
+            Task(
+                name=f'bench-task-{i}',
+                cron_expression='*/5 * * * *',
+                command=f'echo {i}',
+                command_type='shell',
+                status='active' if i % 5 else 'paused',
+                node=nodes[i % len(nodes)],
+            )
+            for i in range(self.args.tasks)
+        ]
+        Task.objects.bulk_create(tasks, batch_size=1000)
+        self.task_ids = list(Task.objects.values_list('id', flat=True))
+
+        now = timezone.now()
+        statuses = ['success'] * 8 + ['failed', 'running']
+        jobs = [
+            Job(
+                task_id=random.choice(self.task_ids),
+                status=random.choice(statuses),
+                end_time=now,
+                result='ok',
+            )
+            for _ in range(self.args.jobs)
+        ]
+        Job.objects.bulk_create(jobs, batch_size=1000)
+
+        # 模拟节点上预置任务定义，使 start/stop/execute 不返回 404
+        for task in Task.objects.select_related('node'):
+            fake = self.fake_nodes[self.node_ids.index(task.node_id)]
+            fake.state.tasks[task.id] = {'task_id': task.id}
+
+    # ---- 场景 ----
+
+    def scenarios(self):
+        rnd = random.Random(self.args.seed)
+        pages = max(self.args.tasks // 10, 1)
+        job_pages = max(self.args.jobs // 10, 1)
+
+        def pick_task():
+            return rnd.choice(self.task_ids)
+
+        def pick_node():
+            return rnd.choice(self.node_ids)
+
+        created = []
+
+        def task_create():
+            response = self.client.post('/api/tasks/', {
+                'name': f'bench-new-{rnd.random()}', 'cron_expression': '0 * * * *',
+                'command': 'echo new', 'command_type': 'shell', 'node': pick_node(),
+            }, content_type='application/json')
+            created.append(response.json().get('id'))
+            return response
+
+        def task_destroy():
+            task_id = created.pop() if created else pick_task()
+            return self.client.delete(f'/api/tasks/{task_id}/')
+
+        def heartbeat():
+            i = rnd.randrange(len(self.fake_nodes))
+            return self.client.post('/api/nodes/heartbeat/', {
+                'name': f'bench-node-{i}',
+                'host': self.fake_nodes[i].host, 'port': self.fake_nodes[i].port,
+            }, content_type='application/json')
+
+        return {
+            'heartbeat': heartbeat,
+            'task_list': lambda: self.client.get(f'/api/tasks/?page={rnd.randint(1, pages)}'),
+            'task_retrieve': lambda: self.client.get(f'/api/tasks/{pick_task()}/'),
+            'node_list': lambda: self.client.get('/api/nodes/'),
+            'job_list': lambda: self.client.get(f'/api/jobs/?page={rnd.randint(1, min(job_pages, 100))}'),
+            'job_list_by_task': lambda: self.client.get(f'/api/jobs/?task_id={pick_task()}'),
+            'task_create': task_create,
+            'task_update': lambda: self.client.patch(f'/api/tasks/{pick_task()}/', {
+                'command': f'echo {rnd.random()}',
+            }, content_type='application/json'),
+            'task_execute': lambda: self.client.post(f'/api/tasks/{pick_task()}/execute/'),
+            'task_pause': lambda: self.client.post(f'/api/tasks/{pick_task()}/pause/'),
+            'task_resume': lambda: self.client.post(f'/api/tasks/{pick_task()}/resume/'),
+            'task_redeploy': lambda: self.client.post(f'/api/tasks/{pick_task()}/redeploy/'),
+            'task_assign_node': lambda: self.client.post(f'/api/tasks/{pick_task()}/assign_node/', {
+                'node_id': pick_node(),
+            }, content_type='application/json'),
+            'task_destroy': task_destroy,
+        }
+
+    def run_scenario(self, name, func):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        latencies = []
+        queries = []
+        statuses = {}
+        started = time.perf_counter()
+        for _ in range(self.args.requests):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                response = func()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            queries.append(len(ctx.captured_queries))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - started
+
+        self.results[name] = {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 3),
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'max': round(max(latencies), 3),
+            },
+            'queries_per_request': {
+                'mean': round(statistics.fmean(queries), 2),
+                'max': max(queries),
+            },
+            'status_codes': {str(k): v for k, v in sorted(statuses.items())},
+        }
+        return self.results[name]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    setup_django(args)
+
+    from benchmarks.fake_node import FakeNode
+
+    fake_nodes = [
+        FakeNode(name=f'bench-node-{i}', latency_ms=args.latency_ms,
+                 jitter_ms=args.jitter_ms, failure_rate=args.failure_rate).start()
+        for i in range(args.nodes)
+    ]
+    try:
+        bench = Bench(args, fake_nodes)
+        bench.seed()
+        selected = {s for s in args.scenarios.split(',') if s}
+        print(f"{'scenario':<20}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>10}")
+        for name, func in bench.scenarios().items():
+            if selected and name not in selected:
+                continue
+            r = bench.run_scenario(name, func)
+            print(f"{name:<20}{r['throughput_rps']:>10}{r['latency_ms']['p50']:>10}"
+                  f"{r['latency_ms']['p95']:>10}{r['latency_ms']['p99']:>10}"
+                  f"{r['queries_per_request']['mean']:>10}")
+    finally:
+        for fake in fake_nodes:
+            fake.stop()
+
+    revision = git_revision()
+    report = {
+        'revision': revision,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': vars(args),
+        'results': bench.results,
+    }
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{revision}-{args.db}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f'结果已写入 {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+压测使用的 Django 配置
+
+BENCH_DB=sqlite（默认）使用临时 SQLite 文件；BENCH_DB=mysql 使用 .env 中的
+DB_* 连接参数，但库名取 BENCH_DB_NAME，避免误写业务库。
+"""
+
+import os
+
+from ecron_backend.settings import *  # noqa: F401,F403
+from ecron_backend.settings import DATABASES, LOGGING
+
+DEBUG = False
+
+if os.getenv('BENCH_DB', 'sqlite') == 'mysql':
+    DATABASES['default']['NAME'] = os.environ['BENCH_DB_NAME']
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCH_SQLITE_PATH', 'bench.sqlite3'),
+        }
+    }
+
+# 单进程压测，使用进程内缓存，避免读到上一次运行留下的文件缓存
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecron-bench',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+
+# 失败注入时不等待重试间隔，避免 sleep 淹没真实开销
+NODE_CLIENT_RETRY_DELAY = 0
+NODE_CLIENT_TIMEOUT = 5
+
+LOGGING['loggers']['backend']['level'] = os.getenv('LOG_LEVEL', 'ERROR').upper()
+LOGGING['loggers']['backend']['handlers'] = ['console']
+
+# 压测客户端都来自同一地址，不限流
+THROTTLE_ENABLED = False
@@ -0,0 +1,194 @@
+"""
+启动耗时和内存压测
+
+对比 SETTINGS_PROFILE=full / api：每次在新进程中加载 WSGI 应用并处理第一个请求，
+记录导入耗时、第一个请求耗时、峰值 RSS 和加载的模块数。加 --gunicorn 时再实际启动
+gunicorn（gunicorn.conf.py），对比 preload 开关下的就绪时间、worker 的 RSS/PSS
+（PSS 按共享页平摊，体现写时复制节省的内存）以及 worker 被杀后恢复服务的时间：
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --gunicorn --workers 4
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+
+# 子进程中执行：加载应用并通过 WSGI 接口处理一个不访问数据库的请求
+BOOT_SCRIPT = r'''
+import json, resource, sys, time
+start = time.perf_counter()
+from ecron_backend.wsgi import application
+loaded = time.perf_counter()
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/ops/db/', 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'wsgi.url_scheme': 'http',
+    'wsgi.input': sys.stdin.buffer, 'wsgi.errors': sys.stderr,
+}
+statuses = []
+b''.join(application(environ, lambda status, headers: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (loaded - start) * 1000,
+    'first_request_ms': (done - loaded) * 1000,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'status': statuses[0],
+}))
+'''
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ecron 后端启动耗时和内存压测')
+    parser.add_argument('--runs', type=int, default=5, help='每种配置的启动次数')
+    parser.add_argument('--gunicorn', action='store_true', help='同时测试 gunicorn 启动和 worker 内存')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--output', help='结果文件路径，默认只打印')
+    return parser.parse_args(argv)
+
+
+def base_env(profile, log_dir):
+    env = dict(os.environ)
+    env.update({
+        'DJANGO_SETTINGS_MODULE': 'ecron_backend.settings',
+        'SETTINGS_PROFILE': profile,
+        'DJANGO_DEBUG': 'False',
+        'LOG_FILE': os.path.join(log_dir, 'backend.log'),
+        'TRACE_FILE': os.path.join(log_dir, 'traces.jsonl'),
+        'PYTHONPATH': str(ROOT_DIR),
+    })
+    return env
+
+
+def measure_boot(profile, runs, log_dir):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', BOOT_SCRIPT], env=base_env(profile, log_dir), cwd=ROOT_DIR,
+            stdin=subprocess.DEVNULL, text=True,
+        )
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'first_request_ms': round(statistics.median(s['first_request_ms'] for s in samples), 1),
+        'max_rss_mb': round(statistics.median(s['max_rss_kb'] for s in samples) / 1024, 1),
+        'modules': samples[0]['modules'],
+        'status': samples[0]['status'],
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, deadline=60):
+    """等待 gunicorn 返回 200，返回 (耗时秒数, 处理请求的 worker pid)"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/ops/db/', timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start, json.loads(response.read())['pid']
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError('gunicorn 未能在限定时间内就绪')
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_kb(pid, field):
+    """从 /proc 读取 VmRSS（status）或 Pss（smaps_rollup）"""
+    path = f'/proc/{pid}/smaps_rollup' if field == 'Pss' else f'/proc/{pid}/status'
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure_gunicorn(profile, preload, workers, log_dir):
+    port = free_port()
+    env = base_env(profile, log_dir)
+    env.update({
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_PRELOAD': 'True' if preload else 'False',
+    })
+    process = subprocess.Popen(
+        ['gunicorn', 'ecron_backend.wsgi:application', '-c', str(ROOT_DIR / 'gunicorn.conf.py')],
+        env=env, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready, _ = wait_ready(port)
+        # 等所有 worker 都处理过请求，内存趋于稳定
+        for _ in range(workers * 5):
+            wait_ready(port)
+        pids = children(process.pid)
+        rss = [memory_kb(pid, 'VmRSS') or 0 for pid in pids]
+        pss = [memory_kb(pid, 'Pss') or 0 for pid in pids]
+
+        # 杀掉一个 worker，直到新 worker 处理了请求才算恢复（其余 worker 期间照常服务）
+        victim = pids[0]
+        start = time.perf_counter()
+        os.kill(victim, signal.SIGKILL)
+        new_pids = set()
+        while not new_pids:
+            new_pids = set(children(process.pid)) - set(pids)
+            time.sleep(0.002)
+        while wait_ready(port)[1] not in new_pids:
+            pass
+        respawn = time.perf_counter() - start
+        return {
+            'ready_ms': round(ready * 1000, 1),
+            'respawn_ms': round(respawn * 1000, 1),
+            'worker_rss_mb': round(statistics.mean(rss) / 1024, 1) if rss else None,
+            'worker_pss_mb': round(statistics.mean(pss) / 1024, 1) if any(pss) else None,
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    log_dir = tempfile.mkdtemp(prefix='ecron-startup-')
+    results = {'boot': {}, 'gunicorn': {}}
+    for profile in ('full', 'api'):
+        results['boot'][profile] = measure_boot(profile, args.runs, log_dir)
+        print(f'[boot] {profile}: {results["boot"][profile]}')
+    if args.gunicorn:
+        for profile in ('full', 'api'):
+            for preload in (False, True):
+                name = f'{profile}{"+preload" if preload else ""}'
+                results['gunicorn'][name] = measure_gunicorn(profile, preload, args.workers, log_dir)
+                print(f'[gunicorn] {name}: {results["gunicorn"][name]}')
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,76 @@
 SET NAMES utf8mb4;
 SET FOREIGN_KEY_CHECKS = 0;
 
+-- ----------------------------
+-- Table structure for tasks_changelease
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_changelease`;
+CREATE TABLE `tasks_changelease`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `seq` bigint NOT NULL COMMENT '变更序号',
+  `expires_at` datetime(6) NOT NULL COMMENT '失效时间',
+  PRIMARY KEY (`id`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '未提交的变更序号' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for tasks_changesequence
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_changesequence`;
+CREATE TABLE `tasks_changesequence`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `name` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '名称',
+  `value` bigint NOT NULL DEFAULT 0 COMMENT '当前值',
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `tasks_changesequence_name_uniq`(`name` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '变更序号' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for tasks_changetombstone
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_changetombstone`;
+CREATE TABLE `tasks_changetombstone`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `kind` varchar(10) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '类型',
+  `object_id` bigint NOT NULL COMMENT '对象ID',
+  `change_seq` bigint NOT NULL COMMENT '变更序号',
+  `deleted_at` datetime(6) NOT NULL COMMENT '删除时间',
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `tasks_changetombstone_change_seq_idx`(`change_seq` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '删除记录' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for tasks_controllerinstance
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_controllerinstance`;
+CREATE TABLE `tasks_controllerinstance`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `instance_id` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '实例ID',
+  `hostname` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '主机名',
+  `pid` int NOT NULL COMMENT '进程号',
+  `started_at` datetime(6) NOT NULL COMMENT '启动时间',
+  `lease_expires_at` datetime(6) NOT NULL COMMENT '租约到期时间',
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `instance_id`(`instance_id` ASC) USING BTREE,
+  INDEX `tasks_controllerinstance_lease_expires_at_idx`(`lease_expires_at` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '控制器实例' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for tasks_idempotencykey
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_idempotencykey`;
+CREATE TABLE `tasks_idempotencykey`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `key` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '键',
+  `fingerprint` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT '' COMMENT '请求体摘要',
+  `status_code` int NULL DEFAULT NULL COMMENT '响应状态码',
+  `response` json NULL COMMENT '响应内容',
+  `expires_at` datetime(6) NOT NULL COMMENT '过期时间',
+  `created_at` datetime(6) NOT NULL COMMENT '创建时间',
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `tasks_idempotencykey_key_uniq`(`key` ASC) USING BTREE,
+  INDEX `tasks_idempotencykey_expires_at_idx`(`expires_at` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '幂等键' ROW_FORMAT = Dynamic;
+
 -- ----------------------------
 -- Table structure for tasks_job
 -- ----------------------------
@@ -12,9 +82,13 @@ CREATE TABLE `tasks_job`  (
   `end_time` datetime(6) NULL DEFAULT NULL COMMENT '结束时间',
   `result` text CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL COMMENT '执行结果',
   `error_message` text CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL COMMENT '错误信息',
+  `run_started_at` datetime(6) NULL DEFAULT NULL COMMENT '本轮开始时间',
   `task_id` bigint NOT NULL COMMENT '任务ID',
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `tasks_job_task_id_fk`(`task_id` ASC) USING BTREE,
+  INDEX `job_status_start_idx`(`status` ASC, `start_time` ASC) USING BTREE,
+  INDEX `job_task_start_idx`(`task_id` ASC, `start_time` ASC) USING BTREE,
+  FULLTEXT INDEX `job_fulltext_idx`(`result`, `error_message`) WITH PARSER `ngram`,
   CONSTRAINT `tasks_job_task_id_fk` FOREIGN KEY (`task_id`) REFERENCES `tasks_task` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 72 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '执行记录' ROW_FORMAT = Dynamic;
 
@@ -29,11 +103,98 @@ CREATE TABLE `tasks_node`  (
   `port` int NOT NULL COMMENT '端口',
   `status` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT 'inactive' COMMENT '状态',
   `last_heartbeat` datetime(6) NULL DEFAULT NULL COMMENT '最后心跳',
+  `cpu_percent` double NULL DEFAULT NULL COMMENT 'CPU使用率',
+  `memory_percent` double NULL DEFAULT NULL COMMENT '内存使用率',
+  `running_jobs` int NULL DEFAULT NULL COMMENT '运行中任务数',
+  `queue_depth` int NULL DEFAULT NULL COMMENT '排队任务数',
   `created_at` datetime(6) NOT NULL COMMENT '创建时间',
   `updated_at` datetime(6) NOT NULL COMMENT '更新时间',
-  PRIMARY KEY (`id`) USING BTREE
+  `change_seq` bigint NOT NULL DEFAULT 0 COMMENT '变更序号',
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `tasks_node_change_seq_idx`(`change_seq` ASC) USING BTREE
 ) ENGINE = InnoDB AUTO_INCREMENT = 11 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '节点' ROW_FORMAT = Dynamic;
 
+-- ----------------------------
+-- Table structure for tasks_nodecommand
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_nodecommand`;
+CREATE TABLE `tasks_nodecommand`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `task_id` bigint NOT NULL COMMENT '任务ID',
+  `action` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '命令类型',
+  `steps` json NOT NULL COMMENT '执行步骤',
+  `step` int NOT NULL DEFAULT 0 COMMENT '下一步序号',
+  `idempotency_key` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '幂等键',
+  `status` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT 'pending' COMMENT '状态',
+  `attempts` int NOT NULL DEFAULT 0 COMMENT '尝试次数',
+  `next_attempt_at` datetime(6) NOT NULL COMMENT '下次执行时间',
+  `last_error` text CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL COMMENT '最后错误',
+  `created_at` datetime(6) NOT NULL COMMENT '创建时间',
+  `updated_at` datetime(6) NOT NULL COMMENT '更新时间',
+  `node_id` bigint NOT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `tasks_nodecommand_idempotency_key_uniq`(`idempotency_key` ASC) USING BTREE,
+  INDEX `nodecommand_status_next_idx`(`status` ASC, `next_attempt_at` ASC) USING BTREE,
+  INDEX `nodecommand_task_node_idx`(`task_id` ASC, `node_id` ASC) USING BTREE,
+  CONSTRAINT `tasks_nodecommand_node_id_fk` FOREIGN KEY (`node_id`) REFERENCES `tasks_node` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '节点命令' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for tasks_nodemetric
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_nodemetric`;
+CREATE TABLE `tasks_nodemetric`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `ts` datetime(6) NOT NULL COMMENT '时间',
+  `cpu_percent` double NULL DEFAULT NULL COMMENT 'CPU使用率',
+  `memory_percent` double NULL DEFAULT NULL COMMENT '内存使用率',
+  `running_jobs` int NULL DEFAULT NULL COMMENT '运行中任务数',
+  `queue_depth` int NULL DEFAULT NULL COMMENT '排队任务数',
+  `node_id` bigint NOT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `nodemetric_node_ts_idx`(`node_id` ASC, `ts` ASC) USING BTREE,
+  INDEX `nodemetric_ts_idx`(`ts` ASC) USING BTREE,
+  CONSTRAINT `tasks_nodemetric_node_id_fk` FOREIGN KEY (`node_id`) REFERENCES `tasks_node` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '节点资源数据' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for tasks_nodemetricrollup
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_nodemetricrollup`;
+CREATE TABLE `tasks_nodemetricrollup`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `bucket` datetime(6) NOT NULL COMMENT '时间（分钟）',
+  `samples` int NOT NULL COMMENT '样本数',
+  `cpu_avg` double NULL DEFAULT NULL COMMENT 'CPU平均',
+  `cpu_max` double NULL DEFAULT NULL COMMENT 'CPU最大',
+  `memory_avg` double NULL DEFAULT NULL COMMENT '内存平均',
+  `memory_max` double NULL DEFAULT NULL COMMENT '内存最大',
+  `running_jobs_avg` double NULL DEFAULT NULL COMMENT '运行中任务数平均',
+  `running_jobs_max` int NULL DEFAULT NULL COMMENT '运行中任务数最大',
+  `queue_depth_avg` double NULL DEFAULT NULL COMMENT '排队任务数平均',
+  `queue_depth_max` int NULL DEFAULT NULL COMMENT '排队任务数最大',
+  `node_id` bigint NOT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `nodemetricrollup_node_bucket_uniq`(`node_id` ASC, `bucket` ASC) USING BTREE,
+  INDEX `nodemetricrollup_bucket_idx`(`bucket` ASC) USING BTREE,
+  CONSTRAINT `tasks_nodemetricrollup_node_id_fk` FOREIGN KEY (`node_id`) REFERENCES `tasks_node` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '节点资源汇总' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for tasks_searchindexentry
+-- 本地倒排索引，仅 SEARCH_BACKEND=index 时使用
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_searchindexentry`;
+CREATE TABLE `tasks_searchindexentry`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `kind` varchar(10) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '类型',
+  `object_id` bigint NOT NULL COMMENT '对象ID',
+  `term` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '词',
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `searchindex_term_idx`(`kind` ASC, `term` ASC, `object_id` ASC) USING BTREE,
+  INDEX `searchindex_object_idx`(`kind` ASC, `object_id` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '搜索索引' ROW_FORMAT = Dynamic;
+
 -- ----------------------------
 -- Table structure for tasks_task
 -- ----------------------------
@@ -47,12 +208,41 @@ CREATE TABLE `tasks_task`  (
   `command_type` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '命令类型',
   `requirements` text CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL COMMENT '依赖包',
   `status` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT 'active' COMMENT '状态',
+  `skip_if_running` tinyint(1) NOT NULL DEFAULT 0 COMMENT '运行中时跳过触发',
+  `coalesce_seconds` int NOT NULL DEFAULT 0 COMMENT '合并触发间隔（秒）',
+  `timeout_seconds` int NOT NULL DEFAULT 0 COMMENT '执行超时（秒）',
+  `last_job_status` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL COMMENT '最近执行状态',
+  `last_run_at` datetime(6) NULL DEFAULT NULL COMMENT '最近执行时间',
+  `last_duration` double NULL DEFAULT NULL COMMENT '最近执行耗时（秒）',
+  `consecutive_failures` int NOT NULL DEFAULT 0 COMMENT '连续失败次数',
+  `success_rate_7d` double NULL DEFAULT NULL COMMENT '7天成功率',
   `created_at` datetime(6) NOT NULL COMMENT '创建时间',
   `updated_at` datetime(6) NOT NULL COMMENT '更新时间',
   `node_id` bigint NULL DEFAULT NULL,
+  `change_seq` bigint NOT NULL DEFAULT 0 COMMENT '变更序号',
   PRIMARY KEY (`id`) USING BTREE,
+  INDEX `tasks_task_change_seq_idx`(`change_seq` ASC) USING BTREE,
   INDEX `tasks_task_node_id_fk`(`node_id` ASC) USING BTREE,
+  INDEX `task_status_node_idx`(`status` ASC, `node_id` ASC) USING BTREE,
+  FULLTEXT INDEX `task_fulltext_idx`(`name`, `description`, `command`) WITH PARSER `ngram`,
   CONSTRAINT `tasks_task_node_id_fk` FOREIGN KEY (`node_id`) REFERENCES `tasks_node` (`id`) ON DELETE SET NULL ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 4 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '任务' ROW_FORMAT = Dynamic;
 
+-- ----------------------------
+-- Table structure for tasks_taskdependency
+-- ----------------------------
+DROP TABLE IF EXISTS `tasks_taskdependency`;
+CREATE TABLE `tasks_taskdependency`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `trigger` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT 'success' COMMENT '触发条件',
+  `created_at` datetime(6) NOT NULL COMMENT '创建时间',
+  `downstream_id` bigint NOT NULL COMMENT '下游任务',
+  `upstream_id` bigint NOT NULL COMMENT '上游任务',
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `taskdependency_edge_uniq`(`upstream_id` ASC, `downstream_id` ASC) USING BTREE,
+  INDEX `tasks_taskdependency_downstream_id_fk`(`downstream_id` ASC) USING BTREE,
+  CONSTRAINT `tasks_taskdependency_downstream_id_fk` FOREIGN KEY (`downstream_id`) REFERENCES `tasks_task` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT,
+  CONSTRAINT `tasks_taskdependency_upstream_id_fk` FOREIGN KEY (`upstream_id`) REFERENCES `tasks_task` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci COMMENT = '任务依赖' ROW_FORMAT = Dynamic;
+
 SET FOREIGN_KEY_CHECKS = 1;
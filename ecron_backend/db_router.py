@@ -0,0 +1,123 @@
+"""
+读写分离
+
+写入和事务内的读取始终走主库（default）。视图通过 ReplicaReadMixin 声明可以读从库的
+action（列表、详情、搜索、导出等），这些请求中的查询随机分配到健康的从库：
+
+- 从库延迟超过 REPLICA_MAX_LAG 秒或无法连接时跳过，没有可用从库时回到主库；
+  延迟检查结果在进程内缓存 REPLICA_CHECK_INTERVAL 秒；
+- 客户端发出写请求后的 REPLICA_STICKY_SECONDS 秒内（通过 cookie 标记），
+  其读请求也走主库，保证能读到自己刚写入的数据；
+- 不保存 cookie 的客户端（脚本、节点等）在需要读到自己写入的数据时带请求头
+  X-Read-Primary: 1，该请求走主库。
+
+从库通过环境变量 DB_REPLICAS 配置，见 settings.py。
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('backend')
+
+STICKY_COOKIE = 'ecron_primary'
+PRIMARY_HEADER = 'X-Read-Primary'
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+# alias -> (检查时间, 是否可用)
+_health = {}
+_health_lock = threading.Lock()
+
+
+def replica_aliases():
+    return [alias for alias in settings.REPLICA_DATABASES if alias in settings.DATABASES]
+
+
+def read_from_replica(enabled=True):
+    _use_replica.set(enabled)
+
+
+def _replica_lag(alias):
+    """返回从库延迟（秒），无法判断时返回 None"""
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW REPLICA STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            # 不是从库（例如本地用两个独立实例测试），视为无延迟
+            return 0
+        columns = [col[0] for col in cursor.description]
+    return dict(zip(columns, row)).get('Seconds_Behind_Source')
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    cached = _health.get(alias)
+    if cached is not None and now - cached[0] < settings.REPLICA_CHECK_INTERVAL:
+        return cached[1]
+
+    try:
+        lag = _replica_lag(alias)
+        healthy = lag is not None and lag <= settings.REPLICA_MAX_LAG
+        if not healthy:
+            logger.warning('从库延迟过大或复制已停止，暂时使用主库: %s, 延迟: %s', alias, lag)
+    except Exception as e:
+        healthy = False
+        logger.warning('从库不可用，暂时使用主库: %s, 错误: %s', alias, e)
+
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or connections['default'].in_atomic_block:
+            return 'default'
+        candidates = [alias for alias in replica_aliases() if is_healthy(alias)]
+        return random.choice(candidates) if candidates else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaMiddleware:
+    """每个请求开始时重置为读主库；写请求后设置 sticky cookie"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        read_from_replica(False)
+        response = self.get_response(request)
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class ReplicaReadMixin:
+    """ViewSet 中 replica_actions 列出的 GET 请求读从库（带 sticky cookie 或 X-Read-Primary 头时除外）"""
+
+    replica_actions = ('list', 'retrieve', 'search', 'export')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method == 'GET' and self.action in self.replica_actions
+                and STICKY_COOKIE not in request.COOKIES and not request.headers.get(PRIMARY_HEADER)):
+            read_from_replica()
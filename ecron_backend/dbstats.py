@@ -0,0 +1,38 @@
+"""
+数据库连接统计：每个 worker 进程新建连接的次数（衡量连接复用效果），
+以及启用 DB_POOL 时各连接池的状态。
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+_created = Counter()
+_lock = threading.Lock()
+_started = time.time()
+
+
+def record_connection(alias):
+    with _lock:
+        _created[alias] += 1
+
+
+def snapshot():
+    from .mysql_pool.pool import pool_stats
+
+    pools = pool_stats()
+    uptime = time.time() - _started
+    databases = {}
+    for alias, config in settings.DATABASES.items():
+        databases[alias] = {
+            'engine': config['ENGINE'],
+            'conn_max_age': config.get('CONN_MAX_AGE', 0),
+            'conn_health_checks': config.get('CONN_HEALTH_CHECKS', False),
+            'connections_created': _created[alias],
+            'connections_per_minute': round(_created[alias] / uptime * 60, 2),
+            'pool': pools.get(alias),
+        }
+    return {'pid': os.getpid(), 'uptime_seconds': round(uptime), 'databases': databases}
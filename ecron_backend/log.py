@@ -0,0 +1,183 @@
+"""
+日志配置
+
+通过 settings.LOGGING_CONFIG 指向 configure_logging：先按 settings.LOGGING 做
+dictConfig，再把各 logger 上的输出 handler 挪到后台线程（QueueHandler +
+QueueListener），请求线程只负责把日志记录放进队列。
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import threading
+import uuid
+
+# 当前请求的日志上下文（request_id / task_id / node_id 等），由中间件重置
+_log_context = contextvars.ContextVar('log_context', default={})
+
+# 结构化输出时从日志记录中提取的字段
+CONTEXT_FIELDS = ('request_id', 'task_id', 'node_id', 'node_name', 'job_id')
+
+_listeners = []
+
+
+def bind(**fields):
+    """向当前请求的日志上下文追加字段"""
+    context = dict(_log_context.get())
+    context.update({k: v for k, v in fields.items() if v is not None})
+    _log_context.set(context)
+
+
+def reset(**fields):
+    """重置日志上下文，返回的 token 可用于 restore"""
+    return _log_context.set(dict(fields))
+
+
+def restore(token):
+    _log_context.reset(token)
+
+
+def get_context():
+    return _log_context.get()
+
+
+class ContextFilter(logging.Filter):
+    """把请求上下文写入日志记录，必须挂在 logger 上以便在请求线程中执行"""
+
+    def filter(self, record):
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    对带 sample_key 的 DEBUG 日志按 1/rate 采样，例如心跳等高频路径。
+    未设置 sample_key 或级别高于 DEBUG 的日志不受影响。
+    """
+
+    def __init__(self, rate=100):
+        super().__init__()
+        self.rate = max(int(rate), 1)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample_key', None)
+        if key is None or record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+        with self._lock:
+            count = self._counters.get(key, 0)
+            self._counters[key] = count + 1
+        if count % self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """单行 JSON 格式，消息在后台线程中才做 % 格式化"""
+
+    def format(self, record):
+        data = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + '.%03d' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        for field in CONTEXT_FIELDS + ('sample_rate',):
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """进程内队列，直接传递原始记录，格式化留给后台线程"""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # 队列满时丢弃，避免日志反过来阻塞请求
+            pass
+
+
+def _start_listener(target_handlers, queue_size):
+    log_queue = queue.Queue(queue_size)
+    listener = logging.handlers.QueueListener(
+        log_queue, *target_handlers, respect_handler_level=True
+    )
+    listener.start()
+    handler = _QueueHandler(log_queue)
+    _listeners.append((listener, handler))
+    return handler
+
+
+def _stop_listeners():
+    while _listeners:
+        listener, _ = _listeners.pop()
+        listener.stop()
+
+
+def _restart_listeners_after_fork():
+    # gunicorn --preload 时子进程不会继承后台线程，换一个新队列后重新启动
+    for listener, handler in _listeners:
+        log_queue = queue.Queue(handler.queue.maxsize)
+        listener.queue = handler.queue = log_queue
+        listener._thread = None
+        listener.start()
+
+
+def configure_logging(logging_settings):
+    """LOGGING_CONFIG 入口"""
+    logging_settings = dict(logging_settings)
+    async_loggers = logging_settings.pop('async_loggers', ())
+    queue_size = logging_settings.pop('queue_size', 10000)
+    logging.config.dictConfig(logging_settings)
+
+    _stop_listeners()
+    for name in async_loggers:
+        logger = logging.getLogger(name or None)
+        handlers = list(logger.handlers)
+        if not handlers:
+            continue
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(_start_listener(handlers, queue_size))
+
+
+atexit.register(_stop_listeners)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners_after_fork)
+
+
+class RequestContextMiddleware:
+    """为每个请求生成 request_id 并写入日志上下文和响应头"""
+
+    header = 'HTTP_X_REQUEST_ID'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get(self.header) or uuid.uuid4().hex
+        token = reset(request_id=request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            restore(token)
+        response['X-Request-ID'] = request_id
+        return response
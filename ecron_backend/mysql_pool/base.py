@@ -0,0 +1,33 @@
+"""
+带连接池的 MySQL 后端，DB_POOL=True 时由 settings.py 启用（ENGINE = 'ecron_backend.mysql_pool'）。
+
+Django 在请求结束时关闭连接（CONN_MAX_AGE=0），这里的关闭改为回滚后归还到池中，
+下一个请求直接取用，不再重新握手；参数见 DATABASES[...]['POOL_OPTIONS']。
+"""
+
+from django.db.backends.mysql import base
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict)
+        return pool.checkout(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = get_pool(self.alias, self.settings_dict)
+        if getattr(self.connection, '_pool', None) is not pool:
+            # fork 前在父进程中打开的连接，直接关闭
+            self.connection.close()
+            return
+        # 事务中途关闭或连接出错时不归还
+        reusable = not self.in_atomic_block
+        if reusable:
+            try:
+                self.connection.rollback()
+            except Exception:
+                reusable = False
+        pool.checkin(self.connection, reusable)
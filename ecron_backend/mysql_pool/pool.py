@@ -0,0 +1,124 @@
+"""
+进程内的数据库连接池
+
+每个 worker 进程、每个数据库别名一个池，同时打开的连接数不超过 size，
+池满时等待 timeout 秒后报错。空闲超过 ping_after 秒的连接取出前先 ping，
+存活超过 recycle 秒的连接丢弃重建，避免被 MySQL wait_timeout 断开。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(self, alias, size, timeout, recycle, ping_after):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        # (连接, 创建时间, 归还时间)，后进先出，让多余的连接自然空闲过期
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'returned': 0,
+            'discarded': 0,
+            'wait_timeouts': 0,
+            'in_use': 0,
+        }
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self.stats[key] += delta
+
+    def _discard(self, conn):
+        self._count('discarded')
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def checkout(self, connect):
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('wait_timeouts')
+            raise OperationalError(f'数据库连接池已满: {self.alias} (size={self.size})')
+        try:
+            now = time.monotonic()
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, created_at, returned_at = self._idle.pop()
+                if self.recycle and now - created_at > self.recycle:
+                    self._discard(conn)
+                    continue
+                if now - returned_at > self.ping_after:
+                    try:
+                        conn.ping()
+                    except Exception:
+                        self._discard(conn)
+                        continue
+                conn._pool_created_at = created_at
+                conn._pool = self
+                self._count('reused')
+                self._count('in_use')
+                return conn
+
+            conn = connect()
+            conn._pool_created_at = now
+            conn._pool = self
+            self._count('created')
+            self._count('in_use')
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def checkin(self, conn, reusable=True):
+        self._count('in_use', -1)
+        if reusable:
+            with self._lock:
+                self._idle.append((conn, getattr(conn, '_pool_created_at', 0), time.monotonic()))
+                self.stats['returned'] += 1
+        else:
+            self._discard(conn)
+        self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, idle=len(self._idle), size=self.size)
+
+
+def get_pool(alias, settings_dict):
+    # fork 之后子进程不能复用父进程的连接，按 pid 区分
+    key = (os.getpid(), alias)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = settings_dict.get('POOL_OPTIONS', {})
+                pool = ConnectionPool(
+                    alias,
+                    size=options.get('size', 10),
+                    timeout=options.get('timeout', 10),
+                    recycle=options.get('recycle', 3600),
+                    ping_after=options.get('ping_after', 30),
+                )
+                _pools[key] = pool
+    return pool
+
+
+def pool_stats():
+    pid = os.getpid()
+    return {alias: pool.snapshot() for (owner, alias), pool in _pools.items() if owner == pid}
@@ -0,0 +1,277 @@
+"""
+慢请求采样分析
+
+PROFILE_SLOW_MS > 0 时启用 SlowRequestProfilerMiddleware：
+
+- 每个请求只登记开始时间、记录 ORM 查询和对执行节点的调用（各一个元组），
+  请求运行超过 PROFILE_SAMPLE_AFTER_MS 后，后台采样线程每隔 PROFILE_SAMPLE_INTERVAL_MS
+  通过 sys._current_frames() 读取该请求线程的调用栈并计数；
+- 请求总耗时达到 PROFILE_SLOW_MS 时，把调用栈（折叠格式，可直接交给 flamegraph.pl
+  或 speedscope）、查询日志和节点调用耗时保存到 PROFILE_DIR，最多保留 PROFILE_MAX_FILES 个；
+- 没有请求超过采样起点时采样线程处于等待状态，未达到阈值的请求不产生任何文件。
+
+保存的分析结果通过 /api/ops/profiles/ 查看和下载。
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('backend')
+
+# 当前请求的分析记录，NodeClient 通过 record_node_call 写入
+_current = contextvars.ContextVar('profiled_request', default=None)
+
+# 每个请求最多记录的查询 / 节点调用数
+MAX_EVENTS = 5000
+
+_NAME_RE = re.compile(r'^[\w.-]+\.json$')
+
+
+class _Request:
+    __slots__ = ('thread_id', 'started', 'stacks', 'samples', 'queries', 'node_calls', 'dropped')
+
+    def __init__(self):
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.samples = 0
+        self.queries = []
+        self.node_calls = []
+        self.dropped = 0
+
+    def add(self, events, item):
+        if len(events) < MAX_EVENTS:
+            events.append(item)
+        else:
+            self.dropped += 1
+
+
+class _Sampler:
+    """后台采样线程，所有请求共用"""
+
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def register(self, record):
+        with self._lock:
+            self._active[record.thread_id] = record
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-sampler', daemon=True)
+                self._thread.start()
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def unregister(self, record):
+        with self._lock:
+            self._active.pop(record.thread_id, None)
+
+    def _run(self):
+        after = settings.PROFILE_SAMPLE_AFTER_MS / 1000
+        interval = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        while True:
+            # 在锁内采样：unregister 返回后该请求的调用栈不会再被修改
+            with self._lock:
+                records = list(self._active.values())
+                if not records:
+                    self._wakeup.clear()
+                now = time.perf_counter()
+                due = [record for record in records if now - record.started >= after]
+                if due:
+                    frames = sys._current_frames()
+                    for record in due:
+                        frame = frames.get(record.thread_id)
+                        if frame is not None:
+                            record.stacks[_stack(frame)] += 1
+                            record.samples += 1
+                    del frames
+            if not records:
+                self._wakeup.wait()
+            elif due:
+                time.sleep(interval)
+            else:
+                # 最早的请求到达采样起点之前不需要醒来
+                time.sleep(max(min(after - (now - record.started) for record in records), interval))
+
+
+_sampler = _Sampler()
+
+
+def _stack(frame):
+    """从外到内的调用栈，每帧为 '函数 (文件:行号)'"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f'{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    frames.reverse()
+    return tuple(frames)
+
+
+def _short_path(filename):
+    marker = f'{os.sep}site-packages{os.sep}'
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    for prefix in (str(settings.BASE_DIR) + os.sep, sysconfig.get_path('stdlib') + os.sep):
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def _elapsed_ms(record, started=None):
+    return round(((started or time.perf_counter()) - record.started) * 1000, 3)
+
+
+class _QueryRecorder:
+    """connection.execute_wrapper 回调，记录查询的开始时间和耗时"""
+
+    def __init__(self, alias, record):
+        self.alias = alias
+        self.record = record
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            record = self.record
+            record.add(record.queries, (self.alias, sql, many, started, time.perf_counter()))
+
+
+def record_node_call(method, url, started, status=None, error=None):
+    """NodeClient 每次请求后调用；当前请求未被分析时直接返回"""
+    record = _current.get()
+    if record is not None:
+        record.add(record.node_calls, (method, url, status, error, started, time.perf_counter()))
+
+
+class SlowRequestProfilerMiddleware:
+    """慢请求采样分析，PROFILE_SLOW_MS 为 0 时不加载"""
+
+    def __init__(self, get_response):
+        if settings.PROFILE_SLOW_MS <= 0:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = _Request()
+        token = _current.set(record)
+        _sampler.register(record)
+        response = None
+        try:
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_QueryRecorder(alias, record)))
+                response = self.get_response(request)
+            return response
+        finally:
+            _sampler.unregister(record)
+            _current.reset(token)
+            elapsed = _elapsed_ms(record)
+            if elapsed >= settings.PROFILE_SLOW_MS:
+                try:
+                    save(record, elapsed, request, response)
+                except OSError as e:
+                    logger.warning('保存慢请求分析结果失败: %s', e)
+
+
+def save(record, elapsed, request, response):
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None else None
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{record.thread_id % 100000}-{int(elapsed)}ms.json'
+    data = {
+        'name': name,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': view,
+        'status_code': response.status_code if response is not None else None,
+        'duration_ms': elapsed,
+        'pid': os.getpid(),
+        'created_at': time.time(),
+        'sample_interval_ms': settings.PROFILE_SAMPLE_INTERVAL_MS,
+        'sample_after_ms': settings.PROFILE_SAMPLE_AFTER_MS,
+        'samples': record.samples,
+        'stacks': [[list(frames), count] for frames, count in record.stacks.most_common()],
+        'queries': [
+            {'alias': alias, 'sql': sql, 'many': many,
+             'start_ms': _elapsed_ms(record, started), 'duration_ms': round((ended - started) * 1000, 3)}
+            for alias, sql, many, started, ended in record.queries
+        ],
+        'node_calls': [
+            {'method': method, 'url': url, 'status_code': status, 'error': error,
+             'start_ms': _elapsed_ms(record, started), 'duration_ms': round((ended - started) * 1000, 3)}
+            for method, url, status, error, started, ended in record.node_calls
+        ],
+        'dropped_events': record.dropped,
+    }
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(path + '.tmp', path)
+    logger.warning('慢请求: %s %s 耗时 %sms，采样 %s 次，查询 %s 条，节点调用 %s 次，分析结果: %s',
+                   request.method, request.get_full_path(), int(elapsed), record.samples, len(record.queries),
+                   len(record.node_calls), name)
+    _prune()
+
+
+def _prune():
+    names = sorted(_profile_names(), reverse=True)
+    for name in names[settings.PROFILE_MAX_FILES:]:
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(settings.PROFILE_DIR, name))
+
+
+def _profile_names():
+    try:
+        return [name for name in os.listdir(settings.PROFILE_DIR) if _NAME_RE.match(name)]
+    except FileNotFoundError:
+        return []
+
+
+def list_profiles():
+    """已保存的分析结果摘要，最新的在前"""
+    profiles = []
+    for name in sorted(_profile_names(), reverse=True):
+        data = load(name)
+        if data is None:
+            continue
+        summary = {
+            key: data.get(key) for key in
+            ('name', 'method', 'path', 'view', 'status_code', 'duration_ms', 'pid', 'created_at', 'samples')
+        }
+        summary['queries'] = len(data.get('queries', ()))
+        summary['node_calls'] = len(data.get('node_calls', ()))
+        profiles.append(summary)
+    return profiles
+
+
+def load(name):
+    """读取分析结果，名称不合法或文件不存在时返回 None"""
+    if not _NAME_RE.match(name or ''):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILE_DIR, name), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def folded(data):
+    """折叠格式的调用栈（每行 '帧;帧;帧 次数'），供 flamegraph.pl / speedscope 使用"""
+    return ''.join(f'{";".join(frames)} {count}\n' for frames, count in data.get('stacks', ()))
@@ -48,6 +48,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ecron_backend.log.RequestContextMiddleware',
+    'ecron_backend.tracing.TracingMiddleware',
+    'ecron_backend.profiling.SlowRequestProfilerMiddleware',
+    'ecron_backend.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -78,13 +82,31 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ecron_backend.wsgi.application'
 
+# 运行配置：full 为完整配置（含 admin 和会话、消息等中间件，供本地调试）；
+# api 只保留接口需要的应用和中间件，不加载模板和 admin，缩短 worker 启动时间、减少内存
+SETTINGS_PROFILE = os.getenv('SETTINGS_PROFILE', 'full')
+if SETTINGS_PROFILE == 'api':
+    INSTALLED_APPS = ['rest_framework', 'corsheaders', 'tasks']
+    MIDDLEWARE = [
+        'ecron_backend.log.RequestContextMiddleware',
+        'ecron_backend.tracing.TracingMiddleware',
+        'ecron_backend.profiling.SlowRequestProfilerMiddleware',
+        'ecron_backend.db_router.ReplicaMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'corsheaders.middleware.CorsMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ]
+    TEMPLATES = []
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# DB_ENGINE=django.db.backends.sqlite3 用于本地运行测试，见 README
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.mysql')
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.mysql'),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', 'ecron'),
         'USER': os.getenv('DB_USER', 'ecron'),
         'PASSWORD': os.getenv('DB_PASSWORD', 'ecron123'),
@@ -93,10 +115,75 @@ DATABASES = {
         'OPTIONS': {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-        }
+        } if DB_ENGINE == 'django.db.backends.mysql' else {},
+        # 持久连接：请求结束后保留连接，复用前检查是否仍然可用
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# 连接池模式（仅 MySQL）：每个 worker 最多 DB_POOL_SIZE 个连接，请求结束时归还到池中
+if os.getenv('DB_POOL', 'False') == 'True' and DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+    DATABASES['default'].update(
+        ENGINE='ecron_backend.mysql_pool',
+        CONN_MAX_AGE=0,
+        POOL_OPTIONS={
+            'size': int(os.getenv('DB_POOL_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+            'ping_after': float(os.getenv('DB_POOL_PING_AFTER', '30')),
+        },
+    )
+
+# 只读从库，逗号分隔；MySQL 为 host[:port]，SQLite 为数据库文件路径（用于本地测试）
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    alias = f'replica{index}'
+    DATABASES[alias] = dict(DATABASES['default'])
+    if DATABASES[alias]['ENGINE'].endswith('sqlite3'):
+        DATABASES[alias]['NAME'] = replica.strip()
+    else:
+        host, _, port = replica.strip().partition(':')
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES['default']['PORT'])
+    REPLICA_DATABASES.append(alias)
+
+# 变更序号（/api/changes）在单独的连接上用短事务分配，计数行不会锁到写事务提交（仅 MySQL），
+# 见 tasks/models.py ChangeSequence；CHANGE_LEASE_SECONDS 需要大于最长的写事务
+if DB_ENGINE == 'django.db.backends.mysql' and os.getenv('CHANGE_SEQUENCE_CONNECTION', 'True') == 'True':
+    # 测试时与 default 使用同一个测试库
+    DATABASES['sequence'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+CHANGE_SEQUENCE_DB = 'sequence' if 'sequence' in DATABASES else 'default'
+CHANGE_LEASE_SECONDS = int(os.getenv('CHANGE_LEASE_SECONDS', '120'))
+
+DATABASE_ROUTERS = ['ecron_backend.db_router.ReplicaRouter']
+# 从库延迟超过该值（秒）时读主库
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', '5'))
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', '10'))
+# 客户端写入后多长时间内（秒）读主库
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+
+# Cache
+# CACHE_BACKEND=file 时多个 worker 共享缓存（默认）；locmem 仅适合单进程开发
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', '/tmp/ecron_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    } if CACHE_BACKEND == 'file' else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecron',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# 列表/详情接口响应缓存的过期时间（秒），数据变更时会立即失效
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300'))
+# 节点列表/详情的缓存时间（秒）：心跳时间和资源快照不使缓存失效，最多延迟这么久
+NODE_CACHE_TIMEOUT = int(os.getenv('NODE_CACHE_TIMEOUT', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -160,6 +247,7 @@ CORS_ALLOW_HEADERS = [
     'origin',
     'user-agent',
     'x-csrftoken',
+    'x-read-primary',
     'x-requested-with',
 ]
 
@@ -168,6 +256,180 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'DEFAULT_PAGINATION_CLASS': 'tasks.pagination.StandardPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'tasks.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'PAGE_SIZE': int(os.getenv('PAGE_SIZE', '10')),
+    # 令牌桶限流，见 tasks/throttling.py；速率留空表示该类接口不限流
+    'DEFAULT_THROTTLE_CLASSES': ['tasks.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'read': os.getenv('THROTTLE_RATE_READ', '50/s'),
+        'write': os.getenv('THROTTLE_RATE_WRITE', '20/s'),
+        'export': os.getenv('THROTTLE_RATE_EXPORT', '10/min'),
+        'heartbeat': os.getenv('THROTTLE_RATE_HEARTBEAT', '30/min'),
+        # 同一客户端地址所有心跳的总量，一台机器上部署多个节点时需要调大
+        'heartbeat_client': os.getenv('THROTTLE_RATE_HEARTBEAT_CLIENT', '10/s'),
+    },
+}
+if SETTINGS_PROFILE == 'api':
+    # 接口不使用认证，不需要 django.contrib.auth 和可浏览 API 的模板
+    REST_FRAMEWORK.update({
+        'DEFAULT_AUTHENTICATION_CLASSES': [],
+        'UNAUTHENTICATED_USER': None,
+        'DEFAULT_RENDERER_CLASSES': ['tasks.renderers.FastJSONRenderer'],
+    })
+
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'True') == 'True'
+# 令牌桶存储：memory（每个 worker 单独计数）或 redis（共享，需要安装 redis 包）
+THROTTLE_STORE = os.getenv('THROTTLE_STORE', 'memory')
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+# 客户端通过 ?page_size= 可请求的最大分页大小
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+# 流式导出每批读取的行数
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+# /api/changes 默认每次返回的变更条数
+CHANGES_PAGE_SIZE = int(os.getenv('CHANGES_PAGE_SIZE', '500'))
+
+# 日志配置
+# 输出 handler 由 ecron_backend.log.configure_logging 挪到后台队列线程，
+# 请求线程只做级别判断和入队
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.getenv('LOG_FILE', str(BASE_DIR / 'backend.log'))
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
+# 链路追踪，TRACE_EXPORTER 可选 file / stdout
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False') == 'True'
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'file')
+TRACE_FILE = os.getenv('TRACE_FILE', str(BASE_DIR / 'traces.jsonl'))
+
+# 慢请求采样分析，见 ecron_backend/profiling.py；PROFILE_SLOW_MS 为 0 时不启用
+PROFILE_SLOW_MS = int(os.getenv('PROFILE_SLOW_MS', '0'))
+PROFILE_SAMPLE_AFTER_MS = int(os.getenv('PROFILE_SAMPLE_AFTER_MS', '200'))
+PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '10'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))
+# /api/ops/profiles/ 的访问令牌（请求头 X-Ops-Token），为空时只允许管理员用户访问
+OPS_TOKEN = os.getenv('OPS_TOKEN', '')
+
+LOGGING_CONFIG = 'ecron_backend.log.configure_logging'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'ecron_backend.log.JsonFormatter',
+        },
+        'text': {
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        },
+        'span': {
+            '()': 'ecron_backend.tracing.SpanFormatter',
+        },
+    },
+    'filters': {
+        'context': {
+            '()': 'ecron_backend.log.ContextFilter',
+        },
+        'sampling': {
+            '()': 'ecron_backend.log.SamplingFilter',
+            'rate': int(os.getenv('LOG_DEBUG_SAMPLE_RATE', '100')),
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': LOG_FORMAT,
+        },
+        'file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024))),
+            'backupCount': int(os.getenv('LOG_BACKUP_COUNT', '5')),
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': LOG_FORMAT,
+        },
+        'trace_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': TRACE_FILE,
+            'maxBytes': int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024))),
+            'backupCount': int(os.getenv('LOG_BACKUP_COUNT', '5')),
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'span',
+        },
+        'trace_stdout': {
+            'class': 'logging.StreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'span',
+        },
+    },
+    'loggers': {
+        'backend': {
+            'handlers': ['console', 'file'],
+            'filters': ['context', 'sampling'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'trace': {
+            'handlers': ['trace_' + TRACE_EXPORTER] if TRACE_EXPORTER in ('file', 'stdout') else [],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+    # 以下两项由 configure_logging 处理，不传给 dictConfig
+    'async_loggers': ['backend', 'trace'],
+    'queue_size': int(os.getenv('LOG_QUEUE_SIZE', '10000')),
 }
+
+# 执行节点调用
+NODE_CLIENT_TIMEOUT = float(os.getenv('NODE_CLIENT_TIMEOUT', '10'))
+NODE_CLIENT_MAX_RETRIES = int(os.getenv('NODE_CLIENT_MAX_RETRIES', '3'))
+NODE_CLIENT_RETRY_DELAY = float(os.getenv('NODE_CLIENT_RETRY_DELAY', '1'))
+# 请求体超过该大小且节点支持时压缩（gzip / zstd）
+NODE_COMPRESS_MIN_BYTES = int(os.getenv('NODE_COMPRESS_MIN_BYTES', '4096'))
+# /tasks/batch 每批最多的任务数
+NODE_BATCH_SIZE = int(os.getenv('NODE_BATCH_SIZE', '50'))
+# /health 中声明的节点能力缓存时间（秒）
+NODE_CAPABILITIES_TTL = int(os.getenv('NODE_CAPABILITIES_TTL', '300'))
+
+# 节点命令 outbox：inline 表示请求中直接执行命令（失败后交给分发器重试），
+# async 表示只写入命令，全部由 manage.py dispatch_outbox 执行
+OUTBOX_DISPATCH = os.getenv('OUTBOX_DISPATCH', 'inline')
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', '2'))
+OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', '300'))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '120'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_CONCURRENCY = int(os.getenv('OUTBOX_CONCURRENCY', '8'))
+
+# 搜索：auto 表示 MySQL 使用 FULLTEXT 索引，其他数据库使用本地倒排索引（index）
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+# Idempotency-Key 的保存时间（秒）
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '600'))
+# 处理中的键的最短有效期（秒），实际取值不短于请求中执行节点命令的最长时间，见 tasks/idempotency.py
+IDEMPOTENCY_PENDING_TTL = int(os.getenv('IDEMPOTENCY_PENDING_TTL', '60'))
+
+# 节点资源数据：写入缓冲（条数、间隔秒数，间隔为 0 时不缓冲）、原始数据和分钟汇总的保留时间（秒）
+METRICS_BUFFER_SIZE = int(os.getenv('METRICS_BUFFER_SIZE', '200'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '10'))
+METRICS_RAW_RETENTION = int(os.getenv('METRICS_RAW_RETENTION', '3600'))
+METRICS_ROLLUP_RETENTION = int(os.getenv('METRICS_ROLLUP_RETENTION', str(7 * 24 * 3600)))
+
+# 多实例控制器（manage.py run_controller）：租约时间、健康检查和对账间隔（秒）、一致性哈希虚拟节点数
+CONTROLLER_LEASE_SECONDS = int(os.getenv('CONTROLLER_LEASE_SECONDS', '30'))
+CONTROLLER_PROBE_INTERVAL = int(os.getenv('CONTROLLER_PROBE_INTERVAL', '30'))
+CONTROLLER_RECONCILE_INTERVAL = int(os.getenv('CONTROLLER_RECONCILE_INTERVAL', '300'))
+CONTROLLER_RING_REPLICAS = int(os.getenv('CONTROLLER_RING_REPLICAS', '64'))
+
+# 执行记录超时回收（manage.py reap_jobs）：任务未设置 timeout_seconds 时的默认超时（秒，0 表示不回收）、每批行数
+JOB_DEFAULT_TIMEOUT = int(os.getenv('JOB_DEFAULT_TIMEOUT', str(24 * 3600)))
+REAPER_BATCH_SIZE = int(os.getenv('REAPER_BATCH_SIZE', '1000'))
+
+# 软删除任务的清理（manage.py purge_deleted_tasks）：保留天数、每批任务数 / 执行记录数
+TASK_PURGE_AFTER_DAYS = int(os.getenv('TASK_PURGE_AFTER_DAYS', '30'))
+TASK_PURGE_BATCH_SIZE = int(os.getenv('TASK_PURGE_BATCH_SIZE', '500'))
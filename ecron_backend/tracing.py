@@ -0,0 +1,242 @@
+"""
+请求链路追踪
+
+轻量实现，字段与 OpenTelemetry/OTLP JSON 的 span 结构保持一致，并使用 W3C
+traceparent 头在后端与执行节点之间传递上下文。span 结束后写入 'trace' logger，
+由 settings.LOGGING 决定输出到文件或标准输出（同样经过后台队列线程）。
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+
+from django.conf import settings
+from django.db import connections
+
+trace_logger = logging.getLogger('trace')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+_ROUTE_PARAM_RE = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+_TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+SERVICE_NAME = 'ecron-backend'
+
+
+def enabled():
+    return getattr(settings, 'TRACING_ENABLED', False)
+
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'trace_id', 'span_id', 'parent_id',
+                 'start_ns', 'end_ns', 'attributes', 'status', 'status_message')
+
+    def __init__(self, name, kind='INTERNAL', trace_id=None, parent_id=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id or _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = 'UNSET'
+        self.status_message = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.status = 'ERROR'
+        self.status_message = str(message)
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def to_dict(self):
+        data = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'kind': 'SPAN_KIND_' + self.kind,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'durationMs': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'status': {'code': 'STATUS_CODE_' + self.status},
+            'resource': {'service.name': SERVICE_NAME, 'process.pid': os.getpid()},
+        }
+        if self.status_message:
+            data['status']['message'] = self.status_message
+        return data
+
+
+class _NoopSpan:
+    trace_id = span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, message):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def start_span(name, kind='INTERNAL', parent=None, **attributes):
+    """
+    开启一个子 span。未启用追踪或当前不在任何 trace 中时返回空 span，
+    调用方无需判断。
+    """
+    if parent is None:
+        parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    span = Span(name, kind, trace_id=parent.trace_id, parent_id=parent.span_id,
+                attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(span)
+
+
+@contextlib.contextmanager
+def start_trace(name, **attributes):
+    """后台任务（例如 outbox 分发）使用，在没有请求上下文时开启新的 trace"""
+    if not enabled() or _current_span.get() is not None:
+        with start_span(name, **attributes) as span:
+            yield span
+        return
+
+    span = Span(name, attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(span)
+
+
+def _finish(span):
+    span.end_ns = time.time_ns()
+    if span.status == 'UNSET':
+        span.status = 'OK'
+    trace_logger.info(span.to_dict())
+
+
+def inject(headers):
+    """把当前 span 写入发往执行节点的请求头"""
+    span = _current_span.get()
+    if span is not None:
+        headers['traceparent'] = span.traceparent
+    return headers
+
+
+def extract(header_value):
+    """解析 traceparent，返回 (trace_id, parent_span_id)，无效时返回 (None, None)"""
+    match = _TRACEPARENT_RE.match(header_value or '')
+    if not match:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+def _truncate(sql, limit=1000):
+    return sql if len(sql) <= limit else sql[:limit] + '...'
+
+
+class _QueryTracer:
+    """connection.execute_wrapper 回调，每次 execute/executemany 记一个 span"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        with start_span('db.query', kind='CLIENT', **{
+            'db.system': context['connection'].vendor,
+            'db.name': self.alias,
+            'db.statement': _truncate(sql),
+            'db.batch': many,
+            'db.batch_size': len(params) if many and params is not None else 1,
+        }):
+            return execute(sql, params, many, context)
+
+
+class SpanFormatter(logging.Formatter):
+    """trace logger 使用的格式化器，在后台线程中序列化 span"""
+
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+class TracingMiddleware:
+    """
+    为每个请求创建根 span，并在请求期间追踪所有 ORM 查询。
+    上游带 traceparent 时沿用其 trace_id，响应头返回 X-Trace-Id。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+
+        trace_id, parent_id = extract(request.META.get('HTTP_TRACEPARENT'))
+        span = Span(f'HTTP {request.method}', kind='SERVER', trace_id=trace_id,
+                    parent_id=parent_id, attributes={
+                        'http.method': request.method,
+                        'http.target': request.get_full_path(),
+                    })
+        token = _current_span.set(span)
+        response = None
+        try:
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(_QueryTracer(alias))
+                    )
+                response = self.get_response(request)
+        except Exception as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            match = getattr(request, 'resolver_match', None)
+            if match is not None and match.route:
+                route = '/' + _ROUTE_PARAM_RE.sub(r'{\1}', match.route.lstrip('^').rstrip('$'))
+                span.name = f'HTTP {request.method} {route}'
+                span.set_attribute('http.route', route)
+            if response is not None:
+                span.set_attribute('http.status_code', response.status_code)
+                if response.status_code >= 500:
+                    span.set_error(f'HTTP {response.status_code}')
+            _finish(span)
+
+        response['X-Trace-Id'] = span.trace_id
+        return response
@@ -14,17 +14,27 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from tasks.views import TaskViewSet, JobViewSet, NodeViewSet
+from tasks.views import (TaskViewSet, JobViewSet, NodeViewSet, TaskDependencyViewSet,
+                         NodeCommandViewSet, ChangeFeedViewSet, OpsViewSet)
 
 router = DefaultRouter()
 router.register(r'tasks', TaskViewSet)
 router.register(r'jobs', JobViewSet)
 router.register(r'nodes', NodeViewSet)
+router.register(r'dependencies', TaskDependencyViewSet)
+router.register(r'commands', NodeCommandViewSet)
+router.register(r'changes', ChangeFeedViewSet, basename='changes')
+router.register(r'ops', OpsViewSet, basename='ops')
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
 ]
+
+# SETTINGS_PROFILE=api 时不安装 admin
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
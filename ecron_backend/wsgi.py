@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecron_backend.settings')
 
 application = get_wsgi_application()
+
+
+def warm_up():
+    """
+    提前完成 Django 在第一个请求时才做的加载（URL 配置、视图、DRF 渲染器和解析器），
+    gunicorn preload 时在 master 中调用，worker fork 后直接处理请求。不访问数据库。
+    """
+    from django.urls import resolve
+    from rest_framework.settings import api_settings
+
+    resolve('/api/')
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_PAGINATION_CLASS', 'UNAUTHENTICATED_USER'):
+        getattr(api_settings, name)
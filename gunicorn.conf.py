@@ -0,0 +1,40 @@
+"""
+gunicorn 配置：gunicorn ecron_backend.wsgi:application -c gunicorn.conf.py
+
+默认 preload：应用（Django、DRF、URL 配置和视图）在 master 中只加载一次，
+worker 通过 fork 共享这部分内存（写时复制），启动和超时重启时不用重新导入。
+"""
+
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:20130')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# 大于 0 时 worker 处理这么多请求后重启，限制内存增长
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+# 心跳文件放在内存文件系统，避免容器的 overlay 磁盘 IO 卡住导致误判超时
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from ecron_backend.wsgi import warm_up
+
+    warm_up()
+    # 把 master 中已有的对象移出 GC 跟踪，worker 中的垃圾回收不会改写这些内存页
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from django.db import connections
+
+    # 不复用 master 中打开的数据库连接（连接池按 pid 区分，已单独处理）
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
-    verbose_name = '任务管理' 
\ No newline at end of file
+    verbose_name = '任务管理'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,95 @@
+"""
+列表/详情接口的响应缓存
+
+每类数据（task、node……）在缓存中保存一个版本号，模型保存/删除时更换版本号
+（见 signals.py），缓存键和 ETag 都由版本号 + 请求路径生成。版本未变时，
+重复请求直接返回缓存的序列化结果，或在 If-None-Match 命中时返回 304，
+两种情况都不访问数据库。响应中包含频繁变化但不更换版本号的字段时（如节点的心跳时间），
+ViewSet 用 cache_max_age_setting 指定更短的有效期，ETag 同样按这个周期更换。
+
+多个 gunicorn worker 之间需要共享版本号，生产环境应使用文件缓存（默认）
+而不是进程内的 locmem。
+"""
+
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'resp-version:%s'
+RESPONSE_KEY = 'resp:%s'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:16]
+
+
+def get_versions(labels):
+    keys = [VERSION_KEY % label for label in labels]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        for key, value in missing.items():
+            # 其他进程可能已经写入，以缓存中的值为准
+            if not cache.add(key, value, None):
+                value = cache.get(key) or value
+            versions[key] = value
+    return ':'.join(versions[key] for key in keys)
+
+
+def invalidate(*labels):
+    """更换版本号，使相关缓存全部失效；在事务中调用时推迟到提交之后"""
+    def bump():
+        cache.set_many({VERSION_KEY % label: _new_version() for label in labels}, None)
+    transaction.on_commit(bump)
+
+
+class CachedResponseMixin:
+    """
+    为 ViewSet 的 list/retrieve 提供读穿缓存和 ETag 支持。
+    cache_labels 声明响应依赖的数据类别，任一类别变更都会使缓存失效。
+    """
+
+    cache_labels = ()
+    # 有效期的配置项名称，默认 RESPONSE_CACHE_TIMEOUT 且 ETag 只随版本号变化
+    cache_max_age_setting = None
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        version = get_versions(self.cache_labels)
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if self.cache_max_age_setting:
+            timeout = max(getattr(settings, self.cache_max_age_setting), 1)
+            # 按有效期分段，过期后 ETag 也随之更换
+            version = f'{version}:{int(time.time() // timeout)}'
+        digest = hashlib.md5(
+            f'{version}|{request.accepted_renderer.format}|{request.get_full_path()}'.encode()
+        ).hexdigest()
+        etag = f'"{digest}"'
+
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        key = RESPONSE_KEY % digest
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, timeout)
+        else:
+            response = Response(data)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,183 @@
+"""
+多实例控制器
+
+可以同时运行多个 manage.py run_controller 实例，每个实例在 ControllerInstance 表中
+持有一个定期续租的租约。租约未过期的实例组成一致性哈希环，每个执行节点只归属其中
+一个实例，由它负责该节点的后台工作：
+
+- dispatch：执行 outbox 中发往该节点的命令；
+- probe：对心跳超时的节点做健康检查，更新节点状态；
+- reconcile：对比节点上实际的任务（GET /tasks）与数据库，补发缺失的任务、删除多余的任务。
+
+实例加入或退出（租约过期）后，其他实例在下一轮自动重新计算归属，
+一致性哈希保证只有约 1/N 的节点迁移。
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import outbox
+from .models import ControllerInstance, Node, NodeCommand, Task
+from .node_client import NodeClient
+
+logger = logging.getLogger('backend')
+
+
+def _hash(value):
+    return int(hashlib.md5(str(value).encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """一致性哈希环，每个成员放置 replicas 个虚拟节点"""
+
+    def __init__(self, members, replicas=None):
+        replicas = replicas or settings.CONTROLLER_RING_REPLICAS
+        points = sorted(
+            (_hash(f'{member}#{i}'), member) for member in members for i in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, key):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._members[index]
+
+
+def live_instances(now=None):
+    now = now or timezone.now()
+    return list(
+        ControllerInstance.objects.filter(lease_expires_at__gt=now)
+        .order_by('instance_id').values_list('instance_id', flat=True)
+    )
+
+
+def assignments(node_ids=None):
+    """当前的节点归属：{node_id: instance_id}"""
+    ring = HashRing(live_instances())
+    if node_ids is None:
+        node_ids = Node.objects.values_list('id', flat=True)
+    return {node_id: ring.owner(node_id) for node_id in node_ids}
+
+
+def _in_thread(func, *args):
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('控制器后台任务出错: %s', func.__name__)
+    finally:
+        connections.close_all()
+
+
+class Controller:
+    def __init__(self, instance_id=None):
+        self.instance_id = instance_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.owned = set()
+
+    def renew(self):
+        """续租并重新计算本实例负责的节点"""
+        now = timezone.now()
+        ControllerInstance.objects.update_or_create(
+            instance_id=self.instance_id,
+            defaults={
+                'hostname': socket.gethostname(),
+                'pid': os.getpid(),
+                'lease_expires_at': now + timedelta(seconds=settings.CONTROLLER_LEASE_SECONDS),
+            },
+        )
+        owned = {node_id for node_id, owner in assignments().items() if owner == self.instance_id}
+        if owned != self.owned:
+            logger.info('控制器负责的节点变化: instance=%s, 节点数 %s -> %s',
+                        self.instance_id, len(self.owned), len(owned))
+        self.owned = owned
+        # 顺带清理早已过期的实例记录
+        ControllerInstance.objects.filter(
+            lease_expires_at__lt=now - timedelta(seconds=settings.CONTROLLER_LEASE_SECONDS * 10)
+        ).delete()
+        return owned
+
+    def leave(self):
+        """正常退出时释放租约，其他实例立即接手"""
+        ControllerInstance.objects.filter(instance_id=self.instance_id).delete()
+        self.owned = set()
+
+    def dispatch(self):
+        return outbox.dispatch_pending(node_ids=self.owned)
+
+    def _map(self, func, items):
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(settings.OUTBOX_CONCURRENCY, len(items))) as pool:
+            return list(pool.map(lambda item: _in_thread(func, item), items))
+
+    def probe(self):
+        """检查心跳超时的节点，返回检查的节点数"""
+        stale = timezone.now() - timedelta(seconds=settings.CONTROLLER_PROBE_INTERVAL)
+        nodes = Node.objects.filter(id__in=self.owned).filter(
+            Q(last_heartbeat__isnull=True) | Q(last_heartbeat__lt=stale)
+        )
+        return len(self._map(self._probe_node, nodes))
+
+    def _probe_node(self, node):
+        health = NodeClient(node).health()
+        new_status = 'active' if health else 'inactive'
+        if node.status != new_status:
+            logger.warning('节点状态变化: %s, %s -> %s, %s', node.name, node.status, new_status,
+                           health.error or '')
+            node.status = new_status
+            node.save(update_fields=['status', 'updated_at'])
+
+    def reconcile(self):
+        """对比节点上的任务与数据库，返回写入的修复命令数"""
+        nodes = Node.objects.filter(id__in=self.owned, status='active')
+        return sum(count or 0 for count in self._map(self._reconcile_node, nodes))
+
+    def _reconcile_node(self, node):
+        result = NodeClient(node).list_tasks(retries=1)
+        if not result:
+            logger.debug('无法获取节点上的任务列表，跳过对账: %s, %s', node.name, result.error)
+            return 0
+        actual = {
+            int(item['task_id']): item.get('is_running')
+            for item in result.response.json().get('tasks', [])
+        }
+        expected = {
+            task.id: task for task in
+            Task.objects.filter(node=node, status__in=('active', 'paused'))
+        }
+        # 已有未完成命令的任务交给 outbox，避免与正在进行的操作冲突
+        busy = set(
+            NodeCommand.objects.filter(node=node, status__in=outbox.UNFINISHED)
+            .values_list('task_id', flat=True)
+        )
+
+        commands = []
+        with transaction.atomic():
+            for task_id, task in expected.items():
+                if task_id in busy:
+                    continue
+                running = actual.get(task_id)
+                if task_id not in actual or (task.status == 'active' and running is False):
+                    commands.append(outbox.enqueue_deploy(task, start=task.status == 'active'))
+                elif task.status == 'paused' and running:
+                    commands.append(outbox.enqueue_stop(node, task_id))
+            for task_id in set(actual) - set(expected) - busy:
+                commands.append(outbox.enqueue_remove(node, task_id))
+
+        if commands:
+            logger.info('节点对账: %s, 写入修复命令 %s 条', node.name, len(commands))
+            outbox.deliver(commands)
+        return len(commands)
@@ -0,0 +1,161 @@
+"""
+执行记录导出
+
+按 ndjson / csv / parquet 流式输出执行记录（含任务名称、节点名称），供 /api/jobs/export/
+和 manage.py export_jobs 共用。行通过 fastpath.iter_values 分批读取（按主键倒序，每批一条
+带 LIMIT 的查询），每批编码后立即输出，内存占用与导出的总行数无关。
+
+parquet 需要安装 pyarrow，每批写成一个 row group。
+"""
+
+import csv
+import io
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+from .fastpath import iter_values
+from .renderers import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+# 格式 -> (Content-Type, 文件扩展名)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+JOB_STATUSES = ('running', 'success', 'failed', 'timeout')
+
+
+def parquet_available():
+    return pyarrow is not None
+
+
+def _parse_time(value, end_of_day=False):
+    """ISO 日期时间或日期；只有日期时 until 取当天结束"""
+    # 先按日期解析：parse_datetime 也接受只有日期的字符串（当天 0 点）
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f'无法解析的时间: {value}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_jobs(queryset, since=None, until=None, status=None):
+    """按开始时间区间（字符串）和状态过滤，参数不合法时抛出 ValueError"""
+    if since:
+        queryset = queryset.filter(start_time__gte=_parse_time(since))
+    if until:
+        queryset = queryset.filter(start_time__lte=_parse_time(until, end_of_day=True))
+    if status:
+        statuses = [item.strip() for item in status.split(',') if item.strip()]
+        unknown = set(statuses) - set(JOB_STATUSES)
+        if unknown:
+            raise ValueError(f'未知的状态: {",".join(sorted(unknown))}')
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def _batches(queryset, spec, chunk_size):
+    batch = []
+    for row in iter_values(queryset, spec.sources, chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _ndjson(batches, spec):
+    for batch in batches:
+        yield b''.join(dumps(spec.render(row)) + b'\n' for row in batch)
+
+
+def _csv(batches, spec):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _, _ in spec.columns)
+    for batch in batches:
+        for row in batch:
+            writer.writerow(spec.render(row).values())
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _arrow_type(field):
+    if isinstance(field, (serializers.IntegerField, serializers.PrimaryKeyRelatedField)):
+        return pyarrow.int64()
+    if isinstance(field, serializers.FloatField):
+        return pyarrow.float64()
+    if isinstance(field, serializers.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field, serializers.DateTimeField):
+        return pyarrow.timestamp('us', tz='UTC')
+    return pyarrow.string()
+
+
+class _ChunkSink(io.RawIOBase):
+    """ParquetWriter 的输出目标，写入的数据在每批之后取走"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet(batches, spec, serializer_class):
+    fields = serializer_class().fields
+    schema = pyarrow.schema([(name, _arrow_type(fields[name])) for name, _, _ in spec.columns])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    for batch in batches:
+        columns = [[row[source] for row in batch] for _, source, _ in spec.columns]
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream(fmt, queryset, spec, serializer_class, chunk_size=2000):
+    """按格式逐批输出字节串"""
+    batches = _batches(queryset, spec, chunk_size)
+    if fmt == 'csv':
+        return _csv(batches, spec)
+    if fmt == 'parquet':
+        return _parquet(batches, spec, serializer_class)
+    return _ndjson(batches, spec)
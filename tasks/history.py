@@ -0,0 +1,116 @@
+"""
+任务执行概况
+
+Task 上冗余保存最近一次完成的执行（状态、开始时间、耗时）、连续失败次数和 7 天成功率，
+任务列表不需要再逐个查询执行记录：
+
+- 执行记录变为完成状态时（Job.save 经 signals，回收器的批量 UPDATE 直接调用）
+  在同一事务中用一条 UPDATE 更新任务行，并分配新的变更序号；
+- 执行记录完成时没有 end_time 的（节点通过 PATCH /api/jobs/ 回报）由接口补上；
+- “最近一次”按执行记录 ID 的先后（同一批内也按 ID 排序，refresh 与此一致），
+  连续失败次数为最近一次成功之后的失败数，timeout 按失败计；
+- 7 天成功率在每次完成时按 (task, start_time) 索引重新统计，长时间没有执行的任务
+  不会随时间变化，可定期运行 manage.py refresh_task_history 刷新（也用于补齐历史数据）。
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import cache
+from .models import ChangeSequence, Job, Task
+from .workflow import FINISHED
+
+SUCCESS_RATE_WINDOW = timedelta(days=7)
+
+
+def _duration(job):
+    if job.end_time is None or job.start_time is None:
+        return None
+    return round((job.end_time - job.start_time).total_seconds(), 3)
+
+
+def _success_rates(task_ids, now):
+    """{task_id: 窗口内的成功率}，窗口内没有完成的执行时不出现"""
+    rows = (
+        Job.objects.filter(task_id__in=task_ids, start_time__gte=now - SUCCESS_RATE_WINDOW,
+                           status__in=FINISHED)
+        .values('task_id')
+        .annotate(total=Count('id'), succeeded=Count('id', filter=Q(status='success')))
+        .order_by()
+    )
+    return {row['task_id']: round(row['succeeded'] / row['total'], 4) for row in rows}
+
+
+def record_finished(jobs, now=None):
+    """jobs 为刚完成的执行记录，在调用方的事务中更新各自任务的执行概况"""
+    now = now or timezone.now()
+    by_task = {}
+    for job in sorted(jobs, key=lambda job: job.id):
+        by_task.setdefault(job.task_id, []).append(job)
+    if not by_task:
+        return
+
+    with transaction.atomic():
+        rates = _success_rates(list(by_task), now)
+        seq = ChangeSequence.reserve(len(by_task))
+        for offset, (task_id, finished) in enumerate(by_task.items()):
+            last = finished[-1]
+            failures = 0
+            for job in finished:
+                failures = 0 if job.status == 'success' else failures + 1
+            # 本批中有成功时从成功之后重新计数，否则在原有次数上累加
+            if any(job.status == 'success' for job in finished):
+                consecutive = failures
+            else:
+                consecutive = F('consecutive_failures') + failures
+            Task.all_objects.filter(id=task_id).update(
+                last_job_status=last.status,
+                last_run_at=last.start_time,
+                last_duration=_duration(last),
+                consecutive_failures=consecutive,
+                success_rate_7d=rates.get(task_id),
+                change_seq=seq + offset,
+            )
+        cache.invalidate('task')
+
+
+def refresh(task_ids=None, batch_size=500):
+    """按执行记录重新计算任务的执行概况，返回处理的任务数"""
+    now = timezone.now()
+    # 默认跳过软删除的任务，指定 task_ids 时不限
+    if task_ids is None:
+        queryset = Task.objects.order_by('id')
+    else:
+        queryset = Task.all_objects.filter(id__in=task_ids).order_by('id')
+    ids = list(queryset.values_list('id', flat=True))
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        rates = _success_rates(chunk, now)
+        tasks = []
+        for task in Task.all_objects.filter(id__in=chunk):
+            finished = Job.objects.filter(task_id=task.id, status__in=FINISHED)
+            # 与 record_finished 一样按 ID 排序，不依赖可能为空的 end_time
+            last = finished.order_by('-id').first()
+            last_success = finished.filter(status='success').order_by('-id').values_list('id', flat=True).first()
+            failures = finished.exclude(status='success')
+            if last_success is not None:
+                failures = failures.filter(id__gt=last_success)
+            task.last_job_status = last.status if last else None
+            task.last_run_at = last.start_time if last else None
+            task.last_duration = _duration(last) if last else None
+            task.consecutive_failures = failures.count()
+            task.success_rate_7d = rates.get(task.id)
+            tasks.append(task)
+        with transaction.atomic():
+            seq = ChangeSequence.reserve(len(tasks)) if tasks else 0
+            for offset, task in enumerate(tasks):
+                task.change_seq = seq + offset
+            Task.all_objects.bulk_update(tasks, [
+                'last_job_status', 'last_run_at', 'last_duration', 'consecutive_failures',
+                'success_rate_7d', 'change_seq',
+            ])
+            cache.invalidate('task')
+    return len(ids)
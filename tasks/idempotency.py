@@ -0,0 +1,122 @@
+"""
+Idempotency-Key 支持
+
+带 Idempotency-Key 头的写请求，在 IDEMPOTENCY_TTL 秒内用相同的键重试时，
+直接返回第一次请求的响应（响应头 Idempotent-Replayed: true），不会再次执行；
+第一次请求尚未完成时返回 409，同一个键用于不同的请求体时返回 422。
+键按接口和对象区分，5xx 响应不保存，允许客户端重试。
+
+键保存在 IdempotencyKey 表中：先插入处理中的记录，唯一约束冲突说明已有请求占用了这个键，
+多个 worker 同时重试时只有一个会执行。处理中的记录在请求最长可能的执行时间内有效
+（按节点调用的超时、重试次数和 outbox 租约计算），请求结束时只更新自己插入的那一行。
+过期的记录由 manage.py purge_idempotency_keys 清理。
+"""
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import outbox
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+# 请求线程中最多执行的命令数（assign_node：旧节点停止 + 新节点下发），外加健康检查
+_INLINE_COMMANDS = 4
+
+
+def _key(view, key):
+    scope = f'{view.basename}:{view.action}:{view.kwargs.get("pk", "")}:{key}'
+    return hashlib.md5(scope.encode()).hexdigest()
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.md5(body.encode()).hexdigest()
+
+
+def pending_ttl():
+    """
+    处理中记录的有效期（秒）：不短于请求中执行节点命令的最长时间，
+    进程异常退出时也不会长时间阻塞重试
+    """
+    return max(settings.IDEMPOTENCY_PENDING_TTL, _INLINE_COMMANDS * outbox.lease_seconds())
+
+
+def _claim(key, fingerprint=''):
+    """插入处理中的记录，返回 (插入的记录, None) 或 (None, 已有的记录)，过期的记录会被替换"""
+    for _ in range(2):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                claim = IdempotencyKey.objects.create(
+                    key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=pending_ttl())
+                )
+            return claim, None
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(key=key).first()
+            if existing is None:
+                continue
+            if existing.expires_at > now:
+                return None, existing
+            # 带过期条件删除，多个请求同时替换时只有一个能删除并重新插入
+            IdempotencyKey.objects.filter(pk=existing.pk, expires_at__lte=now).delete()
+    return None, IdempotencyKey.objects.filter(key=key).first()
+
+
+def purge_expired(now=None):
+    """删除过期的记录，返回条数"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lt=now or timezone.now()).delete()
+    return deleted
+
+
+def idempotent(func):
+    """用于 ViewSet 的 action，放在 @action 之下"""
+
+    @functools.wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return func(self, request, *args, **kwargs)
+
+        fingerprint = _fingerprint(request)
+        claim, existing = _claim(_key(self, key), fingerprint)
+        if claim is None:
+            if existing is not None and existing.fingerprint != fingerprint:
+                return Response(
+                    {'error': 'Idempotency-Key 已用于不同的请求'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if existing is not None and existing.status_code is not None:
+                response = Response(existing.response, status=existing.status_code)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+            return Response(
+                {'error': '相同的请求正在处理中'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        # 只修改本次插入的记录：记录过期后被其他请求替换时，不覆盖对方的结果
+        mine = IdempotencyKey.objects.filter(pk=claim.pk)
+        try:
+            response = func(self, request, *args, **kwargs)
+        except Exception:
+            mine.delete()
+            raise
+        if response.status_code >= 500:
+            mine.delete()
+        else:
+            mine.update(
+                status_code=response.status_code,
+                response=response.data,
+                expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,83 @@
+"""
+节点上的任务清单和集群概览
+
+下线节点前需要知道节点上有哪些任务、还有多少在运行；集群概览页需要每个节点的任务数、
+运行中的执行记录数、心跳间隔和最近的失败率。各项计数都以相关子查询的形式附加在
+节点（或任务）查询上，整个概览只有一条 SQL，按 (status, node)、(status, start_time)
+和 (task, start_time) 索引计数，不会把任务和执行记录连接后再分组。
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Job, Node, Task
+from .workflow import FINISHED
+
+# 失败率统计的默认时间窗口
+DEFAULT_WINDOW = timedelta(hours=24)
+
+# jobs_running 为数据库中运行中的执行记录数，节点心跳上报的 running_jobs 原样输出
+# 与序列化器输出的时间格式一致（TIME_ZONE 时区）
+_format_time = serializers.DateTimeField().to_representation
+
+COUNT_FIELDS = ('active_tasks', 'paused_tasks', 'jobs_running', 'recent_jobs', 'recent_failures')
+
+
+def _count(queryset, group_by):
+    """相关子查询计数，没有匹配行时为 0"""
+    counts = queryset.order_by().values(group_by).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def node_tasks(queryset):
+    """为任务查询附加 jobs_running（运行中的执行记录数）"""
+    return queryset.annotate(
+        jobs_running=_count(Job.objects.filter(task=OuterRef('pk'), status='running'), 'task'),
+    )
+
+
+def summary(now=None, window=DEFAULT_WINDOW):
+    """全部节点的任务数、运行中的执行记录数、心跳间隔和 window 内的失败率"""
+    now = now or timezone.now()
+    since = now - window
+    node_jobs = Job.objects.filter(task__node=OuterRef('pk'))
+    recent = node_jobs.filter(start_time__gte=since, status__in=FINISHED)
+    rows = Node.objects.order_by('name', 'id').annotate(
+        active_tasks=_count(Task.objects.filter(node=OuterRef('pk'), status='active'), 'node'),
+        paused_tasks=_count(Task.objects.filter(node=OuterRef('pk'), status='paused'), 'node'),
+        jobs_running=_count(node_jobs.filter(status='running'), 'task__node'),
+        recent_jobs=_count(recent, 'task__node'),
+        recent_failures=_count(recent.exclude(status='success'), 'task__node'),
+    ).values(
+        'id', 'name', 'host', 'port', 'status', 'last_heartbeat',
+        'cpu_percent', 'memory_percent', 'running_jobs', 'queue_depth', *COUNT_FIELDS,
+    )
+
+    nodes = []
+    totals = dict.fromkeys(COUNT_FIELDS, 0)
+    for row in rows:
+        heartbeat = row['last_heartbeat']
+        row['heartbeat_age'] = round((now - heartbeat).total_seconds(), 3) if heartbeat else None
+        row['last_heartbeat'] = _format_time(heartbeat) if heartbeat else None
+        # timeout 按失败计
+        row['failure_rate'] = (
+            round(row['recent_failures'] / row['recent_jobs'], 4) if row['recent_jobs'] else None
+        )
+        for field in COUNT_FIELDS:
+            totals[field] += row[field]
+        nodes.append(row)
+    totals['nodes'] = len(nodes)
+    totals['active_nodes'] = sum(1 for row in nodes if row['status'] == 'active')
+    totals['failure_rate'] = (
+        round(totals['recent_failures'] / totals['recent_jobs'], 4) if totals['recent_jobs'] else None
+    )
+    return {
+        'generated_at': _format_time(now),
+        'window_hours': window.total_seconds() / 3600,
+        'nodes': nodes,
+        'totals': totals,
+    }
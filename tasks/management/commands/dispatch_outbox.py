@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks import outbox
+
+
+class Command(BaseCommand):
+    help = '执行节点命令 outbox 中到期的命令（部署、停止、删除）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只处理当前积压的命令后退出')
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--concurrency', type=int, default=settings.OUTBOX_CONCURRENCY)
+        parser.add_argument('--interval', type=float, default=1.0, help='没有命令时的轮询间隔（秒）')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = outbox.dispatch_pending(options['batch_size'], options['concurrency'])
+            total += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(f'已处理 {total} 条命令')
@@ -0,0 +1,47 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import export
+from tasks.fastpath import get_values_spec
+from tasks.models import Job
+from tasks.serializers import JobExportSerializer
+
+
+class Command(BaseCommand):
+    help = '流式导出执行记录（含任务、节点名称）为 ndjson / csv / parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(export.FORMATS), default='csv')
+        parser.add_argument('--output', '-o', default='-', help='输出文件，默认标准输出')
+        parser.add_argument('--since', help='开始时间不早于（ISO 日期或日期时间）')
+        parser.add_argument('--until', help='开始时间不晚于（ISO 日期或日期时间）')
+        parser.add_argument('--task', type=int, help='任务ID')
+        parser.add_argument('--status', help='状态，可逗号分隔')
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['format'] == 'parquet' and not export.parquet_available():
+            raise CommandError('未安装 pyarrow，无法导出 parquet')
+        queryset = Job.objects.all()
+        if options['task'] is not None:
+            queryset = queryset.filter(task_id=options['task'])
+        try:
+            queryset = export.filter_jobs(queryset, options['since'], options['until'], options['status'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        spec = get_values_spec(JobExportSerializer)
+        chunks = export.stream(options['format'], queryset, spec, JobExportSerializer, options['chunk_size'])
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            size = 0
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        if options['output'] != '-':
+            self.stderr.write(f'已导出到 {options["output"]}，{size} 字节')
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks import purge
+
+
+class Command(BaseCommand):
+    help = '物理删除软删除超过保留期的任务及其执行记录'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TASK_PURGE_AFTER_DAYS,
+                            help='删除（status=deleted）超过该天数的任务才清理')
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_PURGE_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='大于 0 时每隔该秒数循环执行，否则执行一次后退出')
+
+    def handle(self, *args, **options):
+        while True:
+            tasks, jobs = purge.purge(days=options['days'], batch_size=options['batch_size'])
+            self.stdout.write(f'清理已删除的任务 {tasks} 个，执行记录 {jobs} 条')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks import idempotency
+
+
+class Command(BaseCommand):
+    help = '删除过期的 Idempotency-Key 记录'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='大于 0 时每隔该秒数循环执行，否则执行一次后退出')
+
+    def handle(self, *args, **options):
+        while True:
+            count = idempotency.purge_expired()
+            self.stdout.write(f'删除过期的幂等键 {count} 条')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
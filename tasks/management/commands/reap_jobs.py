@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks import reaper
+
+
+class Command(BaseCommand):
+    help = '把超过超时时间仍在运行中的执行记录标记为 timeout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='大于 0 时每隔该秒数循环执行，否则执行一次后退出')
+        parser.add_argument('--batch-size', type=int, default=settings.REAPER_BATCH_SIZE)
+        parser.add_argument('--stop', action='store_true', help='同时向节点发送停止命令中断超时的运行（active 的任务停止后重新启动）')
+
+    def handle(self, *args, **options):
+        while True:
+            count = reaper.reap(batch_size=options['batch_size'], stop=options['stop'])
+            self.stdout.write(f'回收超时执行记录 {count} 条')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tasks import search
+from tasks.fastpath import iter_values
+from tasks.models import Job, SearchIndexEntry, Task
+
+
+class Command(BaseCommand):
+    help = '重建本地搜索倒排索引（SEARCH_BACKEND 为 index 时使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['task', 'job'], help='只重建一种数据，默认全部')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if search.backend() != 'index':
+            raise CommandError('当前使用数据库 FULLTEXT 索引，无需重建')
+
+        # 软删除的任务仍可通过 ?status=deleted 搜索
+        managers = {'task': Task.all_objects, 'job': Job.objects}
+        kinds = [options['kind']] if options['kind'] else list(managers)
+        for kind in kinds:
+            fields = search.SEARCH_FIELDS[kind]
+            total = 0
+            with transaction.atomic():
+                SearchIndexEntry.objects.filter(kind=kind).delete()
+                entries = []
+                for row in iter_values(managers[kind].all(), fields, options['batch_size']):
+                    text = ' '.join(row[field] or '' for field in fields)
+                    entries.extend(
+                        SearchIndexEntry(kind=kind, object_id=row['id'], term=term)
+                        for term in search.tokenize(text)
+                    )
+                    total += 1
+                    if len(entries) >= options['batch_size']:
+                        SearchIndexEntry.objects.bulk_create(entries)
+                        entries = []
+                SearchIndexEntry.objects.bulk_create(entries)
+            self.stdout.write(f'{kind}: 已索引 {total} 条')
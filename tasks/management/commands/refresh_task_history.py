@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks import history
+
+
+class Command(BaseCommand):
+    help = '按执行记录重新计算任务的执行概况（最近执行、连续失败次数、7天成功率）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', type=int, action='append', dest='task_ids', help='只刷新指定任务，可重复指定')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='大于 0 时每隔该秒数循环执行，否则执行一次后退出')
+
+    def handle(self, *args, **options):
+        while True:
+            count = history.refresh(task_ids=options['task_ids'], batch_size=options['batch_size'])
+            self.stdout.write(f'刷新任务执行概况 {count} 个')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
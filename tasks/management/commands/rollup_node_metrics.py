@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks import metrics
+
+
+class Command(BaseCommand):
+    help = '按分钟汇总节点资源数据，并清理超过保留期的原始数据和汇总数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='大于 0 时每隔该秒数循环执行，否则执行一次后退出')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每次删除的行数')
+
+    def handle(self, *args, **options):
+        while True:
+            rolled = metrics.rollup()
+            raw, old = metrics.purge(batch_size=options['batch_size'])
+            self.stdout.write(f'汇总 {rolled} 条，清理原始数据 {raw} 条、汇总数据 {old} 条')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
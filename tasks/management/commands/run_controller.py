@@ -0,0 +1,46 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.controller import Controller
+
+
+class Command(BaseCommand):
+    help = '运行控制器实例：分发 outbox 命令、检查节点健康、对账节点任务；可同时运行多个实例分摊节点'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instance-id', help='实例ID，默认使用 主机名-进程号-随机串')
+        parser.add_argument('--interval', type=float, default=1.0, help='没有命令时的轮询间隔（秒）')
+
+    def handle(self, *args, **options):
+        controller = Controller(options['instance_id'])
+        # 续租间隔取租约的三分之一，偶尔一次数据库故障不会导致租约过期
+        renew_every = settings.CONTROLLER_LEASE_SECONDS / 3
+        next_renew = next_probe = next_reconcile = 0
+
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+        self.stdout.write(f'控制器已启动: {controller.instance_id}')
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_renew:
+                    controller.renew()
+                    next_renew = now + renew_every
+                if now >= next_probe:
+                    controller.probe()
+                    next_probe = now + settings.CONTROLLER_PROBE_INTERVAL
+                if now >= next_reconcile:
+                    controller.reconcile()
+                    next_reconcile = now + settings.CONTROLLER_RECONCILE_INTERVAL
+                if not controller.dispatch():
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            controller.leave()
+            self.stdout.write(f'控制器已退出: {controller.instance_id}')
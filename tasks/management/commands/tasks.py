@@ -0,0 +1,90 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import transfer
+from tasks.renderers import dumps
+
+
+class Command(BaseCommand):
+    help = '批量导出 / 导入任务定义（用于在环境之间迁移），格式见 tasks/transfer.py'
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='subcommand', required=True)
+
+        export_parser = subcommands.add_parser('export', help='导出全部任务定义')
+        export_parser.add_argument('--output', '-o', default='-', help='输出文件，默认标准输出')
+
+        import_parser = subcommands.add_parser('import', help='导入任务定义')
+        import_parser.add_argument('file', help='导出的文件，- 表示标准输入')
+        import_parser.add_argument('--node-map', action='append', default=[], metavar='源节点=目标节点',
+                                   help='节点名称映射，可重复指定')
+        import_parser.add_argument('--dry-run', action='store_true', help='只显示差异，不写入')
+        import_parser.add_argument('--no-deploy', action='store_true',
+                                   help='只写入数据库，不下发到执行节点（由控制器对账时补发）')
+        import_parser.add_argument('--verbose-diff', action='store_true', help='列出每个任务的差异')
+
+    def handle(self, *args, **options):
+        if options['subcommand'] == 'export':
+            self._export(options)
+        else:
+            self._import(options)
+
+    def _export(self, options):
+        data = dumps(transfer.export_definitions())
+        if options['output'] == '-':
+            sys.stdout.buffer.write(data + b'\n')
+            return
+        with open(options['output'], 'wb') as f:
+            f.write(data)
+        self.stderr.write(f'已导出到 {options["output"]}，{len(data)} 字节')
+
+    def _import(self, options):
+        node_map = {}
+        for item in options['node_map']:
+            source, sep, target = item.partition('=')
+            if not sep or not source:
+                raise CommandError(f'节点映射格式应为 源节点=目标节点: {item}')
+            node_map[source] = target
+
+        try:
+            if options['file'] == '-':
+                data = json.load(sys.stdin)
+            else:
+                with open(options['file'], 'rb') as f:
+                    data = json.load(f)
+            report = transfer.import_definitions(
+                data, node_map=node_map, dry_run=options['dry_run'], deploy=not options['no_deploy']
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for warning in report['warnings']:
+            self.stderr.write(self.style.WARNING(f'警告: {warning}'))
+        if report['errors']:
+            for error in report['errors']:
+                self.stderr.write(self.style.ERROR(error))
+            raise CommandError(f'数据有 {len(report["errors"])} 处错误，未导入')
+
+        if options['verbose_diff']:
+            for name in report['created']:
+                self.stdout.write(f'+ {name}')
+            for name, changes in report['updated'].items():
+                self.stdout.write(f'~ {name}')
+                for field, (old, new) in changes.items():
+                    self.stdout.write(f'    {field}: {old!r} -> {new!r}')
+
+        prefix = '[dry-run] ' if report['dry_run'] else ''
+        dependencies = report['dependencies']
+        self.stdout.write(
+            f'{prefix}新建 {len(report["created"])}，更新 {len(report["updated"])}，'
+            f'未变化 {report["unchanged"]}；依赖新建 {dependencies["created"]}，'
+            f'更新 {dependencies["updated"]}，未变化 {dependencies["unchanged"]}'
+        )
+        deploy = report.get('deploy')
+        if deploy:
+            if deploy['queued']:
+                self.stdout.write(f'节点命令 {report["commands"]} 条已排队')
+            else:
+                self.stdout.write(f'节点命令 {report["commands"]} 条，失败 {len(deploy["failed"])} 条（稍后自动重试）')
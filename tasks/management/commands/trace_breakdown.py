@@ -0,0 +1,62 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = '按阶段输出一个请求的链路耗时（读取 TRACE_FILE）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace_id', nargs='?', help='响应头 X-Trace-Id，不指定时列出最慢的请求')
+        parser.add_argument('--file', default=settings.TRACE_FILE)
+        parser.add_argument('--slowest', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], encoding='utf-8') as f:
+                spans = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            raise CommandError(f"找不到追踪文件: {options['file']}")
+
+        if not options['trace_id']:
+            roots = [s for s in spans if s['kind'] == 'SPAN_KIND_SERVER']
+            roots.sort(key=lambda s: s['durationMs'], reverse=True)
+            for span in roots[:options['slowest']]:
+                self.stdout.write(f"{span['traceId']}  {span['durationMs']:>10.1f}ms  {span['name']}")
+            return
+
+        spans = [s for s in spans if s['traceId'] == options['trace_id']]
+        if not spans:
+            raise CommandError('未找到该 trace')
+
+        children = defaultdict(list)
+        ids = {s['spanId'] for s in spans}
+        for span in sorted(spans, key=lambda s: s['startTimeUnixNano']):
+            parent = span['parentSpanId'] if span['parentSpanId'] in ids else None
+            children[parent].append(span)
+
+        def walk(parent, depth):
+            for span in children[parent]:
+                child_ms = sum(c['durationMs'] for c in children[span['spanId']])
+                label = span['name']
+                if span['name'] == 'db.query':
+                    label += ' ' + span['attributes'].get('db.statement', '')[:80]
+                self.stdout.write('%s%-60s %9.1fms (self %.1fms) %s' % (
+                    '  ' * depth, label, span['durationMs'],
+                    max(span['durationMs'] - child_ms, 0), span['status']['code'][12:],
+                ))
+                walk(span['spanId'], depth + 1)
+
+        walk(None, 0)
+
+        # 按阶段汇总
+        totals = defaultdict(lambda: [0, 0.0])
+        for span in spans:
+            phase = 'db' if span['name'] == 'db.query' else span['name']
+            totals[phase][0] += 1
+            totals[phase][1] += span['durationMs']
+        self.stdout.write('')
+        for phase, (count, total) in sorted(totals.items(), key=lambda i: -i[1][1]):
+            self.stdout.write('%-60s x%-4d %9.1fms' % (phase, count, total))
@@ -0,0 +1,212 @@
+"""
+节点资源时序数据
+
+心跳中的 resources 快照先写入进程内缓冲区，攒够 METRICS_BUFFER_SIZE 条或超过
+METRICS_FLUSH_INTERVAL 秒后一次 bulk_create 写入 NodeMetric；后台线程每隔
+METRICS_FLUSH_INTERVAL 秒写入一次，没有新心跳时缓冲区的数据也不会滞留，进程退出时再写入一次。
+METRICS_FLUSH_INTERVAL 为 0 时不缓冲，每次记录立即写入。
+manage.py rollup_node_metrics 把原始数据按分钟汇总到 NodeMetricRollup，每次重新汇总最近
+ROLLUP_LOOKBACK_INTERVALS 个写入间隔内的分钟，延迟写入的数据也会被计入；
+并按保留期清理：原始数据默认保留 1 小时，分钟汇总保留 7 天。
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import NodeMetric, NodeMetricRollup
+
+logger = logging.getLogger('backend')
+
+# 心跳 resources 中接受的指标及类型
+RESOURCE_FIELDS = {
+    'cpu_percent': float,
+    'memory_percent': float,
+    'running_jobs': int,
+    'queue_depth': int,
+}
+
+ROLLUP_FIELDS = (
+    ('cpu_avg', 'cpu_max', 'cpu_percent'),
+    ('memory_avg', 'memory_max', 'memory_percent'),
+    ('running_jobs_avg', 'running_jobs_max', 'running_jobs'),
+    ('queue_depth_avg', 'queue_depth_max', 'queue_depth'),
+)
+
+# 汇总时回看的写入间隔数：写入最多比采样晚一个间隔，多留余量
+ROLLUP_LOOKBACK_INTERVALS = 3
+
+# 与序列化器输出的时间格式一致（TIME_ZONE 时区）
+format_time = serializers.DateTimeField().to_representation
+
+_buffer = []
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+# 后台写入线程所在的进程，fork 出的 worker 需要重新启动线程
+_flusher_pid = None
+
+
+def parse_resources(data):
+    """从心跳请求中取出资源快照，忽略未知字段和无法解析的值"""
+    if not isinstance(data, dict):
+        return {}
+    values = {}
+    for field, cast in RESOURCE_FIELDS.items():
+        try:
+            if data.get(field) is not None:
+                values[field] = cast(data[field])
+        except (TypeError, ValueError):
+            continue
+    return values
+
+
+def record(node_id, values, ts=None):
+    global _last_flush
+    with _buffer_lock:
+        _buffer.append(NodeMetric(node_id=node_id, ts=ts or timezone.now(), **values))
+        if settings.METRICS_FLUSH_INTERVAL > 0:
+            _start_flusher()
+        due = (len(_buffer) >= settings.METRICS_BUFFER_SIZE
+               or time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL)
+    if due:
+        flush()
+
+
+def flush():
+    global _last_flush
+    with _buffer_lock:
+        rows = _buffer[:]
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not rows:
+        return 0
+    try:
+        NodeMetric.objects.bulk_create(rows, batch_size=500)
+    except Exception:
+        # 节点可能已被删除等，资源数据丢失不影响业务
+        logger.exception('写入节点资源数据失败，丢弃 %s 条', len(rows))
+        return 0
+    return len(rows)
+
+
+def _start_flusher():
+    """在持有 _buffer_lock 时调用，每个进程启动一个后台写入线程"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_run_flusher, name='node-metrics-flusher', daemon=True).start()
+
+
+def _run_flusher():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        if not _buffer:
+            continue
+        try:
+            flush()
+        finally:
+            close_old_connections()
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def rollup(now=None):
+    """
+    汇总已经结束的分钟，返回写入的汇总行数；重复执行时覆盖同一分钟的结果。
+    从上次汇总到的分钟再往前回看 ROLLUP_LOOKBACK_INTERVALS 个写入间隔重新汇总，
+    其他 worker 延迟写入的数据会更新已有的汇总行。
+    """
+    now = now or timezone.now()
+    end = now.replace(second=0, microsecond=0)
+    last = NodeMetricRollup.objects.aggregate(last=Max('bucket'))['last']
+    if last is not None:
+        lookback = timedelta(seconds=ROLLUP_LOOKBACK_INTERVALS * settings.METRICS_FLUSH_INTERVAL)
+        # 按整分钟回看，重新汇总的分钟包含该分钟的全部数据
+        start = (last - lookback).replace(second=0, microsecond=0)
+    else:
+        start = NodeMetric.objects.aggregate(first=Min('ts'))['first']
+    if start is None or start >= end:
+        return 0
+
+    aggregates = {'samples': Count('id')}
+    for avg_name, max_name, field in ROLLUP_FIELDS:
+        aggregates[avg_name] = Avg(field)
+        aggregates[max_name] = Max(field)
+    rows = (
+        NodeMetric.objects.filter(ts__gte=start, ts__lt=end)
+        .annotate(bucket=TruncMinute('ts'))
+        .values('node_id', 'bucket')
+        .annotate(**aggregates)
+        .order_by()
+    )
+    rollups = [NodeMetricRollup(**row) for row in rows]
+    NodeMetricRollup.objects.bulk_create(
+        rollups,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['node', 'bucket'],
+        update_fields=['samples'] + [name for fields in ROLLUP_FIELDS for name in fields[:2]],
+    )
+    return len(rollups)
+
+
+def _delete_before(queryset, field, cutoff, batch_size):
+    total = 0
+    while True:
+        ids = list(queryset.filter(**{f'{field}__lt': cutoff}).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += queryset.filter(id__in=ids).delete()[0]
+
+
+def purge(now=None, batch_size=5000):
+    """按保留期分批删除过期数据，返回 (原始, 汇总) 删除行数"""
+    now = now or timezone.now()
+    raw = _delete_before(NodeMetric.objects.all(), 'ts',
+                         now - timedelta(seconds=settings.METRICS_RAW_RETENTION), batch_size)
+    rolled = _delete_before(NodeMetricRollup.objects.all(), 'bucket',
+                            now - timedelta(seconds=settings.METRICS_ROLLUP_RETENTION), batch_size)
+    return raw, rolled
+
+
+def series(node, since, until, resolution='auto'):
+    """
+    查询节点的资源时序数据。resolution 为 raw、1m 或 auto（区间不超过原始数据保留期时用 raw）。
+    """
+    if resolution == 'auto':
+        # 留一分钟余量，默认的“最近 1 小时”查询使用原始数据
+        raw_from = timezone.now() - timedelta(seconds=settings.METRICS_RAW_RETENTION + 60)
+        resolution = 'raw' if since >= raw_from else '1m'
+
+    if resolution == 'raw':
+        flush()
+        fields = ['ts'] + list(RESOURCE_FIELDS)
+        points = NodeMetric.objects.filter(node=node, ts__gte=since, ts__lte=until) \
+            .order_by('ts').values(*fields)
+    else:
+        fields = ['bucket', 'samples'] + [name for group in ROLLUP_FIELDS for name in group[:2]]
+        points = NodeMetricRollup.objects.filter(node=node, bucket__gte=since, bucket__lte=until) \
+            .order_by('bucket').values(*fields)
+    points = list(points)
+    for point in points:
+        point[fields[0]] = format_time(point[fields[0]])
+    return resolution, points
@@ -1,6 +1,111 @@
-from django.db import models
+from datetime import timedelta
 
-class Task(models.Model):
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+
+class ChangeSequence(models.Model):
+    """全局递增的变更序号，供 /api/changes 增量同步使用"""
+    name = models.CharField(max_length=50, unique=True, verbose_name='名称')
+    value = models.BigIntegerField(default=0, verbose_name='当前值')
+
+    class Meta:
+        verbose_name = '变更序号'
+        verbose_name_plural = '变更序号'
+
+    @classmethod
+    def next_value(cls, name='default'):
+        """取下一个序号，必须在写入这个序号的事务中调用"""
+        return cls.reserve(1, name)
+
+    @classmethod
+    def reserve(cls, count, name='default'):
+        """
+        一次分配 count 个连续序号（批量写入时使用），返回第一个；必须在写入这些序号的事务中调用。
+
+        CHANGE_SEQUENCE_DB 为单独的连接时（MySQL），计数行只在该连接的短事务中加锁，
+        并发的写事务不会排队等待彼此提交。分配的同时在短事务中登记一条 ChangeLease，
+        外层事务删除它并与数据一起提交，登记存在期间 /api/changes 不会越过这个序号（见 settled）；
+        外层事务回滚时登记保留，CHANGE_LEASE_SECONDS 秒后失效。
+        使用 default 连接时 UPDATE 会锁住计数行直到外层事务提交，序号的分配顺序与提交顺序一致，不需要登记。
+        """
+        db = settings.CHANGE_SEQUENCE_DB
+        if db not in settings.DATABASES:
+            # 覆盖了 DATABASES 的配置（例如本地 SQLite）没有这个连接
+            db = DEFAULT_DB_ALIAS
+        if db == DEFAULT_DB_ALIAS:
+            with transaction.atomic():
+                return cls._allocate(count, name, db)
+
+        with transaction.atomic(using=db):
+            first = cls._allocate(count, name, db)
+            lease = ChangeLease.objects.using(db).create(
+                seq=first, expires_at=timezone.now() + timedelta(seconds=settings.CHANGE_LEASE_SECONDS)
+            )
+        ChangeLease.objects.filter(pk=lease.pk).delete()
+        return first
+
+    @classmethod
+    def _allocate(cls, count, name, db):
+        counter = cls.objects.using(db).filter(name=name)
+        if not counter.update(value=F('value') + count):
+            cls.objects.using(db).get_or_create(name=name)
+            counter.update(value=F('value') + count)
+        return counter.values_list('value', flat=True).get() - count + 1
+
+    @classmethod
+    def settled(cls, name='default'):
+        """
+        已分配且不会再出现新变更的最大序号：小于等于它的序号所在的事务都已提交或回滚。
+        先读计数再读登记，之后分配的序号都大于读到的计数。
+        """
+        value = cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+        now = timezone.now()
+        leases = ChangeLease.objects.aggregate(
+            first=Min('seq', filter=Q(expires_at__gt=now)),
+            expired=Count('id', filter=Q(expires_at__lte=now)),
+        )
+        if leases['expired']:
+            ChangeLease.objects.filter(expires_at__lte=now).delete()
+        return value if leases['first'] is None else min(value, leases['first'] - 1)
+
+
+class ChangeLease(models.Model):
+    """已分配、所在事务尚未提交的变更序号（只在 CHANGE_SEQUENCE_DB 为单独的连接时使用）"""
+    seq = models.BigIntegerField(verbose_name='变更序号')
+    expires_at = models.DateTimeField(verbose_name='失效时间')
+
+    class Meta:
+        verbose_name = '未提交的变更序号'
+        verbose_name_plural = '未提交的变更序号'
+
+
+class ChangeTrackedModel(models.Model):
+    """每次保存时在同一事务中分配新的 change_seq"""
+    change_seq = models.BigIntegerField(default=0, db_index=True, verbose_name='变更序号')
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.change_seq = ChangeSequence.next_value()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'change_seq'}
+            super().save(*args, **kwargs)
+
+
+class TaskManager(models.Manager):
+    """默认管理器，不包含软删除（status='deleted'）的任务"""
+
+    def get_queryset(self):
+        return super().get_queryset().exclude(status='deleted')
+
+
+class Task(ChangeTrackedModel):
     name = models.CharField(max_length=100, verbose_name='任务名称')
     description = models.TextField(blank=True, null=True, verbose_name='描述')
     cron_expression = models.CharField(max_length=100, verbose_name='Cron表达式')
@@ -17,6 +122,10 @@ class Task(models.Model):
         ('deleted', '已删除'),
         ('draft', '草稿')
     ], default='active', verbose_name='状态')
+    skip_if_running = models.BooleanField(default=False, verbose_name='运行中时跳过触发')
+    coalesce_seconds = models.IntegerField(default=0, verbose_name='合并触发间隔（秒）')
+    # 0 表示使用 JOB_DEFAULT_TIMEOUT
+    timeout_seconds = models.IntegerField(default=0, verbose_name='执行超时（秒）')
     node = models.ForeignKey(
         'Node',
         on_delete=models.SET_NULL,
@@ -24,13 +133,26 @@ class Task(models.Model):
         blank=True,
         verbose_name='执行节点'
     )
+    # 执行概况，执行记录完成时更新，见 tasks/history.py
+    last_job_status = models.CharField(max_length=20, null=True, blank=True, verbose_name='最近执行状态')
+    last_run_at = models.DateTimeField(null=True, blank=True, verbose_name='最近执行时间')
+    last_duration = models.FloatField(null=True, blank=True, verbose_name='最近执行耗时（秒）')
+    consecutive_failures = models.IntegerField(default=0, verbose_name='连续失败次数')
+    success_rate_7d = models.FloatField(null=True, blank=True, verbose_name='7天成功率')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
+    objects = TaskManager()
+    # 包含软删除的任务：变更同步、清理等内部流程使用
+    all_objects = models.Manager()
+
     class Meta:
         verbose_name = '任务'
         verbose_name_plural = '任务'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'node'], name='task_status_node_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -40,22 +162,34 @@ class Job(models.Model):
     status = models.CharField(max_length=20, choices=[
         ('running', '运行中'),
         ('success', '成功'),
-        ('failed', '失败')
+        ('failed', '失败'),
+        ('timeout', '超时')
     ], verbose_name='状态')
     start_time = models.DateTimeField(auto_now_add=True, verbose_name='开始时间')
     end_time = models.DateTimeField(null=True, blank=True, verbose_name='结束时间')
     result = models.TextField(null=True, blank=True, verbose_name='执行结果')
     error_message = models.TextField(null=True, blank=True, verbose_name='错误信息')
+    # 由流水线 / 上游任务触发时为这一轮的开始时间，用于判断扇入的上游是否属于同一轮，见 tasks/workflow.py
+    run_started_at = models.DateTimeField(null=True, blank=True, verbose_name='本轮开始时间')
 
     class Meta:
         verbose_name = '执行记录'
         verbose_name_plural = '执行记录'
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['status', 'start_time'], name='job_status_start_idx'),
+            models.Index(fields=['task', 'start_time'], name='job_task_start_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # 完成时任务的执行概况在 post_save 中更新，与执行记录在同一事务中提交
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.task.name} - {self.status}"
 
-class Node(models.Model):
+class Node(ChangeTrackedModel):
     name = models.CharField(max_length=100, verbose_name='节点名称')
     host = models.CharField(max_length=100, verbose_name='主机地址')
     port = models.IntegerField(verbose_name='端口')
@@ -64,6 +198,11 @@ class Node(models.Model):
         ('inactive', '不活跃')
     ], default='inactive', verbose_name='状态')
     last_heartbeat = models.DateTimeField(null=True, blank=True, verbose_name='最后心跳')
+    # 最近一次心跳上报的资源快照
+    cpu_percent = models.FloatField(null=True, blank=True, verbose_name='CPU使用率')
+    memory_percent = models.FloatField(null=True, blank=True, verbose_name='内存使用率')
+    running_jobs = models.IntegerField(null=True, blank=True, verbose_name='运行中任务数')
+    queue_depth = models.IntegerField(null=True, blank=True, verbose_name='排队任务数')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
@@ -73,4 +212,181 @@ class Node(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.name} ({self.host}:{self.port})" 
\ No newline at end of file
+        return f"{self.name} ({self.host}:{self.port})" 
+
+class NodeCommand(models.Model):
+    """
+    待发送到执行节点的命令（事务性 outbox）。
+    与 Task 的变更在同一事务中写入，由 outbox 分发器按 (task_id, node) 先进先出执行，
+    失败后指数退避重试，超过次数后进入 dead 状态等待人工处理。
+    """
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, verbose_name='执行节点')
+    # 任务删除后仍需向节点发送删除命令，因此不使用外键
+    task_id = models.BigIntegerField(verbose_name='任务ID')
+    action = models.CharField(max_length=20, choices=[
+        ('deploy', '下发'),
+        ('stop', '停止'),
+        ('remove', '删除'),
+        ('execute', '立即执行'),
+    ], verbose_name='命令类型')
+    steps = models.JSONField(verbose_name='执行步骤')
+    step = models.IntegerField(default=0, verbose_name='下一步序号')
+    idempotency_key = models.CharField(max_length=64, unique=True, verbose_name='幂等键')
+    status = models.CharField(max_length=20, choices=[
+        ('pending', '等待中'),
+        ('running', '执行中'),
+        ('done', '已完成'),
+        ('cancelled', '已取消'),
+        ('dead', '失败'),
+    ], default='pending', verbose_name='状态')
+    attempts = models.IntegerField(default=0, verbose_name='尝试次数')
+    next_attempt_at = models.DateTimeField(verbose_name='下次执行时间')
+    last_error = models.TextField(null=True, blank=True, verbose_name='最后错误')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = '节点命令'
+        verbose_name_plural = '节点命令'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='nodecommand_status_next_idx'),
+            models.Index(fields=['task_id', 'node'], name='nodecommand_task_node_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} task={self.task_id} node={self.node_id} ({self.status})"
+
+class SearchIndexEntry(models.Model):
+    """
+    本地倒排索引（数据库不支持 FULLTEXT 时使用，例如 SQLite）。
+    每行表示某条任务/执行记录包含某个词，由 signals 在保存和删除时增量维护。
+    """
+    kind = models.CharField(max_length=10, choices=[
+        ('task', '任务'),
+        ('job', '执行记录'),
+    ], verbose_name='类型')
+    object_id = models.BigIntegerField(verbose_name='对象ID')
+    term = models.CharField(max_length=64, verbose_name='词')
+
+    class Meta:
+        verbose_name = '搜索索引'
+        verbose_name_plural = '搜索索引'
+        indexes = [
+            models.Index(fields=['kind', 'term', 'object_id'], name='searchindex_term_idx'),
+            models.Index(fields=['kind', 'object_id'], name='searchindex_object_idx'),
+        ]
+
+class ChangeTombstone(models.Model):
+    """被物理删除的任务/节点，在增量同步中以删除事件返回"""
+    kind = models.CharField(max_length=10, choices=[
+        ('task', '任务'),
+        ('node', '节点'),
+    ], verbose_name='类型')
+    object_id = models.BigIntegerField(verbose_name='对象ID')
+    change_seq = models.BigIntegerField(db_index=True, verbose_name='变更序号')
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name='删除时间')
+
+    class Meta:
+        verbose_name = '删除记录'
+        verbose_name_plural = '删除记录'
+
+class NodeMetric(models.Model):
+    """心跳上报的原始资源数据，保留 METRICS_RAW_RETENTION 秒"""
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, verbose_name='执行节点')
+    ts = models.DateTimeField(verbose_name='时间')
+    cpu_percent = models.FloatField(null=True, verbose_name='CPU使用率')
+    memory_percent = models.FloatField(null=True, verbose_name='内存使用率')
+    running_jobs = models.IntegerField(null=True, verbose_name='运行中任务数')
+    queue_depth = models.IntegerField(null=True, verbose_name='排队任务数')
+
+    class Meta:
+        verbose_name = '节点资源数据'
+        verbose_name_plural = '节点资源数据'
+        indexes = [
+            models.Index(fields=['node', 'ts'], name='nodemetric_node_ts_idx'),
+            models.Index(fields=['ts'], name='nodemetric_ts_idx'),
+        ]
+
+
+class NodeMetricRollup(models.Model):
+    """按分钟汇总的资源数据，保留 METRICS_ROLLUP_RETENTION 秒"""
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, verbose_name='执行节点')
+    bucket = models.DateTimeField(verbose_name='时间（分钟）')
+    samples = models.IntegerField(verbose_name='样本数')
+    cpu_avg = models.FloatField(null=True, verbose_name='CPU平均')
+    cpu_max = models.FloatField(null=True, verbose_name='CPU最大')
+    memory_avg = models.FloatField(null=True, verbose_name='内存平均')
+    memory_max = models.FloatField(null=True, verbose_name='内存最大')
+    running_jobs_avg = models.FloatField(null=True, verbose_name='运行中任务数平均')
+    running_jobs_max = models.IntegerField(null=True, verbose_name='运行中任务数最大')
+    queue_depth_avg = models.FloatField(null=True, verbose_name='排队任务数平均')
+    queue_depth_max = models.IntegerField(null=True, verbose_name='排队任务数最大')
+
+    class Meta:
+        verbose_name = '节点资源汇总'
+        verbose_name_plural = '节点资源汇总'
+        constraints = [
+            models.UniqueConstraint(fields=['node', 'bucket'], name='nodemetricrollup_node_bucket_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket'], name='nodemetricrollup_bucket_idx'),
+        ]
+
+class TaskDependency(models.Model):
+    """任务依赖：上游任务的执行结果满足 trigger 时触发下游任务（下游所有上游都满足才触发）"""
+    upstream = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='downstream_edges',
+                                 verbose_name='上游任务')
+    downstream = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='upstream_edges',
+                                   verbose_name='下游任务')
+    trigger = models.CharField(max_length=20, choices=[
+        ('success', '成功后'),
+        ('failed', '失败后'),
+        ('always', '完成后'),
+    ], default='success', verbose_name='触发条件')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+
+    class Meta:
+        verbose_name = '任务依赖'
+        verbose_name_plural = '任务依赖'
+        constraints = [
+            models.UniqueConstraint(fields=['upstream', 'downstream'], name='taskdependency_edge_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.upstream_id} -> {self.downstream_id} ({self.trigger})"
+
+class ControllerInstance(models.Model):
+    """
+    运行中的控制器实例（manage.py run_controller）。实例定期续租，
+    租约未过期的实例按一致性哈希分摊执行节点，见 tasks/controller.py。
+    """
+    instance_id = models.CharField(max_length=64, unique=True, verbose_name='实例ID')
+    hostname = models.CharField(max_length=100, verbose_name='主机名')
+    pid = models.IntegerField(verbose_name='进程号')
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name='启动时间')
+    lease_expires_at = models.DateTimeField(db_index=True, verbose_name='租约到期时间')
+
+    class Meta:
+        verbose_name = '控制器实例'
+        verbose_name_plural = '控制器实例'
+
+    def __str__(self):
+        return f"{self.instance_id} ({self.hostname}:{self.pid})"
+
+class IdempotencyKey(models.Model):
+    """
+    Idempotency-Key 记录，唯一约束保证同一个键只有一个请求执行。
+    response 为空表示第一次请求仍在处理中。
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name='键')
+    # 同一个键只能用于相同的请求体
+    fingerprint = models.CharField(max_length=32, default='', verbose_name='请求体摘要')
+    status_code = models.IntegerField(null=True, blank=True, verbose_name='响应状态码')
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='响应内容')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='过期时间')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+
+    class Meta:
+        verbose_name = '幂等键'
+        verbose_name_plural = '幂等键'
@@ -0,0 +1,308 @@
+"""
+执行节点 HTTP 客户端
+
+所有对执行节点的调用都经过 NodeClient，统一处理编码、超时、重试和链路追踪
+（每次调用及每次重试各一个 span，并通过 traceparent 头传给执行节点）。
+
+协议扩展通过 /health 响应中的 capabilities 协商，旧节点不返回该字段时
+使用原有的逐个任务、不压缩的协议：
+
+    {"status": "active", "capabilities": {"encodings": ["zstd", "gzip"], "batch": true, "max_batch": 100}}
+
+- encodings：支持的请求体压缩方式，超过 NODE_COMPRESS_MIN_BYTES 的请求体会压缩并带 Content-Encoding；
+- batch：支持 POST /tasks/batch，请求体为 {"tasks": [...]}，响应为
+  {"results": [{"task_id": 1, "ok": true, "error": null}, ...]}；
+  由 outbox 发出时每个任务定义带 idempotency_key 字段。
+"""
+
+import gzip
+import json
+import logging
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+from ecron_backend import profiling, tracing
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+logger = logging.getLogger('backend')
+
+_ID_SEGMENT_RE = re.compile(r'/\d+(?=/|$)')
+
+JSON_HEADERS = {'Content-Type': 'application/json; charset=utf-8'}
+
+# 日志中使用的动作名称
+ACTION_LABELS = {
+    'upload': '发送任务详情',
+    'upload_batch': '批量发送任务详情',
+    'start': '启动任务',
+    'stop': '停止任务',
+    'delete': '删除执行节点任务',
+    'execute': '立即执行任务',
+    'list': '获取节点任务列表',
+}
+
+
+# 按优先级排列的请求体压缩方式
+_ENCODERS = {'gzip': lambda body: gzip.compress(body, compresslevel=6)}
+if zstandard is not None:
+    _ENCODERS = {'zstd': zstandard.ZstdCompressor(level=3).compress, **_ENCODERS}
+
+# 节点能力缓存：base_url -> (过期时间, capabilities)，同一进程内共享
+_capabilities = {}
+_capabilities_lock = threading.Lock()
+
+
+# 变化后需要重新下发到执行节点的任务字段（即 build_task_payload 中的字段）
+DEPLOY_FIELDS = ('name', 'cron_expression', 'command', 'command_type', 'requirements')
+
+
+def build_task_payload(task, include_active=False):
+    """下发到执行节点的任务定义"""
+    task_data = {
+        "task_id": task.id,
+        "name": task.name,
+        "cron_expression": task.cron_expression,
+        "command": task.command,
+        "command_type": task.command_type,
+        "requirements": task.requirements
+    }
+    if include_active:
+        task_data["is_active"] = task.status == 'active'
+    return task_data
+
+
+class NodeResult:
+    """一次（可能带重试的）节点调用结果"""
+
+    __slots__ = ('ok', 'response', 'error')
+
+    def __init__(self, ok, response=None, error=None):
+        self.ok = ok
+        self.response = response
+        self.error = error
+
+    def __bool__(self):
+        return self.ok
+
+
+class NodeClient:
+    def __init__(self, node):
+        self.node = node
+        self.base_url = f"http://{node.host}:{node.port}"
+        self.timeout = settings.NODE_CLIENT_TIMEOUT
+        self.max_retries = settings.NODE_CLIENT_MAX_RETRIES
+        self.retry_delay = settings.NODE_CLIENT_RETRY_DELAY
+
+    def request(self, method, path, timeout=None, headers=None, **kwargs):
+        """发送单个请求，网络异常直接抛出 requests.RequestException"""
+        headers = dict(JSON_HEADERS, **(headers or {}))
+        route = _ID_SEGMENT_RE.sub('/{id}', path)
+        with tracing.start_span(f'node {method.upper()} {route}', kind='CLIENT', **{
+            'http.method': method.upper(),
+            'http.url': self.base_url + path,
+            'node.id': self.node.id,
+            'node.name': self.node.name,
+        }) as span:
+            tracing.inject(headers)
+            started = time.perf_counter()
+            try:
+                response = requests.request(
+                    method, self.base_url + path,
+                    timeout=timeout or self.timeout,
+                    headers=headers,
+                    **kwargs
+                )
+            except requests.exceptions.RequestException as e:
+                profiling.record_node_call(method.upper(), self.base_url + path, started, error=str(e))
+                raise
+            profiling.record_node_call(method.upper(), self.base_url + path, started,
+                                       status=response.status_code)
+            # 确保响应内容使用UTF-8解码
+            response.encoding = 'utf-8'
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 400:
+                span.set_error(f'HTTP {response.status_code}')
+        return response
+
+    def call(self, method, path, action, ok_statuses=(200,), retries=None, **kwargs):
+        """
+        调用节点接口，失败时按配置重试。
+        ok_statuses 中的状态码视为成功（例如停止/删除时 404 表示任务已不存在）。
+        """
+        max_retries = retries or self.max_retries
+        error = None
+        response = None
+        with tracing.start_span(f'node.{action}', **{
+            'node.id': self.node.id,
+            'node.action': action,
+            'retry.max': max_retries,
+        }) as span:
+            for attempt in range(max_retries):
+                try:
+                    response = self.request(method, path, **kwargs)
+                    if response.status_code in ok_statuses:
+                        span.set_attribute('retry.attempts', attempt + 1)
+                        return NodeResult(True, response)
+                    error = response.text
+                except requests.exceptions.RequestException as e:
+                    error = str(e)
+
+                logger.warning('%s失败 (尝试 %s/%s): %s', ACTION_LABELS.get(action, action),
+                               attempt + 1, max_retries, error)
+
+                # 如果不是最后一次尝试，等待后重试
+                if attempt < max_retries - 1:
+                    time.sleep(self.retry_delay)
+
+            span.set_attribute('retry.attempts', max_retries)
+            span.set_error(error)
+        return NodeResult(False, response, error)
+
+    def health(self):
+        """
+        检查节点健康状态，返回 NodeResult，成功时 response 为节点的 /health 响应。
+        节点不可达或返回的 status 不是 active 时 ok 为 False。
+        """
+        try:
+            response = self.request('get', '/health', timeout=5)
+        except requests.exceptions.RequestException as e:
+            return NodeResult(False, error=f'无法连接到节点: {e}')
+        if response.status_code != 200:
+            return NodeResult(False, response, f'节点健康检查失败: {response.text}')
+        try:
+            health_data = response.json()
+        except ValueError:
+            health_data = {}
+        health_status = health_data.get('status')
+        if health_status != 'active':
+            return NodeResult(False, response, f'节点状态异常: {health_status}')
+        self.remember_capabilities(health_data)
+        return NodeResult(True, response)
+
+    def remember_capabilities(self, health_data):
+        """记录 /health 响应中声明的协议能力"""
+        capabilities = health_data.get('capabilities') if isinstance(health_data, dict) else None
+        with _capabilities_lock:
+            _capabilities[self.base_url] = (
+                time.monotonic() + settings.NODE_CAPABILITIES_TTL, capabilities or {}
+            )
+
+    @property
+    def capabilities(self):
+        """节点协议能力，缓存过期时重新请求 /health；节点不可达时按旧协议处理"""
+        cached = _capabilities.get(self.base_url)
+        if cached is None or cached[0] < time.monotonic():
+            try:
+                response = self.request('get', '/health', timeout=5)
+                if response.status_code != 200:
+                    return {}
+                self.remember_capabilities(response.json())
+            except (requests.exceptions.RequestException, ValueError):
+                return {}
+            cached = _capabilities[self.base_url]
+        return cached[1]
+
+    def encode_body(self, data):
+        """序列化请求体，节点支持且超过阈值时压缩，返回 (body, headers)"""
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        if len(body) < settings.NODE_COMPRESS_MIN_BYTES:
+            return body, {}
+        supported = self.capabilities.get('encodings') or ()
+        for encoding, compress in _ENCODERS.items():
+            if encoding in supported:
+                return compress(body), {'Content-Encoding': encoding}
+        return body, {}
+
+    def post_json(self, path, action, data, headers=None, **kwargs):
+        """
+        发送（可能压缩的）JSON 请求体。节点返回 415 说明它实际不支持该压缩方式，
+        清除能力缓存后不压缩重发。
+        """
+        body, encoding_headers = self.encode_body(data)
+        result = self.call('post', path, action, data=body,
+                           headers=dict(headers or {}, **encoding_headers), **kwargs)
+        if (not result and encoding_headers and result.response is not None
+                and result.response.status_code == 415):
+            logger.warning('节点不支持压缩请求体，改用未压缩请求: %s', self.node.name)
+            self.remember_capabilities({})
+            result = self.call('post', path, action,
+                               data=json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                               headers=headers, **kwargs)
+        return result
+
+    def upload_task(self, task_data, **kwargs):
+        return self.post_json('/tasks', 'upload', task_data, **kwargs)
+
+    def upload_tasks(self, payloads, **kwargs):
+        """
+        批量下发任务定义，返回 {task_id: NodeResult}。
+        节点支持时通过 /tasks/batch 分批发送，否则（或整批请求失败时）逐个下发。
+        """
+        results = {}
+        capabilities = self.capabilities
+        if capabilities.get('batch'):
+            size = min(settings.NODE_BATCH_SIZE, capabilities.get('max_batch') or settings.NODE_BATCH_SIZE)
+            for start in range(0, len(payloads), size):
+                chunk = payloads[start:start + size]
+                result = self.post_json('/tasks/batch', 'upload_batch', {'tasks': chunk}, **kwargs)
+                if not result:
+                    continue
+                try:
+                    items = result.response.json().get('results')
+                except ValueError:
+                    items = None
+                if items is None:
+                    # 节点只返回了整体状态，视为全部成功
+                    results.update({p['task_id']: NodeResult(True, result.response) for p in chunk})
+                    continue
+                for item in items:
+                    results[item['task_id']] = NodeResult(
+                        bool(item.get('ok')), result.response, item.get('error')
+                    )
+
+        for payload in payloads:
+            if payload['task_id'] not in results:
+                results[payload['task_id']] = self.upload_task(payload, **kwargs)
+        return results
+
+    def start_task(self, task_id, **kwargs):
+        return self.call('post', f'/tasks/{task_id}/start', 'start', **kwargs)
+
+    def stop_task(self, task_id, **kwargs):
+        return self.call('post', f'/tasks/{task_id}/stop', 'stop',
+                         ok_statuses=(200, 404), **kwargs)
+
+    def delete_task(self, task_id, **kwargs):
+        return self.call('delete', f'/tasks/{task_id}', 'delete',
+                         ok_statuses=(200, 404), **kwargs)
+
+    def execute_task(self, task_id, payload=None, **kwargs):
+        """立即执行；payload 中的 job_id 供节点回报执行结果（PATCH /api/jobs/{job_id}/）"""
+        return self.call('post', f'/tasks/{task_id}/execute', 'execute', json=payload, **kwargs)
+
+    def list_tasks(self, **kwargs):
+        """节点上已有的任务，响应为 {"tasks": [{"task_id": ..., "is_running": ...}]}"""
+        return self.call('get', '/tasks', 'list', **kwargs)
+
+    def perform(self, op, task_id, payload=None, **kwargs):
+        """按名称执行单个操作，供 outbox 分发器重放命令步骤"""
+        if op == 'upload':
+            return self.upload_task(payload, **kwargs)
+        if op == 'execute':
+            return self.execute_task(task_id, payload, **kwargs)
+        return getattr(self, f'{op}_task')(task_id, **kwargs)
+
+    def deploy_task(self, task, start=True):
+        """下发任务定义，成功后按需启动，返回最后一步的结果"""
+        result = self.upload_task(build_task_payload(task))
+        if result and start:
+            result = self.start_task(task.id)
+        return result
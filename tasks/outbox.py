@@ -0,0 +1,447 @@
+"""
+节点命令 outbox
+
+任务变更与需要发往执行节点的命令（NodeCommand）在同一个事务中写入，
+即使 worker 在调用节点途中被杀死，命令也不会丢失：
+
+- OUTBOX_DISPATCH=inline（默认）：请求线程在事务提交后立即执行自己写入的命令，
+  命令创建时即处于 running 状态并带租约，执行失败或进程退出后由分发器接手；
+- OUTBOX_DISPATCH=async：请求只写入命令后立即返回，全部由分发器执行。
+
+分发器（manage.py dispatch_outbox）按批领取到期命令，同一 (task_id, node)
+的命令严格按写入顺序执行；失败后指数退避重试，超过 OUTBOX_MAX_ATTEMPTS 次
+进入 dead 状态。每个步骤都带 Idempotency-Key 头，节点可据此去重。
+"""
+
+import logging
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, Min, OuterRef
+from django.utils import timezone
+
+from ecron_backend import tracing
+
+from .models import Job, NodeCommand
+from .node_client import NodeClient, build_task_payload
+
+logger = logging.getLogger('backend')
+
+UNFINISHED = ('pending', 'running')
+
+
+def inline_enabled():
+    return settings.OUTBOX_DISPATCH == 'inline'
+
+
+def enqueue(node, task_id, action, steps):
+    """
+    写入一条命令，调用方应处于修改任务的同一个事务中。
+    inline 模式下命令直接由当前请求领取（running + 租约）。
+    """
+    command = build(node, task_id, action, steps)
+    command.save()
+    return command
+
+
+def build(node, task_id, action, steps):
+    """构造一条尚未保存的命令，配合 enqueue_many 批量写入"""
+    now = timezone.now()
+    claimed = inline_enabled()
+    return NodeCommand(
+        node=node,
+        task_id=task_id,
+        action=action,
+        steps=steps,
+        idempotency_key=uuid.uuid4().hex,
+        status='running' if claimed else 'pending',
+        next_attempt_at=now + timedelta(seconds=lease_seconds()) if claimed else now,
+    )
+
+
+def lease_seconds():
+    """租约时长：OUTBOX_LEASE_SECONDS，且不短于单个步骤在 NodeClient 重试下最长耗时的两倍"""
+    retries = settings.NODE_CLIENT_MAX_RETRIES
+    step = retries * settings.NODE_CLIENT_TIMEOUT + (retries - 1) * settings.NODE_CLIENT_RETRY_DELAY
+    return max(settings.OUTBOX_LEASE_SECONDS, step * 2)
+
+
+def _renew_lease(command):
+    """
+    执行下一个步骤前确认租约：剩余时间不够一个步骤时续租并保存进度。
+    按持有的租约到期时间做条件更新，租约已过期并被分发器重新领取时返回 False。
+    """
+    now = timezone.now()
+    if command.next_attempt_at - now > timedelta(seconds=lease_seconds() / 2):
+        return True
+    lease = now + timedelta(seconds=lease_seconds())
+    renewed = NodeCommand.objects.filter(
+        pk=command.pk, status='running', next_attempt_at=command.next_attempt_at
+    ).update(step=command.step, next_attempt_at=lease, updated_at=now)
+    if renewed:
+        command.next_attempt_at = lease
+    return bool(renewed)
+
+
+def enqueue_many(commands):
+    """
+    批量写入 build() 构造的命令（例如批量导入任务），调用方应处于同一个事务中。
+    同一节点上被取代的下发命令按节点一次取消，命令按 1000 条一批插入。
+    """
+    if not commands:
+        return []
+    task_ids = {}
+    for command in commands:
+        task_ids.setdefault(command.node_id, set()).add(command.task_id)
+    now = timezone.now()
+    for node_id, ids in task_ids.items():
+        ids = list(ids)
+        for start in range(0, len(ids), 1000):
+            NodeCommand.objects.filter(
+                node_id=node_id, task_id__in=ids[start:start + 1000], action='deploy', status='pending'
+            ).update(status='cancelled', last_error='被新的命令取代', updated_at=now)
+
+    created = NodeCommand.objects.bulk_create(commands, batch_size=1000)
+    if all(command.pk for command in created):
+        return created
+    # MySQL 的 bulk_create 不回填主键，按幂等键取回
+    nodes = {command.node_id: command.node for command in commands}
+    keys = [command.idempotency_key for command in commands]
+    saved = {}
+    for start in range(0, len(keys), 1000):
+        for command in NodeCommand.objects.filter(idempotency_key__in=keys[start:start + 1000]):
+            command.node = nodes[command.node_id]
+            saved[command.idempotency_key] = command
+    return [saved[key] for key in keys]
+
+
+def _cancel_pending_deploys(node, task_id):
+    """同一节点上尚未执行的旧下发命令已被新命令取代，不再执行"""
+    NodeCommand.objects.filter(
+        task_id=task_id, node=node, action='deploy', status='pending'
+    ).update(status='cancelled', last_error='被新的命令取代', updated_at=timezone.now())
+
+
+def enqueue_deploy(task, node=None, start=True, include_active=False):
+    """下发任务定义并（按需）启动"""
+    node = node or task.node
+    _cancel_pending_deploys(node, task.id)
+    return enqueue(node, task.id, 'deploy', deploy_steps(task, start, include_active))
+
+
+def deploy_steps(task, start=True, include_active=False):
+    steps = [{'op': 'upload', 'payload': build_task_payload(task, include_active)}]
+    if start:
+        steps.append({'op': 'start'})
+    return steps
+
+
+def enqueue_stop(node, task_id, restart=False):
+    """
+    停止节点上的任务；restart=True 时停止后重新启动（中断当前运行，保留调度）。
+    用户发起的停止取代尚未执行的下发命令；restart 不取消它们，排在其后按顺序执行，
+    节点恢复后仍会收到最新的任务定义。
+    """
+    if not restart:
+        _cancel_pending_deploys(node, task_id)
+    steps = [{'op': 'stop'}]
+    if restart:
+        steps.append({'op': 'start'})
+    return enqueue(node, task_id, 'stop', steps)
+
+
+def enqueue_remove(node, task_id, stop_first=True):
+    """从节点上删除任务，先停止（停止失败不影响删除）"""
+    _cancel_pending_deploys(node, task_id)
+    return enqueue(node, task_id, 'remove', remove_steps(stop_first))
+
+
+def remove_steps(stop_first=True):
+    steps = [{'op': 'stop', 'optional': True}] if stop_first else []
+    steps.append({'op': 'delete'})
+    return steps
+
+
+def enqueue_execute(node, task_id, job_id):
+    """立即执行一次任务，job_id 为对应的执行记录"""
+    return enqueue(node, task_id, 'execute', [{'op': 'execute', 'payload': {'job_id': job_id}}])
+
+
+def _fail_jobs(command, error):
+    """命令最终失败时，把它负责启动的执行记录标记为失败（通过 save 触发下游依赖）"""
+    for step in command.steps:
+        job_id = (step.get('payload') or {}).get('job_id') if step['op'] == 'execute' else None
+        job = Job.objects.filter(id=job_id, status='running').first() if job_id else None
+        if job is not None:
+            job.status = 'failed'
+            job.error_message = f'下发执行命令失败: {error}'
+            job.end_time = timezone.now()
+            job.save()
+
+
+def _backoff(attempts):
+    delay = min(settings.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run_command(command, retries=1):
+    """
+    从 command.step 开始依次执行步骤，返回是否全部成功。
+    retries 为每个步骤在本次执行中的尝试次数（None 表示 NODE_CLIENT_MAX_RETRIES），
+    分发器默认只试一次，失败交给退避重试。
+    """
+    client = NodeClient(command.node)
+    steps = command.steps
+    error = None
+
+    with tracing.start_trace(f'outbox.{command.action}', **{
+        'command.id': command.id,
+        'task.id': command.task_id,
+        'node.id': command.node_id,
+    }):
+        while command.step < len(steps):
+            if not _renew_lease(command):
+                # 已由其他进程接手，不再修改这条命令
+                logger.warning('节点命令租约已过期，交给分发器继续执行: command=%s', command.id)
+                command.last_error = '租约已过期'
+                return False
+            step = steps[command.step]
+            result = client.perform(
+                step['op'], command.task_id, step.get('payload'),
+                retries=retries,
+                headers={'Idempotency-Key': f'{command.idempotency_key}:{command.step}'},
+            )
+            if not result and not step.get('optional'):
+                error = result.error
+                break
+            command.step += 1
+
+    now = timezone.now()
+    if error is None:
+        command.status = 'done'
+        command.last_error = None
+    else:
+        command.attempts += 1
+        command.last_error = error
+        if command.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            command.status = 'dead'
+            _fail_jobs(command, error)
+            logger.error('节点命令进入死信: command=%s, task_id=%s, node_id=%s, 错误: %s',
+                         command.id, command.task_id, command.node_id, error)
+        else:
+            command.status = 'pending'
+            command.next_attempt_at = now + _backoff(command.attempts)
+            logger.warning('节点命令执行失败，稍后重试: command=%s, 第%s次, 错误: %s',
+                           command.id, command.attempts, error)
+    command.save(update_fields=['status', 'step', 'attempts', 'last_error',
+                                'next_attempt_at', 'updated_at'])
+    return error is None
+
+
+def batch_uploads(commands):
+    """
+    把多条命令中待执行的 upload 步骤按节点合并为批量请求（节点支持 /tasks/batch 时），
+    成功的命令跳过该步骤，失败的留给 run_command 单独重试。
+    同一 (task_id, node) 只处理最早的一条，避免越过前面的命令。
+    """
+    by_node = {}
+    seen = set()
+    for command in commands:
+        key = (command.task_id, command.node_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        if command.step < len(command.steps) and command.steps[command.step]['op'] == 'upload':
+            by_node.setdefault(command.node_id, []).append(command)
+
+    for group in by_node.values():
+        if len(group) < 2:
+            continue
+        client = NodeClient(group[0].node)
+        if not client.capabilities.get('batch'):
+            continue
+        payloads = [
+            dict(c.steps[c.step]['payload'], idempotency_key=f'{c.idempotency_key}:{c.step}')
+            for c in group
+        ]
+        results = client.upload_tasks(payloads, retries=1)
+        for command in group:
+            if results.get(command.task_id):
+                command.step += 1
+
+
+def deliver(commands):
+    """
+    在请求中执行刚提交的命令（事务提交后调用）。
+    先对每个节点做一次健康检查，节点不健康时不在请求中等待重试，命令直接交给分发器；
+    同一 (task_id, node) 上前一条命令未成功、或前面还有之前写入的未完成命令时，
+    后续命令也交给分发器，保证顺序。
+    返回 {command.id: 错误信息或 None}；async 模式下返回 None 表示命令已排队。
+    """
+    if not inline_enabled():
+        return None
+
+    results = {}
+    health = {}
+    # 排在其他请求或分发器的未完成命令之后的命令不在这里执行，交给分发器按顺序执行
+    blocked = _queued_behind(commands)
+    for command in commands:
+        if command.node_id not in health:
+            health[command.node_id] = NodeClient(command.node).health()
+    batch_uploads([c for c in commands if health[c.node_id] and (c.task_id, c.node_id) not in blocked])
+
+    for command in commands:
+        key = (command.task_id, command.node_id)
+        checked = health[command.node_id]
+        if not checked or key in blocked:
+            error = checked.error if not checked else '前一条命令未完成'
+            release([command], error)
+            blocked.add(key)
+            results[command.id] = error
+            continue
+        if run_command(command, retries=None):
+            results[command.id] = None
+        else:
+            blocked.add(key)
+            results[command.id] = command.last_error
+    return results
+
+
+def _queued_behind(commands):
+    """前面还有（不属于 commands 的）未完成命令的 (task_id, node_id)"""
+    if not commands:
+        return set()
+    ids = [command.id for command in commands]
+    earliest = {
+        (row['task_id'], row['node_id']): row['first']
+        for row in NodeCommand.objects.filter(
+            status__in=UNFINISHED, task_id__in={command.task_id for command in commands}, id__lt=max(ids),
+        ).exclude(id__in=ids).values('task_id', 'node_id').annotate(first=Min('id'))
+    }
+    return {
+        (command.task_id, command.node_id) for command in commands
+        if earliest.get((command.task_id, command.node_id), command.id) < command.id
+    }
+
+
+def _deliver_in_thread(commands):
+    try:
+        return deliver(commands)
+    except Exception:
+        logger.exception('执行节点命令时出错: node_id=%s', commands[0].node_id)
+        # 未执行完的命令租约到期后由分发器接手
+        return {command.id: '执行出错' for command in commands}
+    finally:
+        connections.close_all()
+
+
+def deliver_by_node(commands, concurrency=None, batch_size=None):
+    """
+    与 deliver 相同，用于一次写入大量命令的场景：命令按节点分组，每个节点再按任务分成
+    batch_size（默认 NODE_BATCH_SIZE）个任务一批，各批并发执行。同一任务的命令在同一批中按顺序执行，
+    每批的上传步骤合并为一次批量请求。
+    """
+    if not inline_enabled():
+        return None
+    batch_size = batch_size or settings.NODE_BATCH_SIZE
+    by_task = {}
+    for command in commands:
+        by_task.setdefault((command.node_id, command.task_id), []).append(command)
+    by_node = {}
+    for (node_id, _), group in by_task.items():
+        by_node.setdefault(node_id, []).append(group)
+    batches = [
+        [command for group in groups[start:start + batch_size] for command in group]
+        for groups in by_node.values()
+        for start in range(0, len(groups), batch_size)
+    ]
+    workers = min(concurrency or settings.OUTBOX_CONCURRENCY, len(batches))
+    if workers <= 1:
+        return deliver(commands)
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch_results in pool.map(_deliver_in_thread, batches):
+            results.update(batch_results)
+    return results
+
+
+def release(commands, error):
+    """不在请求中执行（例如节点健康检查失败），交给分发器稍后重试"""
+    NodeCommand.objects.filter(id__in=[c.id for c in commands], status='running').update(
+        status='pending',
+        last_error=error,
+        next_attempt_at=timezone.now() + _backoff(1),
+        updated_at=timezone.now(),
+    )
+
+
+def claim_batch(limit, node_ids=None):
+    """
+    领取一批到期命令并加租约。只领取各 (task_id, node) 队列的队首命令（前面没有未完成的命令），
+    保证执行顺序。队首条件在 SQL 中判断（NOT EXISTS，走 (task_id, node) 索引），
+    排在退避中命令之后的到期命令不会占满 limit，其他节点的命令不会被饿死。
+    node_ids 限定只领取这些节点的命令。
+    """
+    now = timezone.now()
+    earlier = NodeCommand.objects.filter(
+        task_id=OuterRef('task_id'), node_id=OuterRef('node_id'), status__in=UNFINISHED, id__lt=OuterRef('id'),
+    )
+    due = NodeCommand.objects.select_for_update(skip_locked=True).filter(
+        status__in=UNFINISHED, next_attempt_at__lte=now
+    ).filter(~Exists(earlier))
+    if node_ids is not None:
+        due = due.filter(node_id__in=node_ids)
+    with transaction.atomic():
+        claimed = list(due.order_by('id')[:limit])
+        if not claimed:
+            return []
+
+        lease = now + timedelta(seconds=lease_seconds())
+        NodeCommand.objects.filter(id__in=[c.id for c in claimed]).update(
+            status='running',
+            next_attempt_at=lease,
+            updated_at=now,
+        )
+        for command in claimed:
+            command.status = 'running'
+            command.next_attempt_at = lease
+    return claimed
+
+
+def _run_safely(command):
+    try:
+        return run_command(command)
+    except Exception:
+        logger.exception('执行节点命令时出错: command=%s', command.id)
+        return False
+
+
+def _run_in_thread(command):
+    try:
+        return _run_safely(command)
+    finally:
+        # 线程池中的线程随分发批次结束，连接不能留给持久连接复用
+        connections.close_all()
+
+
+def dispatch_pending(limit=None, concurrency=None, node_ids=None):
+    """领取并执行一批命令，不同节点的命令并发执行，返回本批处理的数量"""
+    if node_ids is not None and not node_ids:
+        return 0
+    commands = claim_batch(limit or settings.OUTBOX_BATCH_SIZE, node_ids)
+    if not commands:
+        return 0
+    batch_uploads(commands)
+    workers = min(concurrency or settings.OUTBOX_CONCURRENCY, len(commands))
+    if workers <= 1:
+        # 在当前线程执行，保留调用方的数据库连接
+        for command in commands:
+            _run_safely(command)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_run_in_thread, commands))
+    return len(commands)
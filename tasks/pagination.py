@@ -0,0 +1,12 @@
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination
+
+
+class StandardPagination(PageNumberPagination):
+    """默认分页，客户端可通过 ?page_size= 调整，上限 MAX_PAGE_SIZE"""
+
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.MAX_PAGE_SIZE
@@ -0,0 +1,77 @@
+"""
+清理软删除的任务
+
+status='deleted' 的任务默认不出现在查询中，但行和执行记录仍在表里。
+删除时间（updated_at）早于 TASK_PURGE_AFTER_DAYS 天的任务连同执行记录一起物理删除：
+
+- 每批 batch_size 个任务，执行记录按 id 每批 batch_size 条删除，每批一个短事务，
+  不会长时间锁表，也不会一次加载大量行；
+- 每个事务先用 select_for_update 锁住仍满足条件（status='deleted' 且超过保留期）的任务行，
+  只删除这些任务的执行记录，清理期间被恢复的任务不会丢失执行历史；
+- 任务删除经过 delete 信号，写入变更墓碑并清理搜索索引，/api/changes 的客户端会收到删除事件；
+- 节点上残留的任务由控制器对账时删除（对账只保留 active / paused 的任务）。
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .models import Job, Task
+
+logger = logging.getLogger('backend')
+
+
+def _purgeable(cutoff):
+    # 走 (status, node) 索引的 status 前缀
+    return Task.all_objects.filter(status='deleted', updated_at__lt=cutoff)
+
+
+def _delete_jobs(task_ids, cutoff, batch_size):
+    total = 0
+    while True:
+        with transaction.atomic():
+            # 锁住仍待清理的任务行，恢复任务的请求会等待本事务结束
+            task_ids = list(
+                _purgeable(cutoff).filter(id__in=task_ids).select_for_update().values_list('id', flat=True)
+            )
+            if not task_ids:
+                return total
+            ids = list(Job.objects.filter(task_id__in=task_ids).order_by().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            if search.backend() == 'index':
+                search.remove_objects('job', ids)
+            Job.objects.filter(id__in=ids).delete()
+        total += len(ids)
+
+
+def purge(now=None, days=None, batch_size=None):
+    """删除超过保留期的软删除任务及其执行记录，返回 (任务数, 执行记录数)"""
+    now = now or timezone.now()
+    days = settings.TASK_PURGE_AFTER_DAYS if days is None else days
+    batch_size = batch_size or settings.TASK_PURGE_BATCH_SIZE
+    cutoff = now - timedelta(days=days)
+    candidates = _purgeable(cutoff).order_by('id')
+
+    tasks = jobs = 0
+    last = 0
+    while True:
+        ids = list(candidates.filter(id__gt=last).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        last = ids[-1]
+        jobs += _delete_jobs(ids, cutoff, batch_size)
+        with transaction.atomic():
+            # 任务行带 status 和保留期条件删除，依赖关系随之级联删除
+            _, counts = _purgeable(cutoff).filter(id__in=ids).delete()
+        tasks += counts.get(Task._meta.label, 0)
+        if len(ids) < batch_size:
+            break
+
+    if tasks:
+        logger.info('清理已删除的任务: %s 个, 执行记录 %s 条', tasks, jobs)
+    return tasks, jobs
@@ -0,0 +1,133 @@
+"""
+超时执行记录回收
+
+节点宕机或一直没有回报结果时，执行记录会一直停留在 running。reap() 找出运行时间超过
+任务 timeout_seconds（为 0 时使用 JOB_DEFAULT_TIMEOUT）的执行记录，批量标记为 timeout：
+
+- 只扫描 status='running' 且开始时间早于最短超时的行，走 (status, start_time) 索引，
+  按 (start_time, id) 分批向后翻页，执行记录总数再多也只读取运行中的部分；
+- 每批一条 UPDATE，带 status='running' 条件，不会覆盖刚好在此期间回报的结果；
+- 批量 UPDATE 不经过 save，任务执行概况（同一事务）、下游依赖触发和搜索索引在这里补做；
+- stop=True 时同时向节点发送停止命令中断卡住的运行。节点的停止是任务级的（取消调度），
+  因此 active 任务停止后立即重新启动，只有非 active 的任务保持停止。
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from . import history, outbox, search, workflow
+from .models import Job, Node, Task, TaskDependency
+
+logger = logging.getLogger('backend')
+
+TIMEOUT_MESSAGE = '执行超时（%s 秒），节点未回报结果'
+
+
+def _shortest_timeout():
+    """所有任务中最短的超时时间（秒），没有任何超时配置时返回 None"""
+    shortest = Task.all_objects.filter(timeout_seconds__gt=0).aggregate(value=Min('timeout_seconds'))['value']
+    candidates = [value for value in (shortest, settings.JOB_DEFAULT_TIMEOUT) if value]
+    return min(candidates) if candidates else None
+
+
+def _timeout_of(task_timeout):
+    return task_timeout or settings.JOB_DEFAULT_TIMEOUT
+
+
+def _after_update(jobs):
+    """补做 save 信号中的工作：下游依赖触发、搜索索引"""
+    upstream_ids = set(
+        TaskDependency.objects.filter(upstream_id__in={job.task_id for job in jobs})
+        .values_list('upstream_id', flat=True)
+    )
+    for job in jobs:
+        if search.backend() == 'index':
+            search.index_object('job', job)
+        # 同一任务的多条执行记录同时超时，只需检查一次下游
+        if job.task_id in upstream_ids:
+            upstream_ids.discard(job.task_id)
+            workflow.on_job_finished(job)
+
+
+def reap(now=None, batch_size=None, stop=False):
+    """回收超时的执行记录，返回回收的条数"""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.REAPER_BATCH_SIZE
+    shortest = _shortest_timeout()
+    if shortest is None:
+        return 0
+
+    candidates = Job.objects.filter(
+        status='running', start_time__lt=now - timedelta(seconds=shortest)
+    ).order_by('start_time', 'id')
+    total = 0
+    stop_targets = set()
+    last = None
+    while True:
+        batch = candidates
+        if last is not None:
+            batch = batch.filter(Q(start_time__gt=last[0]) | Q(start_time=last[0], id__gt=last[1]))
+        rows = list(batch.values('id', 'task_id', 'start_time', 'task__timeout_seconds',
+                                 'task__node_id')[:batch_size])
+        if not rows:
+            break
+        last = (rows[-1]['start_time'], rows[-1]['id'])
+
+        overdue = {}
+        for row in rows:
+            timeout = _timeout_of(row['task__timeout_seconds'])
+            if timeout and row['start_time'] < now - timedelta(seconds=timeout):
+                overdue.setdefault(timeout, []).append(row)
+        for timeout, group in overdue.items():
+            expired = _expire(group, timeout, now)
+            total += len(expired)
+            stop_targets.update(
+                (row['task__node_id'], row['task_id']) for row in group
+                if row['id'] in expired and row['task__node_id'] is not None
+            )
+
+        if len(rows) < batch_size:
+            break
+
+    if stop and stop_targets:
+        _stop_tasks(stop_targets)
+    return total
+
+
+def _expire(rows, timeout, now):
+    """把一批执行记录标记为超时，返回实际更新的 id"""
+    ids = [row['id'] for row in rows]
+    message = TIMEOUT_MESSAGE % timeout
+    with transaction.atomic():
+        count = Job.objects.filter(id__in=ids, status='running').update(
+            status='timeout', end_time=now, error_message=message
+        )
+        if not count:
+            return set()
+        # 只处理确实由本次 UPDATE 改为 timeout 的行
+        jobs = list(Job.objects.filter(id__in=ids, status='timeout', end_time=now).order_by('start_time', 'id'))
+        history.record_finished(jobs, now)
+    logger.warning('回收超时的执行记录: %s 条, 超时 %s 秒', len(jobs), timeout)
+    _after_update(jobs)
+    return {job.id for job in jobs}
+
+
+def _stop_tasks(targets):
+    """targets 为 {(node_id, task_id)}，每个任务只发送一次停止命令，active 的任务停止后重新启动"""
+    nodes = Node.objects.in_bulk({node_id for node_id, _ in targets})
+    with transaction.atomic():
+        active = set(
+            Task.objects.filter(id__in={task_id for _, task_id in targets}, status='active')
+            .values_list('id', flat=True)
+        )
+        commands = [
+            outbox.enqueue_stop(nodes[node_id], task_id, restart=task_id in active)
+            for node_id, task_id in targets if node_id in nodes
+        ]
+    if commands:
+        outbox.deliver(commands)
@@ -0,0 +1,37 @@
+"""
+JSON 渲染
+
+安装了 orjson 时用它序列化响应，否则退回标准库 json（与 DRF 默认行为一致）。
+"""
+
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """序列化为 UTF-8 编码的紧凑 JSON 字节串"""
+    if orjson is not None:
+        # 与标准库 json 一致，允许整数等非字符串的键
+        return orjson.dumps(data, default=_encoder.default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # 需要缩进（例如浏览器里查看）时交给 DRF 默认实现
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
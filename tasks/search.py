@@ -0,0 +1,177 @@
+"""
+任务与执行记录的全文搜索
+
+MySQL 上使用 FULLTEXT 索引（ngram 分词，见 ecron.sql）和 MATCH ... AGAINST；
+其他数据库（例如 SQLite）使用 SearchIndexEntry 倒排索引，由 signals 在保存时增量维护，
+可用 manage.py rebuild_search_index 重建。两种实现都要求查询中的词全部命中。
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Count, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .fastpath import get_values_spec
+from .models import SearchIndexEntry
+
+# 参与搜索的文本字段，与 ecron.sql 中的 FULLTEXT 索引一致
+SEARCH_FIELDS = {
+    'task': ('name', 'description', 'command'),
+    'job': ('result', 'error_message'),
+}
+
+MAX_TERM_LENGTH = 64
+
+# 下划线、点号等也作为分隔符，与 MySQL ngram 分词的匹配结果一致（backup 能匹配 backup_db.sh）
+_WORD_RE = re.compile(r'[0-9a-z]+|[\u4e00-\u9fff]+')
+# MySQL 布尔模式下有特殊含义的字符
+_BOOLEAN_OPERATORS_RE = re.compile(r'[+\-<>()~*"@]')
+
+
+def backend():
+    if settings.SEARCH_BACKEND != 'auto':
+        return settings.SEARCH_BACKEND
+    return 'fulltext' if connection.vendor == 'mysql' else 'index'
+
+
+def tokenize(text):
+    """英文、数字按单词切分，中文按相邻两字切分，返回去重后的词集合"""
+    terms = set()
+    for word in _WORD_RE.findall(text.lower()):
+        if word.isascii() or len(word) == 1:
+            terms.add(word[:MAX_TERM_LENGTH])
+        else:
+            terms.update(word[i:i + 2] for i in range(len(word) - 1))
+    return terms
+
+
+def _match_sql(queryset, kind):
+    quote = connection.ops.quote_name
+    table = quote(queryset.model._meta.db_table)
+    columns = ', '.join(f'{table}.{quote(field)}' for field in SEARCH_FIELDS[kind])
+    return f'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)'
+
+
+def _against(query):
+    words = _BOOLEAN_OPERATORS_RE.sub(' ', query).split()
+    return ' '.join(f'+"{word}"' for word in words)
+
+
+def search(queryset, kind, query):
+    """按关键词过滤 queryset（不改变排序）"""
+    if backend() == 'fulltext':
+        against = _against(query)
+        if not against:
+            return queryset.none()
+        return queryset.filter(
+            RawSQL(_match_sql(queryset, kind), (against,), output_field=BooleanField())
+        )
+
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    matched = (
+        SearchIndexEntry.objects.filter(kind=kind, term__in=terms)
+        .values('object_id')
+        .annotate(hits=Count('id'))
+        .filter(hits=len(terms))
+        .values('object_id')
+    )
+    return queryset.filter(pk__in=matched)
+
+
+def rank(queryset, kind, query):
+    """按相关度排序；本地索引不计算相关度，保持原有排序"""
+    if backend() != 'fulltext':
+        return queryset
+    return queryset.annotate(
+        relevance=RawSQL(_match_sql(queryset, kind), (_against(query),), output_field=FloatField())
+    ).order_by('-relevance', '-pk')
+
+
+def index_object(kind, obj):
+    """重建单个对象的倒排索引"""
+    index_objects(kind, [obj])
+
+
+def object_text(kind, obj):
+    """参与索引的文本"""
+    return ' '.join(getattr(obj, field) or '' for field in SEARCH_FIELDS[kind])
+
+
+def index_objects(kind, objs):
+    """重建一批对象的倒排索引（按 1000 个一批删除旧词条，再批量插入）"""
+    entries = []
+    for obj in objs:
+        text = object_text(kind, obj)
+        entries.extend(SearchIndexEntry(kind=kind, object_id=obj.pk, term=term) for term in tokenize(text))
+    ids = [obj.pk for obj in objs]
+    for start in range(0, len(ids), 1000):
+        SearchIndexEntry.objects.filter(kind=kind, object_id__in=ids[start:start + 1000]).delete()
+    SearchIndexEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def remove_objects(kind, ids):
+    SearchIndexEntry.objects.filter(kind=kind, object_id__in=ids).delete()
+
+
+class SearchMixin:
+    """
+    为 ViewSet 提供 search 接口：?q= 关键词，search_facets 中的参数作为过滤条件，
+    响应中附带各分面的计数（计算某个分面时不应用它自身的过滤条件）。
+    """
+
+    search_kind = None
+    # 参数名 -> 字段（可跨表）
+    search_facets = {}
+
+    def get_search_queryset(self):
+        """search 的基础查询，不应已按分面参数过滤（否则分面计数无法去掉自身的条件）"""
+        return self.get_queryset()
+
+    def get_facet_filter(self, name, value):
+        """分面参数对应的过滤条件，默认按字段相等"""
+        return {self.search_facets[name]: value}
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        queryset = self.get_search_queryset()
+        if query:
+            queryset = search(queryset, self.search_kind, query)
+
+        filters = {
+            name: self.get_facet_filter(name, request.query_params[name])
+            for name in self.search_facets if name in request.query_params
+        }
+
+        def apply(qs, exclude=None):
+            for name, condition in filters.items():
+                if name != exclude:
+                    qs = qs.filter(**condition)
+            return qs
+
+        facets = {}
+        for name, field in self.search_facets.items():
+            counts = (
+                apply(queryset, exclude=name).order_by()
+                .values(field).annotate(count=Count('pk')).order_by('-count')
+            )
+            facets[name] = [{'value': row[field], 'count': row['count']} for row in counts]
+
+        results = apply(queryset)
+        if query:
+            results = rank(results, self.search_kind, query)
+        spec = get_values_spec(self.get_serializer_class(), self.get_requested_fields())
+        rows = results.values(*spec.sources)
+
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response({'results': [spec.render(row) for row in rows], 'facets': facets})
+        response = self.get_paginated_response([spec.render(row) for row in page])
+        response.data['facets'] = facets
+        return response
@@ -1,11 +1,13 @@
 from rest_framework import serializers
-from .models import Task, Job, Node
+from .models import Task, Job, Node, NodeCommand, TaskDependency
+from .workflow import creates_cycle
 
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'change_seq', 'last_job_status', 'last_run_at',
+                            'last_duration', 'consecutive_failures', 'success_rate_7d')
 
 class JobSerializer(serializers.ModelSerializer):
     task_name = serializers.CharField(source='task.name', read_only=True)
@@ -13,10 +15,38 @@ class JobSerializer(serializers.ModelSerializer):
     class Meta:
         model = Job
         fields = '__all__'
-        read_only_fields = ('start_time', 'end_time')
+        read_only_fields = ('start_time', 'end_time', 'run_started_at')
+
+class JobExportSerializer(JobSerializer):
+    """导出时附带节点名称"""
+    node_name = serializers.CharField(source='task.node.name', read_only=True, default=None)
 
 class NodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Node
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'last_heartbeat') 
\ No newline at end of file
+        read_only_fields = ('created_at', 'updated_at', 'last_heartbeat', 'change_seq',
+                            'cpu_percent', 'memory_percent', 'running_jobs', 'queue_depth')
+
+class NodeCommandSerializer(serializers.ModelSerializer):
+    node_name = serializers.CharField(source='node.name', read_only=True)
+
+    class Meta:
+        model = NodeCommand
+        fields = '__all__'
+
+class TaskDependencySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TaskDependency
+        fields = '__all__'
+        read_only_fields = ('created_at',)
+
+    def validate(self, attrs):
+        upstream = attrs.get('upstream', getattr(self.instance, 'upstream', None))
+        downstream = attrs.get('downstream', getattr(self.instance, 'downstream', None))
+        edges = TaskDependency.objects.values_list('upstream_id', 'downstream_id')
+        if self.instance is not None:
+            edges = edges.exclude(pk=self.instance.pk)
+        if creates_cycle(upstream.id, downstream.id, list(edges)):
+            raise serializers.ValidationError('依赖关系会形成环')
+        return attrs
@@ -0,0 +1,105 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from ecron_backend import dbstats
+
+from . import cache, history, search, workflow
+from .models import ChangeSequence, ChangeTombstone, Job, Node, Task
+
+
+@receiver([post_save, post_delete], sender=Task)
+def invalidate_task_cache(sender, **kwargs):
+    cache.invalidate('task')
+
+
+@receiver([post_save, post_delete], sender=Node)
+def invalidate_node_cache(sender, **kwargs):
+    cache.invalidate('node')
+
+
+def _text_changed(kind, update_fields):
+    if update_fields is None:
+        return True
+    return bool(set(update_fields) & set(search.SEARCH_FIELDS[kind]))
+
+
+@receiver(post_init, sender=Task)
+def remember_task_text(sender, instance, **kwargs):
+    # 加载时已索引的文本；字段被延迟加载时为 None，保存时总是重建
+    fields = search.SEARCH_FIELDS['task']
+    if instance.pk is not None and all(field in instance.__dict__ for field in fields):
+        instance._indexed_text = search.object_text('task', instance)
+    else:
+        instance._indexed_text = None
+
+
+@receiver(post_save, sender=Task)
+def index_task(sender, instance, created, update_fields=None, **kwargs):
+    if search.backend() != 'index' or not _text_changed('task', update_fields):
+        return
+    # pause / resume 等不修改文本的保存不重建索引
+    text = search.object_text('task', instance)
+    indexed = getattr(instance, '_indexed_text', None)
+    if not created and indexed is not None and (
+            text == indexed or search.tokenize(text) == search.tokenize(indexed)):
+        return
+    search.index_object('task', instance)
+    instance._indexed_text = text
+
+
+@receiver(post_save, sender=Job)
+def index_job(sender, instance, created, update_fields=None, **kwargs):
+    # 新建的执行记录通常还没有输出，不需要索引
+    if created and not (instance.result or instance.error_message):
+        return
+    if search.backend() == 'index' and _text_changed('job', update_fields):
+        search.index_object('job', instance)
+
+
+@receiver(pre_delete, sender=Task)
+def unindex_task(sender, instance, **kwargs):
+    # 执行记录随任务级联删除，这里一并清理，避免为 Job 注册删除信号（会使级联删除逐行进行）
+    if search.backend() == 'index':
+        search.remove_objects('task', [instance.pk])
+        search.remove_objects('job', Job.objects.filter(task=instance).values('id'))
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Node)
+def record_tombstone(sender, instance, **kwargs):
+    # 删除在事务中进行，墓碑与删除一起提交
+    ChangeTombstone.objects.create(
+        kind=sender._meta.model_name,
+        object_id=instance.pk,
+        change_seq=ChangeSequence.next_value(),
+    )
+
+
+@receiver(pre_delete, sender=Node)
+def touch_node_tasks(sender, instance, **kwargs):
+    # 删除节点时任务的 node 会被直接 UPDATE 为 NULL，不经过 save，这里补记变更序号
+    tasks = Task.all_objects.filter(node=instance)
+    if tasks.exists():
+        tasks.update(change_seq=ChangeSequence.next_value())
+        cache.invalidate('task')
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    dbstats.record_connection(connection.alias)
+
+
+@receiver(post_init, sender=Job)
+def remember_job_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.status if instance.pk else None
+
+
+@receiver(post_save, sender=Job)
+def job_finished(sender, instance, created, **kwargs):
+    # 只在状态变为完成时处理一次：更新任务的执行概况，触发下游依赖
+    finished = instance.status in workflow.FINISHED
+    if finished and instance._loaded_status != instance.status:
+        history.record_finished([instance])
+        workflow.on_job_finished(instance)
+    instance._loaded_status = instance.status
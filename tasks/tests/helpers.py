@@ -0,0 +1,57 @@
+"""测试共用的配置和构造函数"""
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from benchmarks.fake_node import FakeNode
+
+from tasks.models import Node, Task
+
+# 进程内缓存，不读写 /tmp/ecron_cache；节点调用失败时不等待重试间隔；
+# 资源数据不缓冲，不启动后台写入线程
+TEST_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ecron-test',
+        }
+    },
+    'THROTTLE_ENABLED': False,
+    'NODE_CLIENT_RETRY_DELAY': 0,
+    'NODE_CLIENT_MAX_RETRIES': 1,
+    'OUTBOX_DISPATCH': 'inline',
+    'OUTBOX_CONCURRENCY': 1,
+    'SEARCH_BACKEND': 'index',
+    'METRICS_FLUSH_INTERVAL': 0,
+}
+
+
+@override_settings(**TEST_SETTINGS)
+class EcronTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+def make_node(name='node-1', fake=None, **kwargs):
+    """fake 为 FakeNode 时节点指向它，否则指向不可达的地址"""
+    kwargs.setdefault('status', 'active')
+    if fake is not None:
+        kwargs.update(host=fake.host, port=fake.port)
+    kwargs.setdefault('host', '127.0.0.1')
+    kwargs.setdefault('port', 1)
+    return Node.objects.create(name=name, **kwargs)
+
+
+def make_task(name='task', **kwargs):
+    kwargs.setdefault('cron_expression', '* * * * *')
+    kwargs.setdefault('command', 'echo hello')
+    kwargs.setdefault('command_type', 'shell')
+    return Task.objects.create(name=name, **kwargs)
+
+
+def start_fake_node(testcase, **options):
+    """启动模拟节点，测试结束时关闭"""
+    fake = FakeNode(**options).start()
+    testcase.addCleanup(fake.stop)
+    return fake
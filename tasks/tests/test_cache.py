@@ -0,0 +1,73 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from tasks.tests.helpers import EcronTestCase, make_node, make_task
+
+
+class ResponseCacheTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.task = make_task('cached')
+
+    def test_etag_not_modified(self):
+        first = self.client.get('/api/tasks/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # 缓存命中时不访问数据库
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/tasks/')
+        self.assertEqual(cached.json(), first.json())
+
+    def test_save_invalidates(self):
+        etag = self.client.get(f'/api/tasks/{self.task.id}/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.name = 'renamed'
+            self.task.save()
+
+        response = self.client.get(f'/api/tasks/{self.task.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['name'], 'renamed')
+
+    def heartbeat(self, node, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/nodes/heartbeat/', {
+                'name': node.name, 'host': node.host, 'port': node.port, **data,
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_heartbeat_keeps_node_cache(self):
+        node = make_node('worker', host='10.0.0.1', port=5001)
+        etag = self.client.get('/api/nodes/')['ETag']
+
+        self.heartbeat(node, resources={'cpu_percent': 12.5})
+
+        response = self.client.get('/api/nodes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # 心跳时间和资源快照在 NODE_CACHE_TIMEOUT 秒后刷新
+        with mock.patch('tasks.cache.time.time', return_value=time.time() + settings.NODE_CACHE_TIMEOUT):
+            response = self.client.get('/api/nodes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['cpu_percent'], 12.5)
+
+    def test_heartbeat_change_invalidates_nodes(self):
+        node = make_node('worker', host='10.0.0.1', port=5001, status='inactive')
+        etag = self.client.get('/api/nodes/')['ETag']
+
+        self.heartbeat(node)
+
+        response = self.client.get('/api/nodes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['status'], 'active')
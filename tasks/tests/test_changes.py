@@ -0,0 +1,97 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks.models import ChangeLease, ChangeSequence, Task
+from tasks.tests.helpers import EcronTestCase, make_node, make_task
+
+
+class ChangeFeedTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def changes(self, since, limit=100):
+        response = self.client.get(f'/api/changes/?since={since}&limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_in_sequence_order(self):
+        first = make_task('first')
+        node = make_node()
+        second = make_task('second', node=node)
+
+        page = self.changes(0, limit=2)
+        self.assertEqual([row['name'] for row in page['tasks']], ['first'])
+        self.assertEqual([row['name'] for row in page['nodes']], [node.name])
+        self.assertTrue(page['has_more'])
+
+        page = self.changes(page['next'], limit=2)
+        self.assertEqual([row['id'] for row in page['tasks']], [second.id])
+        self.assertFalse(page['has_more'])
+
+        page = self.changes(page['next'])
+        self.assertEqual(page['tasks'] + page['nodes'] + page['deleted'], [])
+        self.assertEqual(self.changes(page['next'])['next'], page['next'])
+
+        # 再次保存后以新的序号出现
+        first.save()
+        self.assertEqual([row['id'] for row in self.changes(page['next'])['tasks']], [first.id])
+
+    def test_soft_and_hard_deletes(self):
+        soft = make_task('soft')
+        hard = make_task('hard')
+        since = self.changes(0)['next']
+
+        soft.status = 'deleted'
+        soft.save()
+        self.assertEqual(self.client.delete(f'/api/tasks/{hard.id}/').status_code, 204)
+
+        page = self.changes(since)
+        self.assertEqual([(row['id'], row['status']) for row in page['tasks']], [(soft.id, 'deleted')])
+        self.assertEqual(
+            [(row['kind'], row['id']) for row in page['deleted']], [('task', hard.id)]
+        )
+        self.assertFalse(Task.all_objects.filter(id=hard.id).exists())
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/api/changes/?since=x').status_code, 400)
+
+
+class ChangeSequenceTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_feed_stops_before_uncommitted_seq(self):
+        first = make_task('first')
+        second = make_task('second')
+        # second 的序号所在的事务尚未提交
+        lease = ChangeLease.objects.create(seq=second.change_seq, expires_at=timezone.now() + timedelta(seconds=60))
+
+        page = self.client.get('/api/changes/?since=0').json()
+        self.assertEqual([row['id'] for row in page['tasks']], [first.id])
+        self.assertEqual(page['next'], first.change_seq)
+
+        lease.delete()
+        page = self.client.get(f'/api/changes/?since={page["next"]}').json()
+        self.assertEqual([row['id'] for row in page['tasks']], [second.id])
+
+    def test_expired_lease_is_ignored(self):
+        task = make_task()
+        ChangeLease.objects.create(seq=task.change_seq, expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(ChangeSequence.settled(), task.change_seq)
+        self.assertFalse(ChangeLease.objects.exists())
+
+    def test_reserve_on_separate_connection(self):
+        first = ChangeSequence.next_value()
+        # 用 default 连接走单独连接的分配流程
+        with mock.patch('tasks.models.DEFAULT_DB_ALIAS', 'primary'):
+            self.assertEqual(ChangeSequence.reserve(3), first + 1)
+            self.assertEqual(ChangeSequence.next_value(), first + 4)
+        # 登记在写入序号的事务中删除
+        self.assertFalse(ChangeLease.objects.exists())
+        self.assertEqual(ChangeSequence.settled(), first + 4)
@@ -0,0 +1,61 @@
+from tasks import controller, outbox
+from tasks.models import ControllerInstance, Node
+from tasks.tests.helpers import EcronTestCase, make_node, make_task, start_fake_node
+
+
+class HashRingTests(EcronTestCase):
+    def test_new_member_moves_few_keys(self):
+        before = controller.HashRing(['a', 'b', 'c'])
+        after = controller.HashRing(['a', 'b', 'c', 'd'])
+
+        moved = [key for key in range(1000) if before.owner(key) != after.owner(key)]
+
+        # 只有归属新成员的节点迁移
+        self.assertTrue(all(after.owner(key) == 'd' for key in moved))
+        self.assertLess(len(moved), 500)
+        self.assertIsNone(controller.HashRing([]).owner(1))
+
+
+class ControllerTests(EcronTestCase):
+    def test_instances_split_nodes(self):
+        nodes = {make_node(f'node-{i}').id for i in range(20)}
+        first, second = controller.Controller('first'), controller.Controller('second')
+        first.renew()
+        second.renew()
+        first.renew()
+
+        self.assertEqual(first.owned | second.owned, nodes)
+        self.assertFalse(first.owned & second.owned)
+
+        # 实例退出后其他实例在下一轮接手
+        second.leave()
+        self.assertEqual(first.renew(), nodes)
+        self.assertEqual(list(ControllerInstance.objects.values_list('instance_id', flat=True)), ['first'])
+
+    def test_probe_updates_status(self):
+        fake = start_fake_node(self)
+        up = make_node('up', fake=fake, status='inactive')
+        down = make_node('down')
+        probe = controller.Controller('probe')
+
+        for node in (up, down):
+            probe._probe_node(node)
+
+        statuses = dict(Node.objects.values_list('name', 'status'))
+        self.assertEqual(statuses, {'up': 'active', 'down': 'inactive'})
+
+    def test_reconcile_node(self):
+        fake = start_fake_node(self)
+        node = make_node(fake=fake)
+        missing = make_task('missing', node=node)
+        paused = make_task('paused', node=node, status='paused')
+        busy = make_task('busy', node=node)
+        fake.state.tasks.update({task_id: {'task_id': task_id} for task_id in (paused.id, 999)})
+        fake.state.running.update({paused.id, 999})
+        # 已有未完成命令的任务不参与对账
+        outbox.release([outbox.enqueue_deploy(busy)], 'test')
+
+        self.assertEqual(controller.Controller('reconcile')._reconcile_node(node), 3)
+
+        self.assertEqual(set(fake.state.tasks), {missing.id, paused.id})
+        self.assertEqual(fake.state.running, {missing.id})
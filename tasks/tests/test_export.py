@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import unittest
+from datetime import datetime
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks import export
+from tasks.models import Job
+from tasks.tests.helpers import EcronTestCase, make_node, make_task
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.task = make_task('exported', node=make_node('worker'))
+        self.jobs = [Job.objects.create(task=self.task, status=status)
+                     for status in ('success', 'failed', 'success', 'timeout', 'running')]
+
+    def download(self, query):
+        response = self.client.get(f'/api/jobs/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_in_batches(self):
+        rows = [json.loads(line) for line in self.download('fmt=ndjson').splitlines()]
+
+        self.assertEqual([row['id'] for row in rows], [job.id for job in reversed(self.jobs)])
+        self.assertEqual({row['node_name'] for row in rows}, {'worker'})
+
+    def test_csv_with_status_filter(self):
+        content = self.download('fmt=csv&status=success,timeout').decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual([int(row['id']) for row in rows], [self.jobs[3].id, self.jobs[2].id, self.jobs[0].id])
+        self.assertEqual(content.count('id,'), 1)
+
+    def test_invalid_params(self):
+        for query in ('fmt=xml', 'status=unknown', 'since=yesterday'):
+            self.assertEqual(self.client.get(f'/api/jobs/export/?{query}').status_code, 400)
+
+    @unittest.skipUnless(export.parquet_available(), '未安装 pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet
+
+        table = pyarrow.parquet.read_table(io.BytesIO(self.download('fmt=parquet&fields=id,status')))
+
+        self.assertEqual(table.column_names, ['id', 'status'])
+        self.assertEqual(table.column('id').to_pylist(), [job.id for job in reversed(self.jobs)])
+
+
+class FilterTests(EcronTestCase):
+    def test_date_only_until_covers_whole_day(self):
+        task = make_task()
+        job = Job.objects.create(task=task, status='success')
+        Job.objects.filter(id=job.id).update(start_time=timezone.make_aware(datetime(2024, 1, 1, 23, 30)))
+
+        jobs = export.filter_jobs(Job.objects.all(), since='2024-01-01', until='2024-01-01')
+
+        self.assertEqual(list(jobs), [job])
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks import history
+from tasks.models import Job, Task
+from tasks.tests.helpers import EcronTestCase, make_task
+
+FIELDS = ('last_job_status', 'last_run_at', 'last_duration', 'consecutive_failures', 'success_rate_7d')
+
+
+class HistoryTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.task = make_task()
+
+    def report(self, status):
+        """节点通过 PATCH 回报执行结果，不带 end_time"""
+        job = Job.objects.create(task=self.task, status='running')
+        Job.objects.filter(id=job.id).update(start_time=timezone.now() - timedelta(seconds=5))
+        response = self.client.patch(f'/api/jobs/{job.id}/', {'status': status}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return Job.objects.get(id=job.id)
+
+    def summary(self):
+        return Task.objects.values(*FIELDS).get(id=self.task.id)
+
+    def test_patch_sets_end_time(self):
+        job = self.report('success')
+
+        self.assertIsNotNone(job.end_time)
+        self.assertGreaterEqual(job.end_time, job.start_time)
+
+        # 已有的 end_time 不会被再次回报覆盖
+        end_time = job.end_time
+        self.client.patch(f'/api/jobs/{job.id}/', {'status': 'failed'}, format='json')
+        job.refresh_from_db()
+        self.assertEqual(job.end_time, end_time)
+
+    def test_incremental_matches_refresh(self):
+        for status in ('failed', 'success', 'failed', 'timeout'):
+            last = self.report(status)
+
+        incremental = self.summary()
+        self.assertEqual(incremental['last_job_status'], 'timeout')
+        self.assertEqual(incremental['last_run_at'], last.start_time)
+        self.assertIsNotNone(incremental['last_duration'])
+        self.assertEqual(incremental['consecutive_failures'], 2)
+        self.assertEqual(incremental['success_rate_7d'], 0.25)
+
+        Task.objects.filter(id=self.task.id).update(
+            last_job_status=None, last_run_at=None, last_duration=None,
+            consecutive_failures=0, success_rate_7d=None,
+        )
+        self.assertEqual(history.refresh([self.task.id]), 1)
+        self.assertEqual(self.summary(), incremental)
+
+    def test_refresh_without_end_time(self):
+        # 升级前留下的完成记录可能没有 end_time
+        for status in ('success', 'failed'):
+            Job.objects.create(task=self.task, status=status)
+
+        history.refresh([self.task.id])
+
+        summary = self.summary()
+        self.assertEqual(summary['last_job_status'], 'failed')
+        self.assertEqual(summary['consecutive_failures'], 1)
+        self.assertIsNone(summary['last_duration'])
+
+    def test_batch_in_id_order(self):
+        jobs = [Job.objects.create(task=self.task, status=status) for status in ('success', 'failed')]
+
+        history.record_finished(list(reversed(jobs)))
+
+        summary = self.summary()
+        self.assertEqual(summary['last_job_status'], 'failed')
+        self.assertEqual(summary['consecutive_failures'], 1)
@@ -0,0 +1,117 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks import idempotency
+from tasks.models import IdempotencyKey, Task
+from tasks.node_client import NodeClient
+from tasks.tests.helpers import EcronTestCase, make_node, make_task, start_fake_node
+
+
+class IdempotentActionTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.fake = start_fake_node(self)
+        self.task = make_task(node=make_node(fake=self.fake))
+        self.url = f'/api/tasks/{self.task.id}/pause/'
+
+    def deploy(self):
+        self.fake.state.tasks[self.task.id] = {'task_id': self.task.id}
+        self.fake.state.running.add(self.task.id)
+
+    def test_replays_response(self):
+        self.deploy()
+        first = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(first.status_code, 200)
+        requests = self.fake.state.requests
+
+        replay = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='k1')
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(self.fake.state.requests, requests)
+
+        # 不同的键或不同的接口不会命中
+        other = self.client.post(f'/api/tasks/{self.task.id}/resume/', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertFalse(other.has_header('Idempotent-Replayed'))
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_server_error_is_not_saved(self):
+        # 节点上没有这个任务，停止失败返回 500
+        self.assertEqual(self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='k2').status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.deploy()
+        response = self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='k2')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Task.objects.get(id=self.task.id).status, 'paused')
+
+    def test_different_body_is_rejected(self):
+        self.deploy()
+        self.assertEqual(self.client.post(self.url, {'reason': 'a'}, format='json',
+                                          HTTP_IDEMPOTENCY_KEY='k3').status_code, 200)
+
+        response = self.client.post(self.url, {'reason': 'b'}, format='json', HTTP_IDEMPOTENCY_KEY='k3')
+
+        self.assertEqual(response.status_code, 422)
+        replay = self.client.post(self.url, {'reason': 'a'}, format='json', HTTP_IDEMPOTENCY_KEY='k3')
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_replaced_claim_is_not_overwritten(self):
+        self.deploy()
+        request = NodeClient.request
+
+        def take_over(client, *args, **kwargs):
+            # 处理中的记录过期后，重试的请求替换了它并已完成
+            IdempotencyKey.objects.all().delete()
+            IdempotencyKey.objects.create(key='fixed', status_code=202, response={'retry': True},
+                                          expires_at=timezone.now() + timedelta(seconds=600))
+            return request(client, *args, **kwargs)
+
+        with mock.patch.object(NodeClient, 'request', take_over), \
+                mock.patch.object(idempotency, '_key', lambda view, value: 'fixed'):
+            self.assertEqual(self.client.post(self.url, HTTP_IDEMPOTENCY_KEY='k4').status_code, 200)
+
+        row = IdempotencyKey.objects.get()
+        self.assertEqual((row.status_code, row.response), (202, {'retry': True}))
+
+
+class ClaimTests(EcronTestCase):
+    def test_pending_claim_blocks(self):
+        claim, existing = idempotency._claim('a', 'f1')
+        self.assertIsNotNone(claim)
+        self.assertIsNone(existing)
+
+        claim, existing = idempotency._claim('a', 'f1')
+        self.assertIsNone(claim)
+        self.assertEqual((existing.status_code, existing.fingerprint), (None, 'f1'))
+
+    def test_expired_claim_is_replaced(self):
+        old = IdempotencyKey.objects.create(
+            key='a', status_code=200, expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        claim, existing = idempotency._claim('a')
+        self.assertIsNone(existing)
+        self.assertNotEqual(claim.pk, old.pk)
+        self.assertIsNone(IdempotencyKey.objects.get(key='a').status_code)
+
+    @override_settings(NODE_CLIENT_MAX_RETRIES=3, NODE_CLIENT_TIMEOUT=10, NODE_CLIENT_RETRY_DELAY=1,
+                       OUTBOX_LEASE_SECONDS=120, IDEMPOTENCY_PENDING_TTL=60)
+    def test_pending_ttl_covers_inline_commands(self):
+        self.assertGreaterEqual(idempotency.pending_ttl(), 4 * (3 * 10 + 2 * 1))
+        claim, _ = idempotency._claim('a')
+        self.assertGreater(claim.expires_at, timezone.now() + timedelta(seconds=60))
+
+    def test_purge_expired(self):
+        now = timezone.now()
+        IdempotencyKey.objects.create(key='old', expires_at=now - timedelta(seconds=1))
+        IdempotencyKey.objects.create(key='new', expires_at=now + timedelta(seconds=60))
+
+        self.assertEqual(idempotency.purge_expired(now), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
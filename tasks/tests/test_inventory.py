@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks import inventory
+from tasks.models import Job
+from tasks.tests.helpers import EcronTestCase, make_node, make_task
+
+
+class InventoryTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.busy = make_node('busy', last_heartbeat=timezone.now())
+        self.idle = make_node('idle', status='inactive')
+        self.active = make_task('active', node=self.busy)
+        self.paused = make_task('paused', node=self.busy, status='paused')
+        make_task('deleted', node=self.busy, status='deleted')
+        for status in ('running', 'running', 'success', 'success', 'success', 'failed'):
+            Job.objects.create(task=self.active, status=status)
+        old = Job.objects.create(task=self.paused, status='failed')
+        Job.objects.filter(id=old.id).update(start_time=timezone.now() - timedelta(days=2))
+
+    def test_summary(self):
+        data = inventory.summary()
+
+        nodes = {row['name']: row for row in data['nodes']}
+        busy = nodes['busy']
+        self.assertEqual(
+            [busy[field] for field in inventory.COUNT_FIELDS], [1, 1, 2, 4, 1]
+        )
+        self.assertEqual(busy['failure_rate'], 0.25)
+        self.assertIsNotNone(busy['heartbeat_age'])
+        idle = nodes['idle']
+        self.assertEqual([idle[field] for field in inventory.COUNT_FIELDS], [0, 0, 0, 0, 0])
+        self.assertIsNone(idle['failure_rate'])
+        self.assertIsNone(idle['last_heartbeat'])
+        self.assertEqual(data['totals']['nodes'], 2)
+        self.assertEqual(data['totals']['active_nodes'], 1)
+
+        # 72 小时窗口包含两天前的失败
+        self.assertEqual(inventory.summary(window=timedelta(hours=72))['totals']['recent_failures'], 2)
+
+    def test_summary_api(self):
+        response = self.client.get('/api/nodes/summary/?hours=24')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totals']['jobs_running'], 2)
+        self.assertEqual(self.client.get('/api/nodes/summary/?hours=0').status_code, 400)
+
+    def test_node_tasks(self):
+        response = self.client.get(f'/api/nodes/{self.busy.id}/tasks/')
+        self.assertEqual(response.status_code, 200)
+        rows = {row['name']: row['jobs_running'] for row in response.json()['results']}
+        self.assertEqual(rows, {'active': 2, 'paused': 0})
+
+        response = self.client.get(f'/api/nodes/{self.busy.id}/tasks/?status=paused')
+        self.assertEqual([row['name'] for row in response.json()['results']], ['paused'])
@@ -0,0 +1,87 @@
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+
+from tasks import metrics
+from tasks.models import NodeMetric, NodeMetricRollup
+from tasks.tests.helpers import EcronTestCase, make_node
+
+T0 = datetime(2024, 1, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+
+class RollupTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.node = make_node()
+
+    def sample(self, seconds, cpu):
+        NodeMetric.objects.create(node=self.node, ts=T0 + timedelta(seconds=seconds), cpu_percent=cpu)
+
+    def buckets(self):
+        return {
+            (row.bucket - T0).seconds // 60: (row.samples, row.cpu_avg, row.cpu_max)
+            for row in NodeMetricRollup.objects.all()
+        }
+
+    @override_settings(METRICS_FLUSH_INTERVAL=10)
+    def test_late_samples_are_rolled_up(self):
+        self.sample(30, 10)
+        self.sample(70, 20)
+        self.assertEqual(metrics.rollup(T0 + timedelta(seconds=125)), 2)
+
+        # 其他 worker 在汇总之后才写入的、已汇总过的分钟的数据
+        self.sample(55, 40)
+        metrics.rollup(T0 + timedelta(seconds=140))
+
+        self.assertEqual(self.buckets(), {0: (2, 25, 40), 1: (1, 20, 20)})
+
+    @override_settings(METRICS_FLUSH_INTERVAL=10)
+    def test_lookback_is_whole_minutes(self):
+        self.sample(10, 10)
+        self.sample(50, 30)
+        self.sample(70, 50)
+        metrics.rollup(T0 + timedelta(seconds=125))
+
+        # 回看窗口的起点落在第 0 分钟中间，仍按整分钟重新汇总
+        metrics.rollup(T0 + timedelta(seconds=185))
+
+        self.assertEqual(self.buckets(), {0: (2, 20, 30), 1: (1, 50, 50)})
+
+    def test_purge(self):
+        now = timezone.now()
+        NodeMetric.objects.create(node=self.node, ts=now - timedelta(hours=2), cpu_percent=1)
+        NodeMetric.objects.create(node=self.node, ts=now, cpu_percent=1)
+        NodeMetricRollup.objects.create(node=self.node, bucket=now - timedelta(days=8), samples=1)
+
+        self.assertEqual(metrics.purge(now, batch_size=1), (1, 1))
+        self.assertEqual(NodeMetric.objects.count(), 1)
+
+
+class FlushTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(metrics._buffer.clear)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0.01, METRICS_BUFFER_SIZE=1000)
+    def test_flusher_thread_writes_buffer(self):
+        flushed = threading.Event()
+
+        def flush():
+            if threading.current_thread().name == 'node-metrics-flusher':
+                flushed.set()
+
+        with mock.patch.object(metrics, 'flush', flush), mock.patch.object(metrics, '_flusher_pid', None):
+            metrics.record(1, {'cpu_percent': 1.0})
+            # 之后没有新的心跳，缓冲区由后台线程写入
+            self.assertTrue(flushed.wait(5))
+
+    def test_no_buffer_without_interval(self):
+        node = make_node()
+
+        metrics.record(node.id, {'cpu_percent': 1.0})
+
+        self.assertEqual(NodeMetric.objects.count(), 1)
+        self.assertEqual(metrics._buffer, [])
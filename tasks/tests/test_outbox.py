@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from tasks import outbox
+from tasks.models import Job, NodeCommand
+from tasks.tests.helpers import EcronTestCase, make_node, make_task, start_fake_node
+
+
+class DeliverTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake = start_fake_node(self)
+        self.node = make_node(fake=self.fake)
+        self.task = make_task(node=self.node)
+
+    def test_deploy_runs_inline(self):
+        command = outbox.enqueue_deploy(self.task)
+        self.assertEqual(command.status, 'running')
+
+        results = outbox.deliver([command])
+
+        self.assertEqual(results, {command.id: None})
+        command.refresh_from_db()
+        self.assertEqual((command.status, command.step), ('done', 2))
+        self.assertIn(self.task.id, self.fake.state.tasks)
+        self.assertIn(self.task.id, self.fake.state.running)
+
+    def test_unhealthy_node_hands_over_to_dispatcher(self):
+        self.node.port = 1
+        command = outbox.enqueue_deploy(self.task)
+
+        results = outbox.deliver([command])
+
+        self.assertTrue(results[command.id])
+        command.refresh_from_db()
+        self.assertEqual(command.status, 'pending')
+
+        # 节点恢复后由分发器执行
+        self.node.port = self.fake.port
+        self.node.save()
+        NodeCommand.objects.filter(id=command.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.dispatch_pending(), 1)
+        command.refresh_from_db()
+        self.assertEqual(command.status, 'done')
+        self.assertIn(self.task.id, self.fake.state.running)
+
+    def test_commands_of_same_task_run_in_order(self):
+        first = outbox.enqueue_deploy(self.task)
+        outbox.release([first], 'test')
+        # 立即执行命令不会取消前面的下发命令
+        job = Job.objects.create(task=self.task, status='running')
+        second = outbox.enqueue_execute(self.node, self.task.id, job.id)
+        outbox.release([second], 'test')
+        NodeCommand.objects.update(next_attempt_at=timezone.now())
+
+        claimed = outbox.claim_batch(10)
+
+        self.assertEqual([command.id for command in claimed], [first.id])
+        self.assertTrue(outbox.run_command(claimed[0]))
+        NodeCommand.objects.filter(id=second.id).update(next_attempt_at=timezone.now())
+        self.assertEqual([command.id for command in outbox.claim_batch(10)], [second.id])
+
+    def test_blocked_commands_do_not_starve_others(self):
+        down = make_node('down', port=1)
+        head = outbox.enqueue_deploy(make_task('blocked', node=down))
+        outbox.release([head], 'test')
+        queued = [outbox.enqueue_execute(down, head.task_id, None) for _ in range(3)]
+        outbox.release(queued, '前一条命令未完成')
+        command = outbox.enqueue_deploy(self.task)
+        outbox.release([command], 'test')
+        # 队首仍在退避中，后面排队的命令已经到期
+        NodeCommand.objects.exclude(id=head.id).update(next_attempt_at=timezone.now())
+
+        claimed = outbox.claim_batch(2)
+
+        self.assertEqual([c.id for c in claimed], [command.id])
+
+    def test_stop_supersedes_pending_deploy(self):
+        deploy = outbox.enqueue_deploy(self.task)
+        outbox.release([deploy], 'test')
+
+        stop = outbox.enqueue_stop(self.node, self.task.id)
+
+        deploy.refresh_from_db()
+        self.assertEqual(deploy.status, 'cancelled')
+        self.assertEqual(outbox.deliver([stop]), {stop.id: None})
+
+    def test_expired_lease_leaves_command_to_dispatcher(self):
+        command = outbox.enqueue_stop(self.node, self.task.id)
+        # 租约即将到期，期间被分发器重新领取
+        command.next_attempt_at = timezone.now()
+        NodeCommand.objects.filter(id=command.id).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=outbox.lease_seconds())
+        )
+
+        self.assertFalse(outbox.run_command(command))
+
+        self.assertEqual(self.fake.state.requests, 0)
+        command.refresh_from_db()
+        self.assertEqual((command.status, command.step), ('running', 0))
+
+    def test_lease_is_renewed_before_step(self):
+        command = outbox.enqueue_stop(self.node, self.task.id)
+        NodeCommand.objects.filter(id=command.id).update(next_attempt_at=timezone.now())
+        command.refresh_from_db()
+
+        self.assertTrue(outbox.run_command(command))
+
+        command.refresh_from_db()
+        self.assertEqual(command.status, 'done')
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from rest_framework.test import APIClient
+
+from ecron_backend import profiling
+from tasks.models import Task
+from tasks.tests.helpers import EcronTestCase
+
+
+class SlowRequestTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(PROFILE_DIR=directory.name, PROFILE_SLOW_MS=30,
+                                      PROFILE_SAMPLE_AFTER_MS=0, PROFILE_SAMPLE_INTERVAL_MS=1, OPS_TOKEN='secret')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def handle(self, delay):
+        def view(request):
+            Task.objects.count()
+            profiling.record_node_call('get', 'http://node/health', time.perf_counter(), status=200)
+            time.sleep(delay)
+            return HttpResponse('ok')
+
+        middleware = profiling.SlowRequestProfilerMiddleware(view)
+        return middleware(RequestFactory().get('/slow/?x=1'))
+
+    def test_saves_slow_request(self):
+        self.handle(0)
+        self.assertEqual(profiling.list_profiles(), [])
+
+        self.handle(0.1)
+
+        [summary] = profiling.list_profiles()
+        self.assertEqual((summary['path'], summary['status_code']), ('/slow/?x=1', 200))
+        self.assertGreaterEqual(summary['duration_ms'], 100)
+        self.assertEqual((summary['queries'], summary['node_calls']), (1, 1))
+        self.assertGreater(summary['samples'], 0)
+
+        data = profiling.load(summary['name'])
+        self.assertIn('FROM "tasks_task"', data['queries'][0]['sql'])
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in profiling.folded(data).splitlines()))
+
+    def test_api(self):
+        self.handle(0.05)
+        client = APIClient()
+        [summary] = client.get('/api/ops/profiles/', HTTP_X_OPS_TOKEN='secret').json()['profiles']
+
+        response = client.get(f'/api/ops/profiles/{summary["name"]}/?fmt=folded', HTTP_X_OPS_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Disposition'].endswith('.folded"'))
+        # 不带结尾斜杠
+        response = client.get(f'/api/ops/profiles/{summary["name"]}', HTTP_X_OPS_TOKEN='secret')
+        self.assertEqual(response.json()['name'], summary['name'])
+
+        self.assertEqual(client.get('/api/ops/profiles/').status_code, 403)
+        self.assertEqual(client.get('/api/ops/profiles/missing.json', HTTP_X_OPS_TOKEN='secret').status_code, 404)
+        self.assertIsNone(profiling.load('../settings.json'))
+
+    @override_settings(PROFILE_MAX_FILES=1)
+    def test_prune_keeps_newest(self):
+        for name in ('20240101-000000-1-1-50ms.json', '20240102-000000-1-1-50ms.json'):
+            with open(os.path.join(settings.PROFILE_DIR, name), 'w') as f:
+                f.write('{}')
+
+        profiling._prune()
+
+        self.assertEqual(profiling._profile_names(), ['20240102-000000-1-1-50ms.json'])
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from tasks import outbox, reaper
+from tasks.models import Job, NodeCommand
+from tasks.tests.helpers import EcronTestCase, make_node, make_task, start_fake_node
+
+
+class ReapTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake = start_fake_node(self)
+        self.node = make_node(fake=self.fake)
+
+    def make_job(self, task, age):
+        job = Job.objects.create(task=task, status='running')
+        Job.objects.filter(id=job.id).update(start_time=timezone.now() - timedelta(seconds=age))
+        return job
+
+    def test_marks_overdue_jobs(self):
+        task = make_task(node=self.node, timeout_seconds=60)
+        overdue = self.make_job(task, 120)
+        recent = self.make_job(task, 10)
+
+        self.assertEqual(reaper.reap(batch_size=1), 1)
+
+        overdue.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((overdue.status, recent.status), ('timeout', 'running'))
+        task.refresh_from_db()
+        self.assertEqual(task.last_job_status, 'timeout')
+        self.assertEqual(reaper.reap(), 0)
+
+    def test_stop_restarts_active_tasks(self):
+        active = make_task('active', node=self.node, timeout_seconds=60)
+        paused = make_task('paused', node=self.node, timeout_seconds=60, status='paused')
+        for task in (active, paused):
+            self.fake.state.tasks[task.id] = {'task_id': task.id}
+            self.fake.state.running.add(task.id)
+            self.make_job(task, 120)
+
+        self.assertEqual(reaper.reap(stop=True), 2)
+
+        steps = dict(NodeCommand.objects.values_list('task_id', 'steps'))
+        self.assertEqual(steps[active.id], [{'op': 'stop'}, {'op': 'start'}])
+        self.assertEqual(steps[paused.id], [{'op': 'stop'}])
+        # active 的任务仍在节点上调度
+        self.assertEqual(self.fake.state.running, {active.id})
+
+    def test_restart_queues_behind_pending_deploy(self):
+        task = make_task(node=self.node, timeout_seconds=60)
+        # 节点不可达时修改的任务定义，下发命令在退避中
+        deploy = outbox.enqueue_deploy(task)
+        outbox.release([deploy], '无法连接到节点')
+        self.make_job(task, 120)
+
+        self.assertEqual(reaper.reap(stop=True), 1)
+
+        deploy.refresh_from_db()
+        self.assertEqual(deploy.status, 'pending')
+        restart = NodeCommand.objects.get(action='stop')
+        self.assertEqual((restart.status, restart.last_error), ('pending', '前一条命令未完成'))
+        self.assertEqual(self.fake.state.tasks, {})
+
+        for command in (deploy, restart):
+            NodeCommand.objects.filter(id=command.id).update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.dispatch_pending(), 1)
+            command.refresh_from_db()
+            self.assertEqual(command.status, 'done')
+        self.assertIn(task.id, self.fake.state.tasks)
+        self.assertEqual(self.fake.state.running, {task.id})
@@ -0,0 +1,47 @@
+from unittest import mock
+
+from rest_framework.test import APIClient
+
+from tasks.models import NodeCommand
+from tasks.node_client import NodeClient, NodeResult
+from tasks.tests.helpers import EcronTestCase, make_node, make_task, start_fake_node
+
+
+class RedeployTasksTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.fake = start_fake_node(self)
+        self.node = make_node(fake=self.fake)
+
+    def test_partial_failure(self):
+        ok = make_task('ok', node=self.node)
+        broken = make_task('broken', node=self.node)
+        paused = make_task('paused', node=self.node, status='paused')
+        start_task = NodeClient.start_task
+
+        def fail_broken(client, task_id, **kwargs):
+            if task_id == broken.id:
+                return NodeResult(False, error='start failed')
+            return start_task(client, task_id, **kwargs)
+
+        with mock.patch.object(NodeClient, 'start_task', fail_broken):
+            response = self.client.post(f'/api/nodes/{self.node.id}/redeploy_tasks/')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'partial_success')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['failed'], {str(broken.id): 'start failed'})
+        self.assertEqual(self.fake.state.running, {ok.id})
+        self.assertEqual(set(self.fake.state.tasks), {ok.id, broken.id, paused.id})
+        command = NodeCommand.objects.get(task_id=broken.id)
+        self.assertEqual((command.status, command.attempts), ('pending', 1))
+
+    def test_inactive_node(self):
+        self.node.status = 'inactive'
+        self.node.save()
+
+        response = self.client.post(f'/api/nodes/{self.node.id}/redeploy_tasks/')
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from rest_framework.test import APIClient
+
+from ecron_backend import db_router
+from tasks.tests.helpers import EcronTestCase, make_node
+
+
+class ReplicaReadTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.node = make_node()
+        patcher = mock.patch.object(db_router, 'read_from_replica')
+        self.read_from_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def replica_reads(self, url, **headers):
+        self.read_from_replica.reset_mock()
+        self.assertEqual(self.client.get(url, **headers).status_code, 200)
+        # ReplicaMiddleware 每个请求开始时调用 read_from_replica(False)
+        return mock.call() in self.read_from_replica.call_args_list
+
+    def test_node_read_actions(self):
+        self.assertTrue(self.replica_reads('/api/nodes/summary/'))
+        self.assertTrue(self.replica_reads(f'/api/nodes/{self.node.id}/tasks/'))
+        self.assertTrue(self.replica_reads(f'/api/nodes/{self.node.id}/metrics/'))
+        # 列表和详情会被缓存，读主库
+        self.assertFalse(self.replica_reads('/api/nodes/'))
+        self.assertFalse(self.replica_reads(f'/api/nodes/{self.node.id}/'))
+
+    def test_primary_header_and_cookie(self):
+        self.assertFalse(self.replica_reads('/api/nodes/summary/', HTTP_X_READ_PRIMARY='1'))
+
+        self.client.cookies[db_router.STICKY_COOKIE] = '1'
+        self.assertFalse(self.replica_reads('/api/nodes/summary/'))
@@ -0,0 +1,60 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from tasks import search
+from tasks.models import SearchIndexEntry, Task
+from tasks.tests.helpers import EcronTestCase, make_node, make_task
+
+
+class TokenizeTests(EcronTestCase):
+    def test_splits_on_separators(self):
+        self.assertEqual(search.tokenize('backup_db.sh --Full'), {'backup', 'db', 'sh', 'full'})
+
+    def test_chinese_bigrams(self):
+        self.assertEqual(search.tokenize('数据备份'), {'数据', '据备', '备份'})
+
+
+class TaskSearchTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.node = make_node()
+        self.active = make_task('nightly backup', command='/opt/backup_db.sh', node=self.node)
+        self.paused = make_task('weekly backup', status='paused')
+        self.draft = make_task('backup draft', status='draft')
+        self.deleted = make_task('old backup', status='deleted')
+        self.other = make_task('report', command='python report.py')
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['name'] for row in response.json()['results'])
+
+    def test_matches_all_terms(self):
+        response = self.client.get('/api/tasks/search/?q=backup db')
+        self.assertEqual(self.names(response), ['nightly backup'])
+
+    def test_facets(self):
+        response = self.client.get('/api/tasks/search/?q=backup&command_type=shell')
+
+        self.assertEqual(self.names(response), ['backup draft', 'nightly backup', 'weekly backup'])
+        # 不包含软删除的任务
+        statuses = {row['value']: row['count'] for row in response.json()['facets']['status']}
+        self.assertEqual(statuses, {'active': 1, 'paused': 1, 'draft': 1})
+        nodes = {row['value']: row['count'] for row in response.json()['facets']['node']}
+        self.assertEqual(nodes, {self.node.id: 1, None: 2})
+
+    def test_no_terms(self):
+        self.assertEqual(self.names(self.client.get('/api/tasks/search/?q=__')), [])
+
+    def test_unchanged_text_is_not_reindexed(self):
+        task = Task.objects.get(id=self.active.id)
+        task.status = 'paused'
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+        self.assertFalse(any(SearchIndexEntry._meta.db_table in q['sql'] for q in queries))
+
+        task.command = '/opt/archive.sh'
+        task.save()
+        self.assertEqual(self.names(self.client.get('/api/tasks/search/?q=archive')), ['nightly backup'])
+        self.assertEqual(self.names(self.client.get('/api/tasks/search/?q=backup db')), [])
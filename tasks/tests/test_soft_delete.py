@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks import purge
+from tasks.models import ChangeTombstone, Job, Task
+from tasks.tests.helpers import EcronTestCase, make_node, make_task
+
+
+class SoftDeleteTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.active = make_task('active')
+        self.deleted = make_task('deleted', status='deleted')
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['name'] for row in response.json()['results'])
+
+    def test_default_manager_hides_deleted(self):
+        self.assertEqual(list(Task.objects.values_list('name', flat=True)), ['active'])
+        self.assertEqual(Task.all_objects.count(), 2)
+
+    def test_list_and_detail(self):
+        self.assertEqual(self.names(self.client.get('/api/tasks/')), ['active'])
+        self.assertEqual(self.names(self.client.get('/api/tasks/?status=deleted')), ['deleted'])
+        self.assertEqual(self.client.get(f'/api/tasks/{self.deleted.id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/tasks/{self.deleted.id}/?status=deleted').status_code, 200)
+
+
+class StatusFilterTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.node = make_node()
+        self.active = make_task('nightly backup', command='/opt/backup_db.sh', node=self.node)
+        self.paused = make_task('weekly backup', status='paused')
+        self.draft = make_task('backup draft', status='draft')
+        self.deleted = make_task('old backup', status='deleted')
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['name'] for row in response.json()['results'])
+
+    def test_comma_separated_status(self):
+        response = self.client.get('/api/tasks/search/?q=backup&status=active,paused')
+
+        self.assertEqual(self.names(response), ['nightly backup', 'weekly backup'])
+        # 状态分面不应用自身的过滤条件，也不包含软删除的任务
+        facets = {row['value']: row['count'] for row in response.json()['facets']['status']}
+        self.assertEqual(facets, {'active': 1, 'paused': 1, 'draft': 1})
+        nodes = {row['value']: row['count'] for row in response.json()['facets']['node']}
+        self.assertEqual(nodes, {self.node.id: 1, None: 1})
+
+    def test_status_includes_deleted(self):
+        response = self.client.get('/api/tasks/search/?q=backup&status=deleted,draft')
+        self.assertEqual(self.names(response), ['backup draft', 'old backup'])
+
+    def test_list_comma_separated_status(self):
+        response = self.client.get(f'/api/tasks/?status=active,paused&node={self.node.id}')
+        self.assertEqual(self.names(response), ['nightly backup'])
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get('/api/tasks/search/?q=backup&status=active,bogus').status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/?status=bogus').status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/?node=x').status_code, 400)
+
+
+class PurgeTests(EcronTestCase):
+    def make_deleted(self, name, jobs=0, days=40):
+        task = make_task(name, status='deleted')
+        for _ in range(jobs):
+            Job.objects.create(task=task, status='success')
+        Task.all_objects.filter(id=task.id).update(updated_at=timezone.now() - timedelta(days=days))
+        return task
+
+    def test_purges_expired_tasks_and_jobs(self):
+        old = self.make_deleted('old', jobs=5)
+        recent = self.make_deleted('recent', jobs=1, days=1)
+        active = make_task('active')
+        Job.objects.create(task=active, status='success')
+
+        self.assertEqual(purge.purge(days=30, batch_size=2), (1, 5))
+
+        self.assertEqual(
+            sorted(Task.all_objects.values_list('name', flat=True)), ['active', 'recent']
+        )
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertTrue(ChangeTombstone.objects.filter(kind='task', object_id=old.id).exists())
+        self.assertTrue(Job.objects.filter(task=recent).exists())
+        self.assertEqual(purge.purge(days=30), (0, 0))
+
+    def test_restore_during_purge_keeps_task(self):
+        task = self.make_deleted('restored', jobs=5)
+
+        def restore(**kwargs):
+            # 清理删除第一批执行记录时任务被恢复
+            post_delete.disconnect(restore, sender=Job)
+            Task.all_objects.filter(id=task.id).update(status='active', updated_at=timezone.now())
+
+        post_delete.connect(restore, sender=Job)
+        self.addCleanup(post_delete.disconnect, restore, sender=Job)
+
+        self.assertEqual(purge.purge(days=30, batch_size=2), (0, 2))
+
+        self.assertTrue(Task.objects.filter(id=task.id).exists())
+        self.assertEqual(Job.objects.filter(task=task).count(), 3)
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from tasks import throttling
+from tasks.tests.helpers import EcronTestCase
+
+RATES = dict(settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], read='2/min', heartbeat='1/min',
+             heartbeat_client='3/min')
+
+
+class BucketTests(EcronTestCase):
+    def test_memory_bucket(self):
+        store = throttling.MemoryBucketStore()
+        self.assertEqual(store.consume('k', 2, 1), 0)
+        self.assertEqual(store.consume('k', 2, 1), 0)
+        wait = store.consume('k', 2, 1)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 1)
+        self.assertEqual(store.consume('other', 2, 1), 0)
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate('100/s'), (100, 100))
+        self.assertEqual(throttling.parse_rate('30/min'), (30, 0.5))
+        self.assertIsNone(throttling.parse_rate(None))
+
+
+@override_settings(
+    THROTTLE_ENABLED=True,
+    THROTTLE_STORE='memory',
+    REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=RATES),
+)
+class ThrottleTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        throttling._store = None
+        self.addCleanup(setattr, throttling, '_store', None)
+
+    def test_read_limit(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/nodes/').status_code, 200)
+
+        response = self.client.get('/api/nodes/')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def heartbeat(self, name, address='10.0.0.9'):
+        return self.client.post('/api/nodes/heartbeat/', {
+            'name': name, 'host': '10.0.0.1', 'port': 5001,
+        }, format='json', REMOTE_ADDR=address).status_code
+
+    def test_heartbeat_per_node(self):
+        heartbeat = self.heartbeat
+        self.assertEqual(heartbeat('a'), 200)
+        self.assertEqual(heartbeat('a'), 429)
+        # 同一地址上的其他节点单独计数
+        self.assertEqual(heartbeat('b'), 200)
+
+    def test_heartbeat_per_client(self):
+        for name in ('a', 'b', 'c'):
+            self.assertEqual(self.heartbeat(name), 200)
+
+        # 不断更换节点名称也会被按地址限制
+        self.assertEqual(self.heartbeat('d'), 429)
+        self.assertEqual(self.heartbeat('d', address='10.0.0.10'), 200)
@@ -0,0 +1,74 @@
+from rest_framework.test import APIClient
+
+from tasks import transfer
+from tasks.models import Task, TaskDependency
+from tasks.tests.helpers import EcronTestCase, make_node, make_task, start_fake_node
+
+
+def definition(name, **fields):
+    return dict({'name': name, 'cron_expression': '* * * * *', 'command': 'echo hello',
+                 'command_type': 'shell', 'status': 'active'}, **fields)
+
+
+class ImportTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake = start_fake_node(self)
+        self.node = make_node('target', fake=self.fake)
+        self.data = {
+            'version': transfer.FORMAT_VERSION,
+            'tasks': [definition('a', node='source'), definition('b', node='source', status='paused')],
+            'dependencies': [{'upstream': 'a', 'downstream': 'b', 'trigger': 'success'}],
+        }
+
+    def test_dry_run_writes_nothing(self):
+        report = transfer.import_definitions(self.data, node_map={'source': 'target'}, dry_run=True)
+
+        self.assertEqual(report['created'], ['a', 'b'])
+        self.assertEqual(report['dependencies']['created'], 1)
+        self.assertFalse(Task.objects.exists())
+
+    def test_import_and_deploy(self):
+        report = transfer.import_definitions(self.data, node_map={'source': 'target'})
+
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['deploy'], {'queued': False, 'failed': {}})
+        tasks = dict(Task.objects.values_list('name', 'id'))
+        self.assertTrue(TaskDependency.objects.filter(upstream_id=tasks['a'], downstream_id=tasks['b']).exists())
+        # 暂停的任务只上传不启动
+        self.assertEqual(set(self.fake.state.tasks), set(tasks.values()))
+        self.assertEqual(self.fake.state.running, {tasks['a']})
+
+        self.data['tasks'][0]['cron_expression'] = '*/5 * * * *'
+        report = transfer.import_definitions(self.data, node_map={'source': 'target'})
+
+        self.assertEqual(report['updated'], {'a': {'cron_expression': ['* * * * *', '*/5 * * * *']}})
+        self.assertEqual((report['unchanged'], report['dependencies']['unchanged']), (1, 1))
+        self.assertEqual(self.fake.state.tasks[tasks['a']]['cron_expression'], '*/5 * * * *')
+
+    def test_export_round_trip(self):
+        upstream = make_task('upstream', node=self.node, status='paused')
+        downstream = make_task('downstream')
+        TaskDependency.objects.create(upstream=upstream, downstream=downstream, trigger='failed')
+        make_task('gone', status='deleted')
+
+        data = transfer.export_definitions()
+
+        self.assertEqual([task['name'] for task in data['tasks']], ['upstream', 'downstream'])
+        self.assertEqual(data['tasks'][0]['node'], 'target')
+        report = transfer.import_definitions(data, dry_run=True)
+        self.assertEqual((report['created'], report['updated'], report['unchanged']), ([], {}, 2))
+        self.assertEqual(report['dependencies']['unchanged'], 1)
+
+    def test_errors_write_nothing(self):
+        self.data['dependencies'] += [
+            {'upstream': 'b', 'downstream': 'a'},
+            {'upstream': 'a', 'downstream': 'missing'},
+        ]
+
+        response = APIClient().post('/api/tasks/definitions/', self.data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()['errors']), ['依赖中的任务不存在: missing', '依赖关系会形成环'])
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(response.json()['warnings'], ['节点不存在: source，相关任务导入后不分配节点'])
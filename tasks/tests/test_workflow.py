@@ -0,0 +1,112 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+
+from tasks import outbox, workflow
+from tasks.models import Job, TaskDependency
+from tasks.tests.helpers import EcronTestCase, make_node, make_task, start_fake_node
+
+
+def finish(job, status='success'):
+    job.status = status
+    job.end_time = timezone.now()
+    job.save()
+
+
+class FanInTests(EcronTestCase):
+    def setUp(self):
+        super().setUp()
+        node = make_node()
+        self.first = make_task('first', node=node)
+        self.second = make_task('second', node=node)
+        self.join = make_task('join', node=node)
+        TaskDependency.objects.create(upstream=self.first, downstream=self.join)
+        TaskDependency.objects.create(upstream=self.second, downstream=self.join)
+
+    def jobs_of(self, task):
+        return Job.objects.filter(task=task)
+
+    def test_first_run_waits_for_all_upstreams(self):
+        # 上一轮之前单独执行过的上游结果不属于这一轮
+        old = Job.objects.create(task=self.second, status='running')
+        finish(old)
+        Job.objects.filter(id=old.id).update(
+            start_time=timezone.now() - timedelta(days=1), end_time=timezone.now() - timedelta(days=1)
+        )
+
+        jobs = {job.task_id: job for job in workflow.run_pipeline(self.join.id)}
+        self.assertEqual(set(jobs), {self.first.id, self.second.id})
+        run_started = jobs[self.first.id].run_started_at
+        self.assertEqual(jobs[self.second.id].run_started_at, run_started)
+
+        finish(jobs[self.first.id])
+        self.assertFalse(self.jobs_of(self.join).exists())
+
+        finish(jobs[self.second.id])
+        triggered = self.jobs_of(self.join).get()
+        self.assertEqual(triggered.status, 'running')
+        self.assertEqual(triggered.run_started_at, run_started)
+
+    def test_triggers_once_per_run(self):
+        for _ in range(2):
+            jobs = workflow.run_pipeline(self.first.id)
+            for job in jobs:
+                finish(job)
+            # 同一上游再次回报完成不会重复触发
+            finish(Job.objects.create(task=self.first, status='running'))
+        self.assertEqual(self.jobs_of(self.join).count(), 2)
+
+    def test_trigger_condition(self):
+        edge = TaskDependency.objects.get(upstream=self.second)
+        edge.trigger = 'failed'
+        edge.save()
+        jobs = {job.task_id: job for job in workflow.run_pipeline(self.join.id)}
+
+        finish(jobs[self.first.id])
+        finish(jobs[self.second.id], 'timeout')
+
+        self.assertEqual(self.jobs_of(self.join).count(), 1)
+
+    def test_inactive_downstream_is_skipped(self):
+        self.join.status = 'paused'
+        self.join.save()
+        for job in workflow.run_pipeline(self.join.id):
+            finish(job)
+        self.assertFalse(self.jobs_of(self.join).exists())
+
+
+class FanOutTests(EcronTestCase):
+    def test_downstreams_delivered_by_node(self):
+        upstream = make_task('upstream', node=make_node('up'))
+        fakes = []
+        for name in ('left', 'right'):
+            fake = start_fake_node(self)
+            task = make_task(name, node=make_node(name, fake=fake))
+            fake.state.tasks[task.id] = {'task_id': task.id}
+            TaskDependency.objects.create(upstream=upstream, downstream=task)
+            fakes.append(fake)
+
+        job = Job.objects.create(task=upstream, status='running')
+        with mock.patch.object(outbox, 'deliver_by_node', wraps=outbox.deliver_by_node) as deliver, \
+                self.captureOnCommitCallbacks(execute=True):
+            finish(job)
+
+        deliver.assert_called_once()
+        self.assertEqual(len(deliver.call_args.args[0]), 2)
+        self.assertEqual([fake.state.executions for fake in fakes], [1, 1])
+
+
+class PipelineTests(EcronTestCase):
+    def test_levels_and_cycles(self):
+        a, b, c = (make_task(name) for name in 'abc')
+        TaskDependency.objects.create(upstream=a, downstream=b)
+        TaskDependency.objects.create(upstream=b, downstream=c)
+
+        levels, edges = workflow.pipeline(c.id)
+
+        self.assertEqual(levels, {a.id: 0, b.id: 1, c.id: 2})
+        self.assertEqual(len(edges), 2)
+        self.assertTrue(workflow.creates_cycle(c.id, a.id))
+        self.assertTrue(workflow.creates_cycle(a.id, a.id))
+        self.assertFalse(workflow.creates_cycle(a.id, c.id))
@@ -0,0 +1,181 @@
+"""
+令牌桶限流
+
+每个客户端（IP，经过代理时取 X-Forwarded-For，见 DRF 的 NUM_PROXIES）在每类接口上各有一个令牌桶，
+速率按 DRF 的格式配置在 REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']，例如 '100/s' 表示桶容量 100、
+每秒补充 100 个令牌（允许短时突发到 100 个请求）：
+
+- read / write：GET 等只读请求和写请求；
+- 视图或 action 通过 throttle_scope 指定其他类别（例如 export）；
+- heartbeat：心跳按节点名称单独计数，多个节点在同一台机器（同一 IP）上也互不影响；
+  同时按客户端计入 heartbeat_client，不断更换节点名称的请求同样会被限制。
+
+超限时返回 429，Retry-After 为拿到下一个令牌需要等待的秒数。
+令牌桶保存在 THROTTLE_STORE 中：memory 为进程内（每个 worker 单独计数，判断只需几微秒），
+redis 为多个 worker / 实例共享（一次 Lua 脚本调用），Redis 不可用时放行请求。
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+logger = logging.getLogger('backend')
+
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'100/min' -> (容量, 每秒补充的令牌数)；未配置时返回 None"""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / _PERIODS[period.strip()[0]]
+
+
+class MemoryBucketStore:
+    """进程内令牌桶"""
+
+    # 桶数量超过该值时清理 1 小时未使用的桶
+    max_buckets = 100000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        """取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                self._prune(now)
+        return 0 if allowed else (1 - tokens) / rate
+
+    def _prune(self, now):
+        # 空闲到已经回满的桶与新桶等价，可以直接丢弃；这里不知道各桶的速率，按 1 小时处理
+        self._buckets = {
+            key: value for key, value in self._buckets.items() if now - value[1] < 3600
+        }
+
+
+# KEYS[1] 桶，ARGV 容量、每秒令牌数；使用 Redis 的时间，避免各实例时钟不一致
+_REDIS_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Redis 中的令牌桶，所有 worker 共享"""
+
+    def __init__(self, url):
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._script = self._client.register_script(_REDIS_SCRIPT)
+        self._last_error = 0
+
+    def consume(self, key, capacity, rate):
+        try:
+            return float(self._script(keys=[key], args=[capacity, rate]))
+        except redis.RedisError as e:
+            now = time.monotonic()
+            if now - self._last_error > 60:
+                self._last_error = now
+                logger.warning('限流存储不可用，暂时不限流: %s', e)
+            return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.THROTTLE_STORE == 'redis' and redis is None:
+                    logger.warning('未安装 redis，限流改用进程内存储')
+                if settings.THROTTLE_STORE == 'redis' and redis is not None:
+                    _store = RedisBucketStore(settings.THROTTLE_REDIS_URL)
+                else:
+                    _store = MemoryBucketStore()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """按 客户端 + 接口类别 限流"""
+
+    def __init__(self):
+        self._wait = 0
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        scope = self.get_scope(request, view)
+        return self.consume(scope, self.get_key(request, view))
+
+    def consume(self, scope, key):
+        rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope))
+        if rate is None:
+            return True
+        self._wait = get_store().consume(f'throttle:{scope}:{key}', *rate)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class HeartbeatThrottle(TokenBucketThrottle):
+    """心跳先按客户端限制总量，再按节点名称限流"""
+
+    def allow_request(self, request, view):
+        if settings.THROTTLE_ENABLED and not self.consume('heartbeat_client', self.get_ident(request)):
+            return False
+        return super().allow_request(request, view)
+
+    def get_scope(self, request, view):
+        return 'heartbeat'
+
+    def get_key(self, request, view):
+        name = request.data.get('name') if hasattr(request.data, 'get') else None
+        return f'node:{name}' if name else self.get_ident(request)
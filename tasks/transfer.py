@@ -0,0 +1,359 @@
+"""
+任务定义的批量导出 / 导入，用于在环境之间迁移整套调度
+
+导出格式（JSON）：
+
+    {"version": 1,
+     "tasks": [{"name": ..., "cron_expression": ..., ..., "node": "节点名称"}],
+     "dependencies": [{"upstream": "任务名称", "downstream": "任务名称", "trigger": "success"}]}
+
+导入时按名称匹配目标环境中未删除的任务：不存在的新建，存在的只更新有变化的字段；
+节点按名称匹配，可通过 node_map 把源环境的节点名称映射为目标环境的节点名称。
+
+- 先校验全部数据并计算差异（新建 / 更新的字段 / 未变化），有错误时不写入任何数据，
+  dry_run 时只返回差异；
+- 写入在一个事务中完成：变更序号一次分配、任务 bulk_create / bulk_update、
+  依赖 bulk_create（已存在的边按冲突处理更新触发条件），不逐个经过 save 信号，
+  缓存失效和搜索索引在这里批量补做；
+- 需要下发的命令与数据在同一事务中批量写入 outbox，提交后按节点并发执行
+  （每个节点分批并发，每批的上传合并为一次 /tasks/batch 请求），不在导入中逐个做健康检查和重试。
+"""
+
+import logging
+from collections import defaultdict, deque
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache, outbox, search
+from .models import ChangeSequence, Node, Task, TaskDependency
+from .node_client import DEPLOY_FIELDS
+
+logger = logging.getLogger('backend')
+
+FORMAT_VERSION = 1
+
+# 导出 / 导入的任务字段（不含 name 和 node）
+FIELDS = ('description', 'cron_expression', 'command', 'command_type', 'requirements', 'status',
+          'skip_if_running', 'coalesce_seconds', 'timeout_seconds')
+
+TRIGGERS = tuple(value for value, _ in TaskDependency._meta.get_field('trigger').choices)
+
+BATCH_SIZE = 1000
+
+
+def export_definitions(queryset=None):
+    """导出未删除的任务及它们之间的依赖"""
+    queryset = Task.objects.all() if queryset is None else queryset
+    rows = queryset.exclude(status='deleted').order_by('id').values('id', 'name', 'node__name', *FIELDS)
+    names = {}
+    tasks = []
+    for row in rows.iterator(chunk_size=2000):
+        names[row['id']] = row['name']
+        tasks.append({
+            'name': row['name'],
+            **{field: row[field] for field in FIELDS},
+            'node': row['node__name'],
+        })
+    dependencies = [
+        {'upstream': names[upstream], 'downstream': names[downstream], 'trigger': trigger}
+        for upstream, downstream, trigger in TaskDependency.objects.order_by('id').values_list(
+            'upstream_id', 'downstream_id', 'trigger'
+        ).iterator(chunk_size=2000)
+        if upstream in names and downstream in names
+    ]
+    return {
+        'version': FORMAT_VERSION,
+        'exported_at': timezone.now().isoformat(),
+        'tasks': tasks,
+        'dependencies': dependencies,
+    }
+
+
+def _clean_tasks(items, errors):
+    """校验任务定义，返回 {name: 字段值}，字段缺省时使用模型默认值"""
+    fields = {name: Task._meta.get_field(name) for name in ('name', *FIELDS)}
+    cleaned = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(f'tasks[{index}]: 不是对象')
+            continue
+        values = {}
+        for name, field in fields.items():
+            value = item[name] if name in item else field.get_default()
+            try:
+                values[name] = field.clean(value, None)
+            except ValidationError as e:
+                errors.append(f'tasks[{index}].{name}: {"; ".join(e.messages)}')
+        if 'name' not in values:
+            continue
+        if values.get('status') == 'deleted':
+            errors.append(f'tasks[{index}].status: 不能导入已删除的任务')
+        if values['name'] in cleaned:
+            errors.append(f'tasks[{index}].name: 任务名称重复: {values["name"]}')
+        node = item.get('node')
+        if node is not None and not isinstance(node, str):
+            errors.append(f'tasks[{index}].node: 应为节点名称')
+        values['node'] = node or None
+        cleaned[values['name']] = values
+    return cleaned
+
+
+def _clean_dependencies(items, errors):
+    edges = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('upstream') or not item.get('downstream'):
+            errors.append(f'dependencies[{index}]: 缺少 upstream / downstream')
+            continue
+        trigger = item.get('trigger', 'success')
+        if trigger not in TRIGGERS:
+            errors.append(f'dependencies[{index}].trigger: 未知的触发条件: {trigger}')
+            continue
+        edges[(item['upstream'], item['downstream'])] = trigger
+    return edges
+
+
+def _resolve_nodes(names, node_map, warnings):
+    """源环境节点名称 -> 目标环境的 Node，找不到的节点给出警告，任务不分配节点"""
+    targets = {name: node_map.get(name, name) for name in names}
+    nodes = {}
+    for node in Node.objects.filter(name__in=set(targets.values())).order_by('-id'):
+        nodes[node.name] = node
+    resolved = {}
+    for name, target in sorted(targets.items()):
+        resolved[name] = nodes.get(target)
+        if resolved[name] is None:
+            warnings.append(f'节点不存在: {target}，相关任务导入后不分配节点')
+    return resolved
+
+
+def _has_cycle(edges):
+    """edges 为 [(上游, 下游)]，拓扑排序判断是否有环"""
+    children = defaultdict(list)
+    indegree = defaultdict(int)
+    for source, target in edges:
+        children[source].append(target)
+        indegree[target] += 1
+        indegree.setdefault(source, 0)
+    queue = deque(node for node, degree in indegree.items() if not degree)
+    visited = 0
+    while queue:
+        current = queue.popleft()
+        visited += 1
+        for child in children[current]:
+            indegree[child] -= 1
+            if not indegree[child]:
+                queue.append(child)
+    return visited < len(indegree)
+
+
+def _display(field, value):
+    return value.name if field == 'node' and value is not None else value
+
+
+def _deploy_commands(task, old=None):
+    """
+    导入后需要写入 outbox 的命令（尚未保存）。old 为更新前的 (node, status, 下发字段)，
+    新建的任务为 None。草稿不下发，暂停的任务只上传不启动，与控制器对账的处理一致。
+    """
+    commands = []
+    node, status = task.node, task.status
+    deployable = status in ('active', 'paused')
+    if old is None:
+        if node and deployable:
+            commands.append(outbox.build(node, task.id, 'deploy', outbox.deploy_steps(task, status == 'active')))
+        return commands
+
+    old_node, old_status, old_fields = old
+    if old_node != node:
+        if old_node and old_status in ('active', 'paused'):
+            commands.append(outbox.build(old_node, task.id, 'remove', outbox.remove_steps()))
+        if node and deployable:
+            commands.append(outbox.build(node, task.id, 'deploy', outbox.deploy_steps(task, status == 'active')))
+        return commands
+
+    if not node or (status == old_status and [getattr(task, f) for f in DEPLOY_FIELDS] == old_fields):
+        return commands
+    if deployable:
+        steps = outbox.deploy_steps(task, status == 'active')
+        if status == 'paused' and old_status == 'active':
+            steps.append({'op': 'stop', 'optional': True})
+        commands.append(outbox.build(node, task.id, 'deploy', steps))
+    elif old_status in ('active', 'paused'):
+        commands.append(outbox.build(node, task.id, 'remove', outbox.remove_steps()))
+    return commands
+
+
+def import_definitions(data, node_map=None, dry_run=False, deploy=True):
+    """
+    导入 export_definitions 格式的数据，返回差异报告：
+    {'created': [名称], 'updated': {名称: {字段: [旧值, 新值]}}, 'unchanged': 数量,
+     'dependencies': {'created': n, 'updated': n, 'unchanged': n}, 'warnings': [...], 'errors': [...],
+     'commands': 写入的节点命令数, 'deploy': {'queued': bool, 'failed': {名称: 错误}} 或 None}
+    数据格式不正确时抛出 ValueError；有 errors 时不写入任何数据。
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('tasks'), list):
+        raise ValueError('导入数据格式不正确，缺少 tasks 列表')
+    if data.get('version', FORMAT_VERSION) != FORMAT_VERSION:
+        raise ValueError(f'不支持的导入格式版本: {data.get("version")}')
+    if not isinstance(data.get('dependencies') or [], list):
+        raise ValueError('dependencies 应为列表')
+    node_map = node_map or {}
+
+    report = {
+        'dry_run': dry_run,
+        'created': [],
+        'updated': {},
+        'unchanged': 0,
+        'dependencies': {'created': 0, 'updated': 0, 'unchanged': 0},
+        'warnings': [],
+        'errors': [],
+        'commands': 0,
+        'deploy': None,
+    }
+    errors = report['errors']
+    rows = _clean_tasks(data['tasks'], errors)
+    edges = _clean_dependencies(data.get('dependencies') or [], errors)
+    nodes = _resolve_nodes({row['node'] for row in rows.values() if row['node']}, node_map,
+                           report['warnings'])
+
+    with transaction.atomic():
+        existing = {}
+        for task in Task.objects.select_related('node').filter(name__in=list(rows)):
+            if task.name in existing:
+                errors.append(f'目标环境中存在多个同名任务: {task.name}')
+            existing[task.name] = task
+
+        # 计算差异
+        creates = []
+        updates = []
+        for name, row in rows.items():
+            row = dict(row, node=nodes.get(row['node']))
+            task = existing.get(name)
+            if task is None:
+                creates.append(row)
+                report['created'].append(name)
+                continue
+            changes = {
+                field: value for field, value in row.items()
+                if field != 'name' and getattr(task, field) != value
+            }
+            if changes:
+                updates.append((task, changes))
+                report['updated'][name] = {
+                    field: [_display(field, getattr(task, field)), _display(field, value)]
+                    for field, value in changes.items()
+                }
+            else:
+                report['unchanged'] += 1
+
+        # 依赖：文件中的名称需在文件或目标环境中存在，合并后的依赖图不能有环
+        referenced = {name for edge in edges for name in edge} - set(rows)
+        ids = dict(
+            Task.objects.filter(name__in=list(referenced)).values_list('name', 'id')
+        ) if referenced else {}
+        for name in sorted(referenced - set(ids)):
+            errors.append(f'依赖中的任务不存在: {name}')
+        ids.update({name: task.id for name, task in existing.items()})
+        current = {
+            (upstream, downstream): trigger for upstream, downstream, trigger in
+            TaskDependency.objects.values_list('upstream_id', 'downstream_id', 'trigger')
+        }
+        new_edges = {}
+        for (upstream, downstream), trigger in edges.items():
+            key = (ids.get(upstream, upstream), ids.get(downstream, downstream))
+            if key not in current:
+                report['dependencies']['created'] += 1
+                new_edges[(upstream, downstream)] = trigger
+            elif current[key] != trigger:
+                report['dependencies']['updated'] += 1
+                new_edges[(upstream, downstream)] = trigger
+            else:
+                report['dependencies']['unchanged'] += 1
+        graph = set(current) | {
+            (ids.get(upstream, upstream), ids.get(downstream, downstream)) for upstream, downstream in edges
+        }
+        if _has_cycle(graph):
+            errors.append('依赖关系会形成环')
+
+        if errors or dry_run:
+            return report
+
+        commands = _write(creates, updates, new_edges, ids, deploy)
+        report['commands'] = len(commands)
+
+    logger.info('批量导入任务: 新建 %s, 更新 %s, 未变化 %s, 依赖 %s, 节点命令 %s',
+                len(creates), len(updates), report['unchanged'], report['dependencies'], len(commands))
+    if commands:
+        results = outbox.deliver_by_node(commands)
+        if results is None:
+            report['deploy'] = {'queued': True, 'failed': {}}
+        else:
+            names = {task_id: name for name, task_id in ids.items()}
+            report['deploy'] = {
+                'queued': False,
+                'failed': {
+                    names.get(command.task_id, command.task_id): results[command.id]
+                    for command in commands if results.get(command.id)
+                },
+            }
+    return report
+
+
+def _write(creates, updates, edges, ids, deploy):
+    """在调用方的事务中写入任务、依赖和节点命令，返回写入的命令"""
+    now = timezone.now()
+    count = len(creates) + len(updates)
+    seq = ChangeSequence.reserve(count) if count else 0
+
+    created = [Task(change_seq=seq + i, **row) for i, row in enumerate(creates)]
+    Task.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    if created and created[0].pk is None:
+        # MySQL 的 bulk_create 不回填主键，按本次分配的变更序号取回
+        pks = dict(
+            Task.objects.filter(change_seq__gte=seq, change_seq__lt=seq + len(created))
+            .values_list('change_seq', 'id')
+        )
+        for task in created:
+            task.pk = pks[task.change_seq]
+    ids.update({task.name: task.id for task in created})
+
+    old = {}
+    fields = set()
+    for i, (task, changes) in enumerate(updates):
+        old[task.id] = (task.node, task.status, [getattr(task, f) for f in DEPLOY_FIELDS])
+        for field, value in changes.items():
+            setattr(task, field, value)
+        fields.update(changes)
+        task.change_seq = seq + len(created) + i
+        task.updated_at = now
+    updated = [task for task, _ in updates]
+    if updated:
+        Task.objects.bulk_update(updated, [*sorted(fields), 'change_seq', 'updated_at'],
+                                 batch_size=BATCH_SIZE)
+
+    if edges:
+        # 已存在的边（同一 upstream, downstream）按唯一约束冲突处理，只更新触发条件
+        options = {'update_conflicts': True, 'update_fields': ['trigger']}
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['upstream', 'downstream']
+        TaskDependency.objects.bulk_create([
+            TaskDependency(upstream_id=ids[upstream], downstream_id=ids[downstream], trigger=trigger)
+            for (upstream, downstream), trigger in edges.items()
+        ], batch_size=BATCH_SIZE, **options)
+
+    # 批量写入不触发 save 信号，这里补做
+    cache.invalidate('task')
+    if search.backend() == 'index':
+        search.index_objects('task', created + [
+            task for task, changes in updates if set(changes) & set(search.SEARCH_FIELDS['task'])
+        ])
+
+    commands = []
+    if deploy:
+        for task in created:
+            commands.extend(_deploy_commands(task))
+        for task in updated:
+            commands.extend(_deploy_commands(task, old[task.id]))
+    return outbox.enqueue_many(commands)
@@ -1,38 +1,111 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+import hmac
 import requests
-from .models import Task, Job, Node
-from .serializers import TaskSerializer, JobSerializer, NodeSerializer
-import time
+from django.db import transaction
+from .models import (Task, Job, Node, NodeCommand, ChangeSequence, ChangeTombstone, TaskDependency,
+                     ControllerInstance)
+from .serializers import (TaskSerializer, JobSerializer, JobExportSerializer, NodeSerializer,
+                          NodeCommandSerializer, TaskDependencySerializer)
+from .node_client import DEPLOY_FIELDS, NodeClient
+from . import controller, export, inventory, metrics, outbox, transfer, workflow
+from .cache import CachedResponseMixin
+from .fastpath import FastListMixin, get_values_spec
+from .search import SearchMixin
+from .idempotency import idempotent
+from .throttling import HeartbeatThrottle
 import logging
-import os
-
-# 配置日志
-log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
-logging.basicConfig(
-    level=getattr(logging, log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('backend.log', encoding='utf-8')
-    ]
-)
+from ecron_backend import dbstats, log, profiling
+from ecron_backend.db_router import ReplicaReadMixin
+
 logger = logging.getLogger('backend')
-logger.info(f"日志级别设置为: {log_level}")
 
-class TaskViewSet(viewsets.ModelViewSet):
+TASK_STATUSES = tuple(value for value, _ in Task._meta.get_field('status').choices)
+
+
+def _requested_statuses(params):
+    """?status= 中的任务状态（可逗号分隔），未知状态返回 400"""
+    value = params.get('status', '')
+    statuses = {item.strip() for item in value.split(',') if item.strip()}
+    unknown = statuses - set(TASK_STATUSES)
+    if unknown:
+        raise ParseError(f'未知的状态: {",".join(sorted(unknown))}')
+    return statuses
+
+
+def _task_queryset(statuses, filter_status=True):
+    # 默认不含软删除的任务，只有 ?status= 中明确包含 deleted 时才读取
+    queryset = Task.all_objects.all() if 'deleted' in statuses else Task.objects.all()
+    return queryset.filter(status__in=statuses) if statuses and filter_status else queryset
+
+class TaskViewSet(ReplicaReadMixin, CachedResponseMixin, FastListMixin, SearchMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+    cache_labels = ('task',)
+    # list/retrieve 的结果会按版本号缓存，从主库读取，避免把从库的旧数据缓存下来
+    replica_actions = ('search',)
+    search_kind = 'task'
+    search_facets = {'status': 'status', 'node': 'node', 'command_type': 'command_type'}
+    # 限流类别，definitions 单独设置，见 tasks/throttling.py
+    throttle_scope = None
+
+    def get_queryset(self):
+        return _task_queryset(_requested_statuses(self.request.query_params))
+
+    def get_search_queryset(self):
+        # ?status= 作为分面在 search 中过滤
+        return _task_queryset(_requested_statuses(self.request.query_params), filter_status=False)
+
+    def get_facet_filter(self, name, value):
+        if name == 'status':
+            return {'status__in': _requested_statuses(self.request.query_params)}
+        return super().get_facet_filter(name, value)
+
+    def filter_queryset(self, queryset):
+        """?status= 可逗号分隔（在 get_queryset 中过滤），?node= 为节点 ID，走 (status, node) 索引"""
+        queryset = super().filter_queryset(queryset)
+        node = self.request.query_params.get('node')
+        if node:
+            if not node.isdigit():
+                raise ParseError(f'节点ID必须是整数: {node}')
+            queryset = queryset.filter(node_id=int(node))
+        return queryset
+
+    def get_object(self):
+        task = super().get_object()
+        log.bind(task_id=task.id, node_id=task.node_id)
+        return task
+
+    def _find_duplicate_job(self, task):
+        """按任务的去重策略查找可以代替本次触发的执行记录，返回 (原因, job) 或 None"""
+        jobs = Job.objects.filter(task=task).order_by('-start_time')
+        if task.skip_if_running:
+            running = jobs.filter(status='running').first()
+            if running is not None:
+                return 'skipped', running
+        if task.coalesce_seconds > 0:
+            since = timezone.now() - timedelta(seconds=task.coalesce_seconds)
+            recent = jobs.filter(start_time__gte=since).exclude(status__in=('failed', 'timeout')).first()
+            if recent is not None:
+                return 'coalesced', recent
+        return None
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def execute(self, request, pk=None):
         task = self.get_object()
         
         # 检查任务状态
         if task.status != 'active':
-            logger.warning(f"尝试执行非活动任务: {task.id}")
+            logger.warning("尝试执行非活动任务: %s", task.id)
             return Response(
                 {'error': '任务未激活'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -40,47 +113,57 @@ class TaskViewSet(viewsets.ModelViewSet):
         
         # 检查节点状态
         if not task.node or task.node.status != 'active':
-            logger.warning(f"尝试在非活动节点上执行任务: {task.id}")
+            logger.warning("尝试在非活动节点上执行任务: %s", task.id)
             return Response(
                 {'error': '未分配活动节点'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 创建执行记录
-        job = Job.objects.create(
-            task=task,
-            status='running'
-        )
-        
-        logger.info(f"开始执行任务: {task.id}, 节点: {task.node.name}")
+        # 锁住任务行，同一任务的并发触发依次检查去重策略
+        with transaction.atomic():
+            Task.objects.select_for_update().filter(pk=task.pk).first()
+            duplicate = self._find_duplicate_job(task)
+            if duplicate is None:
+                # 创建执行记录
+                job = Job.objects.create(
+                    task=task,
+                    status='running'
+                )
+
+        if duplicate is not None:
+            reason, existing = duplicate
+            logger.info("忽略重复触发: %s, 原因: %s, job_id=%s", task.id, reason, existing.id)
+            return Response({
+                'status': reason,
+                'message': '任务正在运行，已跳过本次触发' if reason == 'skipped' else '已合并到最近的一次执行',
+                'job_id': existing.id
+            })
+
+        logger.info("开始执行任务: %s, 节点: %s", task.id, task.node.name)
         
         try:
-            # 直接调用执行节点的立即执行接口
-            response = requests.post(
-                f"http://{task.node.host}:{task.node.port}/tasks/{task.id}/execute",
-                timeout=10,
-                headers={'Content-Type': 'application/json; charset=utf-8'}
-            )
-            
-            # 确保响应内容使用UTF-8解码
-            response.encoding = 'utf-8'
+            # 直接调用执行节点的立即执行接口，job_id 供节点回报执行结果
+            response = NodeClient(task.node).request('post', f'/tasks/{task.id}/execute',
+                                                     json={'job_id': job.id})
             
             if response.status_code != 200:
                 error_msg = f'执行任务失败: {response.text}'
                 logger.error(error_msg)
                 raise ValueError(error_msg)
             
-            # 更新执行记录
-            job.status = 'success'
+            # 更新执行记录；有下游依赖时需要真正的完成结果，保持运行中等待节点回报
             job.result = '任务执行已启动'
-            job.end_time = timezone.now()
+            if not TaskDependency.objects.filter(upstream=task).exists():
+                job.status = 'success'
+                job.end_time = timezone.now()
             job.save()
             
-            logger.info(f"任务执行已启动: {task.id}")
+            logger.info("任务执行已启动: %s", task.id)
             
             return Response({
                 'status': 'success',
-                'message': '任务执行已启动'
+                'message': '任务执行已启动',
+                'job_id': job.id
             })
             
         except requests.exceptions.RequestException as e:
@@ -90,10 +173,10 @@ class TaskViewSet(viewsets.ModelViewSet):
             job.end_time = timezone.now()
             job.save()
             
-            logger.error(f"任务执行请求失败: {task.id}, 错误: {str(e)}")
+            logger.error("任务执行请求失败: %s, 错误: %s", task.id, e)
             
             return Response(
-                {'error': str(e)},
+                {'error': str(e), 'job_id': job.id},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         except ValueError as e:
@@ -103,37 +186,31 @@ class TaskViewSet(viewsets.ModelViewSet):
             job.end_time = timezone.now()
             job.save()
             
-            logger.error(f"任务执行值错误: {task.id}, 错误: {str(e)}")
+            logger.error("任务执行值错误: %s, 错误: %s", task.id, e)
             
             return Response(
-                {'error': str(e)},
+                {'error': str(e), 'job_id': job.id},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def pause(self, request, pk=None):
         task = self.get_object()
         
         # 检查节点状态
         if not task.node or task.node.status != 'active':
-            logger.warning(f"尝试在非活动节点上暂停任务: {task.id}")
+            logger.warning("尝试在非活动节点上暂停任务: %s", task.id)
             return Response(
                 {'error': '未分配活动节点'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        logger.info(f"开始暂停任务: {task.id}, 节点: {task.node.name}")
+        logger.info("开始暂停任务: %s, 节点: %s", task.id, task.node.name)
         
         try:
             # 停止任务
-            response = requests.post(
-                f"http://{task.node.host}:{task.node.port}/tasks/{task.id}/stop",
-                timeout=10,
-                headers={'Content-Type': 'application/json; charset=utf-8'}
-            )
-            
-            # 确保响应内容使用UTF-8解码
-            response.encoding = 'utf-8'
+            response = NodeClient(task.node).request('post', f'/tasks/{task.id}/stop')
             
             if response.status_code != 200:
                 error_msg = f'停止任务失败: {response.text}'
@@ -142,43 +219,37 @@ class TaskViewSet(viewsets.ModelViewSet):
             
             # 更新任务状态
             task.status = 'paused'
-            task.save()
+            task.save(update_fields=['status', 'updated_at'])
             
-            logger.info(f"任务已暂停: {task.id}")
+            logger.info("任务已暂停: %s", task.id)
             
             return Response({'status': 'success', 'message': '任务已暂停'})
             
         except (requests.exceptions.RequestException, ValueError) as e:
-            logger.error(f"暂停任务失败: {task.id}, 错误: {str(e)}")
+            logger.error("暂停任务失败: %s, 错误: %s", task.id, e)
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def resume(self, request, pk=None):
         task = self.get_object()
         
         # 检查节点状态
         if not task.node or task.node.status != 'active':
-            logger.warning(f"尝试在非活动节点上恢复任务: {task.id}")
+            logger.warning("尝试在非活动节点上恢复任务: %s", task.id)
             return Response(
                 {'error': '未分配活动节点'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        logger.info(f"开始恢复任务: {task.id}, 节点: {task.node.name}")
+        logger.info("开始恢复任务: %s, 节点: %s", task.id, task.node.name)
         
         try:
             # 启动任务
-            response = requests.post(
-                f"http://{task.node.host}:{task.node.port}/tasks/{task.id}/start",
-                timeout=10,
-                headers={'Content-Type': 'application/json; charset=utf-8'}
-            )
-            
-            # 确保响应内容使用UTF-8解码
-            response.encoding = 'utf-8'
+            response = NodeClient(task.node).request('post', f'/tasks/{task.id}/start')
             
             if response.status_code != 200:
                 error_msg = f'启动任务失败: {response.text}'
@@ -187,27 +258,28 @@ class TaskViewSet(viewsets.ModelViewSet):
             
             # 更新任务状态
             task.status = 'active'
-            task.save()
+            task.save(update_fields=['status', 'updated_at'])
             
-            logger.info(f"任务已恢复: {task.id}")
+            logger.info("任务已恢复: %s", task.id)
             
             return Response({'status': 'success', 'message': '任务已恢复'})
             
         except (requests.exceptions.RequestException, ValueError) as e:
-            logger.error(f"恢复任务失败: {task.id}, 错误: {str(e)}")
+            logger.error("恢复任务失败: %s, 错误: %s", task.id, e)
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def assign_node(self, request, pk=None):
         """分配执行节点"""
         task = self.get_object()
         node_id = request.data.get('node_id')
 
         if not node_id:
-            logger.warning(f"分配节点请求缺少节点ID: task_id={task.id}")
+            logger.warning("分配节点请求缺少节点ID: task_id=%s", task.id)
             return Response(
                 {'error': '节点ID是必填项'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -216,585 +288,316 @@ class TaskViewSet(viewsets.ModelViewSet):
         try:
             node = Node.objects.get(id=node_id)
             if node.status != 'active':
-                logger.warning(f"尝试分配非活动节点: task_id={task.id}, node_id={node_id}")
+                logger.warning("尝试分配非活动节点: task_id=%s, node_id=%s", task.id, node_id)
                 return Response(
                     {'error': '所选节点未激活'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
             # 检查节点健康状态
-            try:
-                logger.debug(f"检查节点健康状态: task_id={task.id}, node={node.name}")
-                health_response = requests.get(
-                    f"http://{node.host}:{node.port}/health",
-                    timeout=5
-                )
-                
-                if health_response.status_code != 200:
-                    error_msg = f'节点健康检查失败: {health_response.text}'
-                    logger.error(error_msg)
-                    return Response(
-                        {'error': error_msg},
-                        status=status.HTTP_503_SERVICE_UNAVAILABLE
-                    )
-                
-                health_data = health_response.json()
-                if health_data.get('status') != 'active':
-                    error_msg = f'节点状态异常: {health_data.get("status")}'
-                    logger.error(error_msg)
-                    return Response(
-                        {'error': error_msg},
-                        status=status.HTTP_503_SERVICE_UNAVAILABLE
-                    )
-                    
-            except requests.exceptions.RequestException as e:
-                error_msg = f'无法连接到节点: {str(e)}'
-                logger.error(error_msg)
+            logger.debug("检查节点健康状态: task_id=%s, node=%s", task.id, node.name)
+            health = NodeClient(node).health()
+            if not health:
+                logger.error(health.error)
                 return Response(
-                    {'error': error_msg},
+                    {'error': health.error},
                     status=status.HTTP_503_SERVICE_UNAVAILABLE
                 )
 
-            # 如果任务已经在运行，先停止
+            # 更新任务的执行节点，同时写入停止旧任务、部署新任务的命令
             old_node = task.node
-            if task.status == 'active' and old_node:
-                logger.info(f"停止旧节点上的任务: task_id={task.id}, old_node={old_node.name}")
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        response = requests.post(
-                            f"http://{old_node.host}:{old_node.port}/tasks/{task.id}/stop",
-                            timeout=10
-                        )
-                        
-                        if response.status_code == 200:
-                            logger.info(f'成功停止旧节点上的任务: {task.id}')
-                            break
-                        elif response.status_code == 404:
-                            # 任务不存在，可以继续
-                            logger.debug(f'旧节点上不存在任务: {task.id}')
-                            break
-                        else:
-                            logger.warning(f'停止旧任务失败 (尝试 {attempt+1}/{max_retries}): {response.text}')
-                            if attempt == max_retries - 1:
-                                # 最后一次尝试失败，但仍继续分配新节点
-                                logger.error(f'停止旧任务失败，但将继续分配新节点')
-                    except Exception as e:
-                        logger.warning(f'停止旧任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                        if attempt == max_retries - 1:
-                            # 最后一次尝试失败，但仍继续分配新节点
-                            logger.error(f'停止旧任务失败，但将继续分配新节点')
-                    
-                    # 如果不是最后一次尝试，等待后重试
-                    if attempt < max_retries - 1:
-                        time.sleep(1)
-
-            # 更新任务的执行节点
-            task.node = node
-            task.save()
-            logger.info(f"已将任务分配给新节点: task_id={task.id}, node={node.name}")
-            
-            # 如果任务是活动状态，发送任务到新节点并启动
-            success = True
-            error_message = None
-            
-            if task.status == 'active':
-                logger.info(f"开始在新节点上设置任务: task_id={task.id}, node={node.name}")
-                # 准备任务数据
-                task_data = {
-                    "task_id": task.id,
-                    "name": task.name,
-                    "cron_expression": task.cron_expression,
-                    "command": task.command,
-                    "command_type": task.command_type,
-                    "requirements": task.requirements
-                }
-                
-                # 发送任务详情
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        response = requests.post(
-                            f"http://{node.host}:{node.port}/tasks",
-                            json=task_data,
-                            timeout=10
-                        )
-                        
-                        if response.status_code == 200:
-                            logger.info(f'成功发送任务详情到新节点: {task.id}')
-                            break
-                        else:
-                            error_message = f'发送任务详情失败 (尝试 {attempt+1}/{max_retries}): {response.text}'
-                            logger.warning(error_message)
-                            if attempt == max_retries - 1:
-                                logger.error(f'发送任务详情失败: {task.id}')
-                                success = False
-                    except Exception as e:
-                        error_message = f'发送任务详情时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}'
-                        logger.warning(error_message)
-                        if attempt == max_retries - 1:
-                            logger.error(f'发送任务详情时出错: {task.id}, 错误: {str(e)}')
-                            success = False
-                    
-                    # 如果不是最后一次尝试，等待后重试
-                    if attempt < max_retries - 1:
-                        time.sleep(1)
-                
-                # 如果发送任务详情成功，启动任务
-                if success:
-                    logger.info(f"开始启动新节点上的任务: task_id={task.id}")
-                    for attempt in range(max_retries):
-                        try:
-                            response = requests.post(
-                                f"http://{node.host}:{node.port}/tasks/{task.id}/start",
-                                timeout=10
-                            )
-                            
-                            if response.status_code == 200:
-                                logger.info(f'成功启动新节点上的任务: {task.id}')
-                                break
-                            else:
-                                error_message = f'启动任务失败 (尝试 {attempt+1}/{max_retries}): {response.text}'
-                                logger.warning(error_message)
-                                if attempt == max_retries - 1:
-                                    logger.error(f'启动任务失败: {task.id}')
-                                    success = False
-                        except Exception as e:
-                            error_message = f'启动任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}'
-                            logger.warning(error_message)
-                            if attempt == max_retries - 1:
-                                logger.error(f'启动任务时出错: {task.id}, 错误: {str(e)}')
-                                success = False
-                        
-                        # 如果不是最后一次尝试，等待后重试
-                        if attempt < max_retries - 1:
-                            time.sleep(1)
-
-            # 返回响应
+            commands = []
+            with transaction.atomic():
+                task.node = node
+                task.save(update_fields=['node', 'updated_at'])
+                if task.status == 'active':
+                    if old_node:
+                        logger.info("停止旧节点上的任务: task_id=%s, old_node=%s", task.id, old_node.name)
+                        commands.append(outbox.enqueue_stop(old_node, task.id))
+                    logger.info("开始在新节点上设置任务: task_id=%s, node=%s", task.id, node.name)
+                    deploy = outbox.enqueue_deploy(task)
+                    commands.append(deploy)
+            logger.info("已将任务分配给新节点: task_id=%s, node=%s", task.id, node.name)
+
+            results = outbox.deliver(commands)
             response_data = {
-                'status': 'success' if success else 'partial_success',
-                'message': '节点分配成功' + ('' if success else '，但任务部署失败'),
+                'status': 'success',
+                'message': '节点分配成功',
                 'node': {
                     'id': node.id,
                     'name': node.name,
                     'host': node.host
                 }
             }
-            
-            if not success and error_message:
-                response_data['error_detail'] = error_message
-                
-            logger.info(f"节点分配完成: task_id={task.id}, node={node.name}, success={success}")
+            if task.status == 'active':
+                if results is None:
+                    response_data['status'] = 'queued'
+                    response_data['message'] = '节点分配成功，任务部署已排队'
+                elif results[deploy.id]:
+                    # 部署失败的命令由 outbox 分发器继续重试
+                    logger.error('部署任务到新节点失败: %s, 错误: %s', task.id, results[deploy.id])
+                    response_data['status'] = 'partial_success'
+                    response_data['message'] = '节点分配成功，但任务部署失败，稍后将自动重试'
+                    response_data['error_detail'] = results[deploy.id]
+                else:
+                    logger.info('成功启动新节点上的任务: %s', task.id)
+
+            logger.info("节点分配完成: task_id=%s, node=%s, status=%s", task.id, node.name, response_data['status'])
             return Response(response_data)
 
         except Node.DoesNotExist:
-            logger.error(f"指定的节点不存在: task_id={task.id}, node_id={node_id}")
+            logger.error("指定的节点不存在: task_id=%s, node_id=%s", task.id, node_id)
             return Response(
                 {'error': '指定的节点不存在'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def redeploy(self, request, pk=None):
         """重新下发任务脚本到执行节点"""
         task = self.get_object()
         
         # 检查节点状态
         if not task.node or task.node.status != 'active':
-            logger.warning(f"尝试向非活动节点下发任务: {task.id}")
+            logger.warning("尝试向非活动节点下发任务: %s", task.id)
             return Response(
                 {'error': '未分配活动节点'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        logger.info(f"开始重新下发任务: {task.id}, 节点: {task.node.name}")
-        
-        # 准备任务数据
-        task_data = {
-            "task_id": task.id,
-            "name": task.name,
-            "cron_expression": task.cron_expression,
-            "command": task.command,
-            "command_type": task.command_type,
-            "requirements": task.requirements,
-            "is_active": task.status == 'active'
-        }
-        
-        # 发送任务到执行节点
-        max_retries = 3
-        success = False
-        
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"尝试下发任务 (尝试 {attempt+1}/{max_retries}): {task.id}")
-                response = requests.post(
-                    f"http://{task.node.host}:{task.node.port}/tasks",
-                    json=task_data,
-                    timeout=10,
-                    headers={'Content-Type': 'application/json; charset=utf-8'}
-                )
-                
-                # 确保响应内容使用UTF-8解码
-                response.encoding = 'utf-8'
-                
-                if response.status_code == 200:
-                    logger.info(f"成功下发任务: {task.id}")
-                    success = True
-                    break
-                else:
-                    logger.error(f"下发任务失败 (尝试 {attempt+1}/{max_retries}): {response.text}")
-            except Exception as e:
-                logger.error(f"下发任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}")
-            
-            # 如果不是最后一次尝试，等待后重试
-            if attempt < max_retries - 1:
-                time.sleep(1)
-        
-        if not success:
-            logger.error(f"重新下发任务失败，已达到最大重试次数: {task.id}")
+        logger.info("开始重新下发任务: %s, 节点: %s", task.id, task.node.name)
+
+        # 发送任务到执行节点，如果任务状态为活动，重新启动任务
+        with transaction.atomic():
+            command = outbox.enqueue_deploy(task, start=task.status == 'active', include_active=True)
+
+        results = outbox.deliver([command])
+        if results is None:
             return Response(
-                {'error': '重新下发任务失败，请检查执行节点状态'},
+                {'status': 'queued', 'message': '任务重新下发已排队', 'command_id': command.id},
+                status=status.HTTP_202_ACCEPTED
+            )
+        if results[command.id]:
+            logger.error("重新下发任务失败: %s, 错误: %s", task.id, results[command.id])
+            return Response(
+                {'error': '重新下发任务失败，请检查执行节点状态', 'command_id': command.id},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        
-        # 如果任务状态为活动，重新启动任务
-        if task.status == 'active':
-            for attempt in range(max_retries):
-                try:
-                    logger.info(f"尝试启动任务 (尝试 {attempt+1}/{max_retries}): {task.id}")
-                    start_response = requests.post(
-                        f"http://{task.node.host}:{task.node.port}/tasks/{task.id}/start",
-                        timeout=10,
-                        headers={'Content-Type': 'application/json; charset=utf-8'}
-                    )
-                    
-                    # 确保响应内容使用UTF-8解码
-                    start_response.encoding = 'utf-8'
-                    
-                    if start_response.status_code == 200:
-                        logger.info(f"成功启动任务: {task.id}")
-                        break
-                    else:
-                        logger.error(f"启动任务失败 (尝试 {attempt+1}/{max_retries}): {start_response.text}")
-                except Exception as e:
-                    logger.error(f"启动任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}")
-                
-                # 如果不是最后一次尝试，等待后重试
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-        
-        logger.info(f"任务重新下发完成: {task.id}")
+
+        logger.info("任务重新下发完成: %s", task.id)
         return Response({'status': 'success', 'message': '任务已重新下发'})
 
+    @action(detail=True, methods=['get'])
+    def pipeline(self, request, pk=None):
+        """任务所在流水线的拓扑分层，层级相同的任务可以并行执行"""
+        task = self.get_object()
+        levels, edges = workflow.pipeline(task.id)
+        tasks = Task.objects.filter(id__in=levels).values('id', 'name', 'status', 'node')
+        return Response({
+            'tasks': sorted(
+                (dict(row, level=levels[row['id']]) for row in tasks),
+                key=lambda row: (row['level'], row['id'])
+            ),
+            'edges': [
+                {'upstream': source, 'downstream': target, 'trigger': trigger}
+                for source, target, trigger in edges
+            ],
+        })
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def run_pipeline(self, request, pk=None):
+        """启动任务所在流水线中没有上游的任务，下游任务在上游完成后自动触发"""
+        task = self.get_object()
+        jobs = workflow.run_pipeline(task.id)
+        logger.info("流水线已启动: %s, 起始任务数: %s", task.id, len(jobs))
+        return Response({
+            'status': 'success',
+            'jobs': [{'task_id': job.task_id, 'job_id': job.id} for job in jobs],
+        })
+
+    @action(detail=False, methods=['get'], throttle_scope='export')
+    def definitions(self, request):
+        """导出全部任务定义（含节点名称和依赖），格式见 tasks/transfer.py"""
+        return Response(transfer.export_definitions())
+
+    @definitions.mapping.post
+    def import_definitions(self, request):
+        """
+        批量导入任务定义：请求体为导出的数据，可附带 node_map（源节点名称 -> 目标节点名称）、
+        dry_run（只返回差异）和 deploy（默认 true，导入后下发到执行节点）。
+        """
+        data = request.data
+        node_map = data.get('node_map') or {}
+        if not isinstance(node_map, dict):
+            return Response({'error': 'node_map 应为对象'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = transfer.import_definitions(
+                data,
+                node_map=node_map,
+                dry_run=bool(data.get('dry_run', False)),
+                deploy=bool(data.get('deploy', True)),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if report['errors']:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
     def destroy(self, request, *args, **kwargs):
         """删除任务"""
         task = self.get_object()
-        
-        # 如果任务在运行，先停止
-        if task.status == 'active' and task.node:
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(
-                        f"http://{task.node.host}:{task.node.port}/tasks/{task.id}/stop",
-                        timeout=10,
-                        headers={'Content-Type': 'application/json; charset=utf-8'}
-                    )
-                    
-                    # 确保响应内容使用UTF-8解码
-                    response.encoding = 'utf-8'
-                    
-                    if response.status_code == 200:
-                        logger.info(f'成功停止任务: {task.id}')
-                        break
-                    elif response.status_code == 404:
-                        # 任务不存在，可以继续
-                        logger.info(f'执行节点上不存在任务: {task.id}')
-                        break
-                    else:
-                        logger.error(f'停止任务失败 (尝试 {attempt+1}/{max_retries}): {response.text}')
-                except Exception as e:
-                    logger.error(f'停止任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                
-                # 如果不是最后一次尝试，等待后重试
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-        
-        # 删除执行节点上的任务
-        if task.node:
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.delete(
-                        f"http://{task.node.host}:{task.node.port}/tasks/{task.id}",
-                        timeout=10,
-                        headers={'Content-Type': 'application/json; charset=utf-8'}
-                    )
-                    
-                    # 确保响应内容使用UTF-8解码
-                    response.encoding = 'utf-8'
-                    
-                    if response.status_code == 200:
-                        logger.info(f'成功删除执行节点上的任务: {task.id}')
-                        break
-                    elif response.status_code == 404:
-                        # 任务不存在，可以继续
-                        logger.info(f'执行节点上不存在任务: {task.id}')
-                        break
-                    else:
-                        logger.error(f'删除执行节点任务失败 (尝试 {attempt+1}/{max_retries}): {response.text}')
-                except Exception as e:
-                    logger.error(f'删除执行节点任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                
-                # 如果不是最后一次尝试，等待后重试
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-        
-        # 删除数据库中的任务
-        return super().destroy(request, *args, **kwargs)
-        
+        task_id = task.id
+        commands = []
+
+        # 删除数据库中的任务，同时写入删除执行节点上任务的命令（运行中则先停止）
+        with transaction.atomic():
+            if task.node:
+                commands.append(outbox.enqueue_remove(task.node, task.id, stop_first=task.status == 'active'))
+            self.perform_destroy(task)
+
+        results = outbox.deliver(commands)
+        if results and not any(results.values()):
+            logger.info('成功删除执行节点上的任务: %s', task_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def create(self, request, *args, **kwargs):
         """创建任务"""
+        self.node_commands = []
         response = super().create(request, *args, **kwargs)
-        
+
         # 如果创建成功且指定了节点，发送任务到执行节点
-        if response.status_code == status.HTTP_201_CREATED:
+        results = outbox.deliver(self.node_commands)
+        if results:
             task_id = response.data.get('id')
-            if task_id:
-                task = Task.objects.get(id=task_id)
-                if task.node and task.status == 'active':
-                    # 检查节点健康状态
-                    try:
-                        health_response = requests.get(
-                            f"http://{task.node.host}:{task.node.port}/health",
-                            timeout=5
-                        )
-                        
-                        # 确保响应内容使用UTF-8解码
-                        health_response.encoding = 'utf-8'
-                        
-                        if health_response.status_code != 200 or health_response.json().get('status') != 'active':
-                            logger.error(f'节点健康检查失败，任务创建后不会自动部署: {task.id}')
-                            return response
-                            
-                    except requests.exceptions.RequestException as e:
-                        logger.error(f'无法连接到节点，任务创建后不会自动部署: {task.id}, 错误: {str(e)}')
-                        return response
-                    
-                    # 准备任务数据
-                    task_data = {
-                        "task_id": task.id,
-                        "name": task.name,
-                        "cron_expression": task.cron_expression,
-                        "command": task.command,
-                        "command_type": task.command_type,
-                        "requirements": task.requirements
-                    }
-                    
-                    # 发送任务详情
-                    max_retries = 3
-                    success = False
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            send_response = requests.post(
-                                f"http://{task.node.host}:{task.node.port}/tasks",
-                                json=task_data,
-                                timeout=10,
-                                headers={'Content-Type': 'application/json; charset=utf-8'}
-                            )
-                            
-                            # 确保响应内容使用UTF-8解码
-                            send_response.encoding = 'utf-8'
-                            
-                            if send_response.status_code == 200:
-                                logger.info(f'成功发送任务详情到节点: {task.id}')
-                                success = True
-                                break
-                            else:
-                                logger.error(f'发送任务详情失败 (尝试 {attempt+1}/{max_retries}): {send_response.text}')
-                        except Exception as e:
-                            logger.error(f'发送任务详情时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                        
-                        # 如果不是最后一次尝试，等待后重试
-                        if attempt < max_retries - 1:
-                            time.sleep(1)
-                    
-                    # 如果发送任务详情成功，启动任务
-                    if success:
-                        for attempt in range(max_retries):
-                            try:
-                                start_response = requests.post(
-                                    f"http://{task.node.host}:{task.node.port}/tasks/{task.id}/start",
-                                    timeout=10,
-                                    headers={'Content-Type': 'application/json; charset=utf-8'}
-                                )
-                                
-                                # 确保响应内容使用UTF-8解码
-                                start_response.encoding = 'utf-8'
-                                
-                                if start_response.status_code == 200:
-                                    logger.info(f'成功启动节点上的任务: {task.id}')
-                                    break
-                                else:
-                                    logger.error(f'启动任务失败 (尝试 {attempt+1}/{max_retries}): {start_response.text}')
-                            except Exception as e:
-                                logger.error(f'启动任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                            
-                            # 如果不是最后一次尝试，等待后重试
-                            if attempt < max_retries - 1:
-                                time.sleep(1)
-        
+            if any(results.values()):
+                logger.error('任务创建后部署失败，稍后将自动重试: %s, 错误: %s', task_id, next(filter(None, results.values())))
+            else:
+                logger.info('成功启动节点上的任务: %s', task_id)
         return response
-        
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            task = serializer.save()
+            if task.node and task.status == 'active':
+                self.node_commands.append(outbox.enqueue_deploy(task))
+
     def update(self, request, *args, **kwargs):
         """更新任务"""
-        old_task = self.get_object()
+        self.node_commands = []
+        response = super().update(request, *args, **kwargs)
+
+        results = outbox.deliver(self.node_commands)
+        if results:
+            task_id = self.kwargs.get('pk')
+            if any(results.values()):
+                logger.error('任务更新后部署失败，稍后将自动重试: %s, 错误: %s', task_id, next(filter(None, results.values())))
+            else:
+                logger.info('成功部署任务到新节点: %s', task_id)
+        return response
+
+    def perform_update(self, serializer):
+        old_task = serializer.instance
         old_node = old_task.node
         old_status = old_task.status
-        
-        response = super().update(request, *args, **kwargs)
-        
-        # 如果更新成功，检查是否需要更新执行节点上的任务
-        if response.status_code == status.HTTP_200_OK:
-            task = self.get_object()
-            
-            # 如果节点发生变化或任务内容变化
-            if task.node and (task.node != old_node or 
-                             task.name != old_task.name or
-                             task.cron_expression != old_task.cron_expression or
-                             task.command != old_task.command or
-                             task.command_type != old_task.command_type or
-                             task.requirements != old_task.requirements):
-                
-                # 检查新节点健康状态
-                try:
-                    health_response = requests.get(
-                        f"http://{task.node.host}:{task.node.port}/health",
-                        timeout=5
-                    )
-                    
-                    # 确保响应内容使用UTF-8解码
-                    health_response.encoding = 'utf-8'
-                    
-                    if health_response.status_code != 200 or health_response.json().get('status') != 'active':
-                        logger.error(f'节点健康检查失败，任务更新后不会自动部署: {task.id}')
-                        return response
-                        
-                except requests.exceptions.RequestException as e:
-                    logger.error(f'无法连接到节点，任务更新后不会自动部署: {task.id}, 错误: {str(e)}')
-                    return response
-                
+        old_fields = [getattr(old_task, f) for f in DEPLOY_FIELDS]
+
+        with transaction.atomic():
+            task = serializer.save()
+
+            # 如果节点发生变化或任务内容变化，更新执行节点上的任务
+            if task.node and (task.node != old_node or
+                              [getattr(task, f) for f in DEPLOY_FIELDS] != old_fields):
                 # 如果旧节点存在且任务在运行，先停止旧任务
                 if old_node and old_status == 'active':
-                    max_retries = 3
-                    for attempt in range(max_retries):
-                        try:
-                            stop_response = requests.post(
-                                f"http://{old_node.host}:{old_node.port}/tasks/{task.id}/stop",
-                                timeout=10,
-                                headers={'Content-Type': 'application/json; charset=utf-8'}
-                            )
-                            
-                            # 确保响应内容使用UTF-8解码
-                            stop_response.encoding = 'utf-8'
-                            
-                            if stop_response.status_code == 200:
-                                logger.info(f'成功停止旧节点上的任务: {task.id}')
-                                break
-                            elif stop_response.status_code == 404:
-                                # 任务不存在，可以继续
-                                logger.info(f'旧节点上不存在任务: {task.id}')
-                                break
-                            else:
-                                logger.error(f'停止旧任务失败 (尝试 {attempt+1}/{max_retries}): {stop_response.text}')
-                        except Exception as e:
-                            logger.error(f'停止旧任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                        
-                        # 如果不是最后一次尝试，等待后重试
-                        if attempt < max_retries - 1:
-                            time.sleep(1)
-                
-                # 准备任务数据
-                task_data = {
-                    "task_id": task.id,
-                    "name": task.name,
-                    "cron_expression": task.cron_expression,
-                    "command": task.command,
-                    "command_type": task.command_type,
-                    "requirements": task.requirements
-                }
-                
-                # 发送任务到新节点
-                max_retries = 3
-                success = False
-                
-                for attempt in range(max_retries):
-                    try:
-                        send_response = requests.post(
-                            f"http://{task.node.host}:{task.node.port}/tasks",
-                            json=task_data,
-                            timeout=10,
-                            headers={'Content-Type': 'application/json; charset=utf-8'}
-                        )
-                        
-                        # 确保响应内容使用UTF-8解码
-                        send_response.encoding = 'utf-8'
-                        
-                        if send_response.status_code == 200:
-                            logger.info(f'成功发送任务详情到新节点: {task.id}')
-                            success = True
-                            break
-                        else:
-                            logger.error(f'发送任务详情失败 (尝试 {attempt+1}/{max_retries}): {send_response.text}')
-                    except Exception as e:
-                        logger.error(f'发送任务详情时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                    
-                    # 如果不是最后一次尝试，等待后重试
-                    if attempt < max_retries - 1:
-                        time.sleep(1)
-                
-                # 如果任务是活动状态且发送任务详情成功，启动任务
-                if task.status == 'active' and success:
-                    for attempt in range(max_retries):
-                        try:
-                            start_response = requests.post(
-                                f"http://{task.node.host}:{task.node.port}/tasks/{task.id}/start",
-                                timeout=10,
-                                headers={'Content-Type': 'application/json; charset=utf-8'}
-                            )
-                            
-                            # 确保响应内容使用UTF-8解码
-                            start_response.encoding = 'utf-8'
-                            
-                            if start_response.status_code == 200:
-                                logger.info(f'成功启动新节点上的任务: {task.id}')
-                                break
-                            else:
-                                logger.error(f'启动任务失败 (尝试 {attempt+1}/{max_retries}): {start_response.text}')
-                        except Exception as e:
-                            logger.error(f'启动任务时出错 (尝试 {attempt+1}/{max_retries}): {str(e)}')
-                        
-                        # 如果不是最后一次尝试，等待后重试
-                        if attempt < max_retries - 1:
-                            time.sleep(1)
-        
-        return response
+                    self.node_commands.append(outbox.enqueue_stop(old_node, task.id))
+                # 发送任务到新节点，如果任务是活动状态则启动
+                self.node_commands.append(outbox.enqueue_deploy(task, start=task.status == 'active'))
 
-class JobViewSet(viewsets.ModelViewSet):
+class JobViewSet(ReplicaReadMixin, FastListMixin, SearchMixin, viewsets.ModelViewSet):
     queryset = Job.objects.all()
     serializer_class = JobSerializer
+    search_kind = 'job'
+    search_facets = {'status': 'status', 'node': 'task__node', 'command_type': 'task__command_type'}
+    # 限流类别，export 单独设置，见 tasks/throttling.py
+    throttle_scope = None
 
     def get_queryset(self):
-        queryset = Job.objects.all()
+        queryset = Job.objects.select_related('task')
         task_id = self.request.query_params.get('task_id', None)
         if task_id is not None:
             queryset = queryset.filter(task_id=task_id)
         return queryset
 
-class NodeViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        serializer.save(**self._finish_fields(serializer))
+
+    def perform_update(self, serializer):
+        serializer.save(**self._finish_fields(serializer))
+
+    def _finish_fields(self, serializer):
+        # end_time 为只读字段，节点回报完成状态时在这里补上（已有时保留）
+        instance = serializer.instance
+        if serializer.validated_data.get('status') in workflow.FINISHED and (
+                instance is None or instance.end_time is None):
+            return {'end_time': timezone.now()}
+        return {}
+
+    @action(detail=False, methods=['get'], throttle_scope='export')
+    def export(self, request):
+        """
+        流式导出执行记录（含任务、节点名称），按 ID 倒序。
+        ?fmt=ndjson（默认）/ csv / parquet，?since= ?until= 按开始时间过滤，?status= 可逗号分隔。
+        """
+        fmt = request.query_params.get('fmt', 'ndjson')
+        if fmt not in export.FORMATS:
+            return Response({'error': f'不支持的格式: {fmt}'}, status=status.HTTP_400_BAD_REQUEST)
+        if fmt == 'parquet' and not export.parquet_available():
+            return Response({'error': '服务器未安装 pyarrow，无法导出 parquet'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = export.filter_jobs(
+                self.get_queryset(),
+                since=request.query_params.get('since'),
+                until=request.query_params.get('until'),
+                status=request.query_params.get('status'),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        spec = get_values_spec(JobExportSerializer, self.get_requested_fields())
+        content_type, extension = export.FORMATS[fmt]
+        response = StreamingHttpResponse(
+            export.stream(fmt, queryset, spec, JobExportSerializer, settings.EXPORT_CHUNK_SIZE),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="jobs.{extension}"'
+        return response
+
+class TaskDependencyViewSet(viewsets.ModelViewSet):
+    queryset = TaskDependency.objects.all()
+    serializer_class = TaskDependencySerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        task_id = self.request.query_params.get('task')
+        if task_id is not None:
+            queryset = queryset.filter(workflow.dependency_filter(task_id))
+        return queryset
+
+class NodeViewSet(ReplicaReadMixin, CachedResponseMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Node.objects.all()
     serializer_class = NodeSerializer
+    cache_labels = ('node',)
+    cache_max_age_setting = 'NODE_CACHE_TIMEOUT'
+    # list/retrieve 的结果会按版本号缓存，从主库读取；check_health 会更新节点状态
+    replica_actions = ('summary', 'metrics', 'tasks')
+
+    def get_object(self):
+        node = super().get_object()
+        log.bind(node_id=node.id, node_name=node.name)
+        return node
 
     @action(detail=True, methods=['get'])
     def check_health(self, request, pk=None):
@@ -806,10 +609,10 @@ class NodeViewSet(viewsets.ModelViewSet):
 
         try:
             # 设置较短的超时时间，避免长时间等待
-            url = f"http://{node.host}:{node.port}/health"
-            logger.info(f"正在检查节点健康状态: {node.name}, URL: {url}")
+            client = NodeClient(node)
+            logger.info("正在检查节点健康状态: %s, URL: %s/health", node.name, client.base_url)
 
-            response = requests.get(url, timeout=5)
+            response = client.request('get', '/health', timeout=5)
 
             if response.status_code == 200:
                 # 更新节点状态
@@ -819,13 +622,14 @@ class NodeViewSet(viewsets.ModelViewSet):
 
                 # 返回执行节点的健康信息
                 health_data = response.json()
+                client.remember_capabilities(health_data)
                 return Response({
                     'node': self.get_serializer(node).data,
                     'health': health_data,
                     'message': '节点健康检查成功'
                 })
             else:
-                logger.warning(f"节点健康检查失败: {node.name}, 状态码: {response.status_code}")
+                logger.warning("节点健康检查失败: %s, 状态码: %s", node.name, response.status_code)
                 return Response({
                     'node': self.get_serializer(node).data,
                     'error': f'节点返回非200状态码: {response.status_code}',
@@ -833,7 +637,7 @@ class NodeViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         except requests.RequestException as e:
-            logger.error(f"节点健康检查异常: {node.name}, 错误: {str(e)}")
+            logger.error("节点健康检查异常: %s, 错误: %s", node.name, e)
 
             # 更新节点状态为不活跃
             node.status = 'inactive'
@@ -845,16 +649,111 @@ class NodeViewSet(viewsets.ModelViewSet):
                 'message': '节点健康检查失败，无法连接到节点'
             }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=True, methods=['get'])
+    def metrics(self, request, pk=None):
+        """
+        节点资源时序数据：?since=&until=（ISO 时间，默认最近 1 小时）、
+        ?resolution=raw|1m|auto（默认 auto，超出原始数据保留期时使用分钟汇总）
+        """
+        node = self.get_object()
+        until = parse_datetime(request.query_params.get('until', '')) or timezone.now()
+        since = parse_datetime(request.query_params.get('since', '')) or until - timedelta(hours=1)
+        resolution = request.query_params.get('resolution', 'auto')
+        if resolution not in ('raw', '1m', 'auto'):
+            return Response(
+                {'error': 'resolution 只能是 raw、1m 或 auto'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resolution, points = metrics.series(node, since, until, resolution)
+        return Response({
+            'node': node.id,
+            'resolution': resolution,
+            'since': metrics.format_time(since),
+            'until': metrics.format_time(until),
+            'points': points,
+        })
+
+    @action(detail=True, methods=['get'])
+    def tasks(self, request, pk=None):
+        """
+        节点上的任务（分页，支持 ?status= 和 ?fields=），每个任务附带 jobs_running（运行中的执行记录数），
+        用于下线节点前确认需要迁移的任务
+        """
+        node = self.get_object()
+        queryset = inventory.node_tasks(_task_queryset(_requested_statuses(request.query_params)).filter(node=node))
+        spec = get_values_spec(TaskSerializer, self.get_requested_fields())
+        rows = queryset.values(*spec.sources, 'jobs_running')
+
+        page = self.paginate_queryset(rows)
+        data = [dict(spec.render(row), jobs_running=row['jobs_running']) for row in page or rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        集群概览：每个节点的活跃 / 暂停任务数、运行中的执行记录数、心跳间隔（秒）、
+        最近 ?hours=（默认 24）小时的失败率，一条查询完成
+        """
+        try:
+            hours = float(request.query_params.get('hours', inventory.DEFAULT_WINDOW.total_seconds() / 3600))
+        except ValueError:
+            hours = 0
+        if not 0 < hours <= 24 * 30:
+            return Response(
+                {'error': 'hours 应为 0 到 720 之间的数字'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(inventory.summary(window=timedelta(hours=hours)))
+
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def redeploy_tasks(self, request, pk=None):
+        """重新下发该节点上的全部任务，节点支持时合并为批量、压缩的请求"""
+        node = self.get_object()
+        if node.status != 'active':
+            return Response(
+                {'error': '节点未激活'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            commands = [
+                outbox.enqueue_deploy(task, start=task.status == 'active', include_active=True)
+                for task in Task.objects.filter(node=node)
+            ]
+        logger.info("开始重新下发节点上的全部任务: %s, 任务数: %s", node.name, len(commands))
+
+        results = outbox.deliver(commands)
+        if results is None:
+            return Response(
+                {'status': 'queued', 'message': '任务重新下发已排队', 'count': len(commands)},
+                status=status.HTTP_202_ACCEPTED
+            )
+        # JSON 对象的键只能是字符串
+        failed = {str(c.task_id): results[c.id] for c in commands if results[c.id]}
+        if failed:
+            logger.error("部分任务重新下发失败，稍后将自动重试: %s, 失败数: %s", node.name, len(failed))
+        return Response({
+            'status': 'partial_success' if failed else 'success',
+            'count': len(commands),
+            'failed': failed,
+        })
+
+    @action(detail=False, methods=['post'], throttle_classes=[HeartbeatThrottle])
     def heartbeat(self, request):
         name = request.data.get('name')
         host = request.data.get('host')
         port = request.data.get('port')
 
-        logger.debug(f"收到心跳请求: name={name}, host={host}, port={port}")
+        log.bind(node_name=name)
+        logger.debug("收到心跳请求: name=%s, host=%s, port=%s", name, host, port,
+                     extra={'sample_key': 'heartbeat'})
 
         if not all([name, host, port]):
-            logger.warning(f"心跳请求缺少必要字段: {request.data}")
+            logger.warning("心跳请求缺少必要字段: %s", request.data)
             return Response(
                 {'error': 'Missing required fields'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -868,20 +767,178 @@ class NodeViewSet(viewsets.ModelViewSet):
         #         status=status.HTTP_403_FORBIDDEN
         #     )
 
-        node, created = Node.objects.update_or_create(
-            name=name,
-            defaults={
-                'host': host,
-                'port': port,
-                'status': 'active',
-                'last_heartbeat': timezone.now()
-            }
-        )
+        # 只有注册信息或状态变化时才保存（分配新的变更序号，使节点缓存失效），
+        # 单纯的心跳只刷新 last_heartbeat，不产生增量同步事件
+        # 资源快照同样只刷新，不产生变更事件；缓存中的这些字段在 NODE_CACHE_TIMEOUT 秒内过期
+        now = timezone.now()
+        resources = metrics.parse_resources(request.data.get('resources'))
+        with transaction.atomic():
+            node = Node.objects.select_for_update().filter(name=name).first()
+            created = node is None
+            if created or (node.host, str(node.port), node.status) != (host, str(port), 'active'):
+                node = node or Node(name=name)
+                node.host = host
+                node.port = port
+                node.status = 'active'
+                node.last_heartbeat = now
+                for field, value in resources.items():
+                    setattr(node, field, value)
+                node.save()
+            else:
+                Node.objects.filter(pk=node.pk).update(last_heartbeat=now, **resources)
+                node.last_heartbeat = now
+                for field, value in resources.items():
+                    setattr(node, field, value)
+
+        if resources:
+            metrics.record(node.id, resources, now)
 
         if created:
-            logger.info(f"新执行节点注册: name={name}, host={host}, port={port}")
+            logger.info("新执行节点注册: name=%s, host=%s, port=%s", name, host, port)
         else:
-            logger.debug(f"执行节点心跳更新: name={name}, host={host}, port={port}")
+            logger.debug("执行节点心跳更新: name=%s, host=%s, port=%s", name, host, port,
+                         extra={'sample_key': 'heartbeat'})
 
         serializer = self.get_serializer(node)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+class NodeCommandViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    """节点命令 outbox，用于查看积压和失败的命令"""
+    queryset = NodeCommand.objects.select_related('node')
+    serializer_class = NodeCommandSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by('-id')
+        for param in ('status', 'task_id', 'node'):
+            value = self.request.query_params.get(param)
+            if value is not None:
+                queryset = queryset.filter(**{param: value})
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """将失败（dead）的命令重新放回队列，从失败的步骤继续执行"""
+        command = self.get_object()
+        if command.status != 'dead':
+            return Response(
+                {'error': '只能重试失败的命令'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        command.status = 'pending'
+        command.attempts = 0
+        command.next_attempt_at = timezone.now()
+        command.save(update_fields=['status', 'attempts', 'next_attempt_at', 'updated_at'])
+        logger.info("节点命令已重新排队: command=%s, task_id=%s", command.id, command.task_id)
+        return Response(self.get_serializer(command).data)
+
+class ChangeFeedViewSet(viewsets.ViewSet):
+    """
+    任务和节点的增量同步：GET /api/changes/?since=<seq>&limit=<n>
+    返回序号大于 since 的任务、节点（含 status='deleted' 的软删除）和物理删除事件，
+    客户端下次以响应中的 next 作为 since 继续拉取，has_more 为 true 时应立即继续。
+    只返回不超过 ChangeSequence.settled() 的序号，稍后提交的较小序号不会被跳过。
+    """
+
+    def list(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', settings.CHANGES_PAGE_SIZE)),
+                        settings.MAX_PAGE_SIZE)
+        except ValueError:
+            return Response(
+                {'error': 'since 和 limit 必须是整数'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # 先确定可以返回的最大序号，再读取变更
+        settled = ChangeSequence.settled()
+        sources = (
+            ('tasks', Task.all_objects.all(), TaskSerializer),
+            ('nodes', Node.objects.all(), NodeSerializer),
+        )
+        changes = []
+        for key, queryset, serializer_class in sources:
+            spec = get_values_spec(serializer_class)
+            rows = queryset.filter(change_seq__gt=since, change_seq__lte=settled).order_by('change_seq').values(*spec.sources)
+            changes.extend((row['change_seq'], key, spec.render(row)) for row in rows[:limit + 1])
+        tombstones = (
+            ChangeTombstone.objects.filter(change_seq__gt=since, change_seq__lte=settled)
+            .order_by('change_seq').values('kind', 'object_id', 'change_seq')
+        )
+        changes.extend(
+            (row['change_seq'], 'deleted', {'kind': row['kind'], 'id': row['object_id']})
+            for row in tombstones[:limit + 1]
+        )
+
+        # 三个来源共用一个序号，合并后取最小的 limit 条
+        changes.sort(key=lambda change: change[0])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        data = {'tasks': [], 'nodes': [], 'deleted': []}
+        for seq, key, item in changes:
+            if key == 'deleted':
+                item['change_seq'] = seq
+            data[key].append(item)
+        data['next'] = changes[-1][0] if changes else since
+        data['has_more'] = has_more
+        return Response(data)
+
+class OpsAdminPermission(BasePermission):
+    """请求头 X-Ops-Token 与 OPS_TOKEN 一致，或为管理员用户"""
+
+    def has_permission(self, request, view):
+        token = request.headers.get('X-Ops-Token', '')
+        if settings.OPS_TOKEN and hmac.compare_digest(token, settings.OPS_TOKEN):
+            return True
+        return bool(getattr(request.user, 'is_staff', False))
+
+
+class OpsViewSet(viewsets.ViewSet):
+    """运维信息；db 为处理该请求的 worker 进程内的统计"""
+
+    @action(detail=False, methods=['get'])
+    def db(self, request):
+        """数据库连接复用情况和连接池状态"""
+        return Response(dbstats.snapshot())
+
+    @action(detail=False, methods=['get'])
+    def controllers(self, request):
+        """租约有效的控制器实例及各自负责的节点数"""
+        owners = controller.assignments()
+        counts = {}
+        for owner in owners.values():
+            counts[owner] = counts.get(owner, 0) + 1
+        instances = ControllerInstance.objects.filter(lease_expires_at__gt=timezone.now()) \
+            .order_by('instance_id').values('instance_id', 'hostname', 'pid', 'started_at', 'lease_expires_at')
+        return Response({
+            'instances': [dict(item, nodes=counts.get(item['instance_id'], 0)) for item in instances],
+            'unassigned_nodes': counts.get(None, 0),
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[OpsAdminPermission])
+    def profiles(self, request):
+        """本 worker 所在机器上保存的慢请求分析结果，见 ecron_backend/profiling.py"""
+        return Response({
+            'enabled': settings.PROFILE_SLOW_MS > 0,
+            'slow_ms': settings.PROFILE_SLOW_MS,
+            'profiles': profiling.list_profiles(),
+        })
+
+    @action(detail=False, methods=['get'], url_path=r'profiles/(?P<name>[\w.-]+)',
+            permission_classes=[OpsAdminPermission])
+    def profile(self, request, name=None, format=None):
+        """下载分析结果：?fmt=json（默认，含查询日志和节点调用）或 folded（火焰图的折叠调用栈）"""
+        if format is not None:
+            # 不带结尾斜杠时路由把 .json 当作格式后缀拆出
+            name = f'{name}.{format}'
+        data = profiling.load(name)
+        if data is None:
+            return Response({'error': '分析结果不存在'}, status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get('fmt') == 'folded':
+            response = HttpResponse(profiling.folded(data), content_type='text/plain; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="{name[:-len(".json")]}.folded"'
+            return response
+        response = Response(data)
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
@@ -0,0 +1,174 @@
+"""
+任务依赖（DAG）与流水线触发
+
+TaskDependency 描述 上游 -> 下游 的边及触发条件（success / failed / always）。
+执行记录变为 success、failed 或 timeout（按 failed 处理）时（节点回报结果、或下发失败），检查它的所有下游：
+下游的每条入边都满足——上游最近一次完成的执行状态符合触发条件，且完成时间晚于
+这一轮的开始时间和下游上一次开始执行的时间——时创建下游的执行记录，并通过 outbox 下发立即执行命令。
+“这一轮”从流水线启动（run_pipeline）或单独执行的上游任务开始，开始时间记在 Job.run_started_at 中
+沿触发链传递，扇入的下游在第一次执行时也要等同一轮的所有上游完成，不会被以前的执行结果提前触发。
+同一下游任务的检查串行进行（锁住下游任务行），多个上游同时完成时只触发一次。
+下游任务的立即执行命令在事务提交后用 outbox.deliver_by_node 下发：不同节点的命令并发执行，
+回报结果的请求只等待最慢的节点，而不是所有下游依次下发的总耗时；节点不可用时命令交给分发器。
+多条出边实现扇出，多条入边实现扇入。
+"""
+
+import logging
+from collections import defaultdict, deque
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import outbox
+from .models import Job, Task, TaskDependency
+
+logger = logging.getLogger('backend')
+
+FINISHED = ('success', 'failed', 'timeout')
+
+
+def _matches(trigger, job_status):
+    # 超时按失败处理
+    if job_status == 'timeout':
+        job_status = 'failed'
+    return trigger == 'always' or trigger == job_status
+
+
+def _load_edges():
+    return list(TaskDependency.objects.values_list('upstream_id', 'downstream_id'))
+
+
+def creates_cycle(upstream_id, downstream_id, edges=None):
+    """加入 upstream -> downstream 后是否成环（含自环）"""
+    if upstream_id == downstream_id:
+        return True
+    children = defaultdict(list)
+    for source, target in edges if edges is not None else _load_edges():
+        children[source].append(target)
+    seen = {downstream_id}
+    queue = deque([downstream_id])
+    while queue:
+        current = queue.popleft()
+        for child in children[current]:
+            if child == upstream_id:
+                return True
+            if child not in seen:
+                seen.add(child)
+                queue.append(child)
+    return False
+
+
+def pipeline(task_id):
+    """
+    返回 task 所在连通分量的拓扑分层：({task_id: 层级}, [(上游, 下游, 触发条件)])。
+    层级相同的任务互不依赖，可以并行执行。
+    """
+    edges = list(TaskDependency.objects.values_list('upstream_id', 'downstream_id', 'trigger'))
+    neighbours = defaultdict(set)
+    for source, target, _ in edges:
+        neighbours[source].add(target)
+        neighbours[target].add(source)
+
+    component = {task_id}
+    queue = deque([task_id])
+    while queue:
+        for other in neighbours[queue.popleft()] - component:
+            component.add(other)
+            queue.append(other)
+
+    edges = [edge for edge in edges if edge[0] in component]
+    indegree = {node: 0 for node in component}
+    children = defaultdict(list)
+    for source, target, _ in edges:
+        children[source].append(target)
+        indegree[target] += 1
+
+    levels = {}
+    queue = deque((node, 0) for node, degree in indegree.items() if degree == 0)
+    while queue:
+        node, level = queue.popleft()
+        levels[node] = level
+        for child in children[node]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append((child, level + 1))
+    return levels, edges
+
+
+def _run_started(job):
+    return job.run_started_at or job.start_time
+
+
+def _ready(downstream, run_started):
+    """下游任务的所有入边是否都已被 run_started 开始的这一轮满足"""
+    last_run = Job.objects.filter(task=downstream).aggregate(last=Max('start_time'))['last']
+    since = max(run_started, last_run) if last_run is not None else run_started
+    for edge in TaskDependency.objects.filter(downstream=downstream):
+        latest = (
+            Job.objects.filter(task_id=edge.upstream_id, status__in=FINISHED)
+            .order_by('-end_time', '-id').first()
+        )
+        if latest is None or not _matches(edge.trigger, latest.status):
+            return False
+        if (latest.end_time or latest.start_time) < since:
+            return False
+    return True
+
+
+def start(task, reason, run_started_at=None):
+    """为任务创建执行记录并写入执行命令，调用方需处于事务中，返回 (job, command)"""
+    job = Job.objects.create(task=task, status='running', result=reason, run_started_at=run_started_at)
+    command = outbox.enqueue_execute(task.node, task.id, job.id)
+    return job, command
+
+
+def _deliver_after_commit(commands):
+    if commands:
+        transaction.on_commit(lambda: outbox.deliver_by_node(commands))
+
+
+def on_job_finished(job):
+    """执行记录完成时触发满足条件的下游任务"""
+    edges = TaskDependency.objects.filter(upstream_id=job.task_id).select_related('downstream', 'downstream__node')
+    commands = []
+    with transaction.atomic():
+        for edge in edges:
+            if not _matches(edge.trigger, job.status):
+                continue
+            # 锁住下游任务行，多个上游同时完成时依次检查
+            downstream = Task.all_objects.select_for_update().select_related('node').get(pk=edge.downstream_id)
+            if downstream.status != 'active' or downstream.node is None:
+                logger.warning("下游任务未激活或未分配节点，跳过触发: %s", downstream.id)
+                continue
+            run_started = _run_started(job)
+            if not _ready(downstream, run_started):
+                continue
+            new_job, command = start(downstream, f'由上游任务 {job.task_id} 触发', run_started)
+            commands.append(command)
+            logger.info("触发下游任务: %s -> %s, job_id=%s", job.task_id, downstream.id, new_job.id)
+        _deliver_after_commit(commands)
+
+
+def run_pipeline(task_id):
+    """启动 task 所在流水线中没有上游的任务，返回创建的执行记录"""
+    levels, _ = pipeline(task_id)
+    roots = [node for node, level in levels.items() if level == 0]
+    jobs = []
+    commands = []
+    # 同一轮的起始任务共用开始时间，扇入的下游据此等待所有起始任务的结果
+    run_started = timezone.now()
+    with transaction.atomic():
+        for task in Task.objects.filter(id__in=roots).select_related('node'):
+            if task.status != 'active' or task.node is None:
+                logger.warning("流水线起始任务未激活或未分配节点，跳过: %s", task.id)
+                continue
+            job, command = start(task, '流水线启动', run_started)
+            jobs.append(job)
+            commands.append(command)
+        _deliver_after_commit(commands)
+    return jobs
+
+
+def dependency_filter(task_id):
+    return Q(upstream_id=task_id) | Q(downstream_id=task_id)